@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+B站自适应频率控制模块
+====================
+
+基于AIMD（加性增、乘性减）的自适应控制器，替代被拦截后固定等待30-60秒的做法。
+
+工作方式：
+1. 每个接口族维护当前请求速率（次/秒）和并发数，初始为配置的上限
+2. 遇到风控（HTTP 412，或返回码 -352/-412/-799）时，速率和并发数按比例下调
+3. 连续成功一定次数后，速率和并发数按固定步长回升，直到上限
+4. 令牌桶限速器（bilibili_rate_limiter）和异步引擎按控制器给出的当前值限速
+
+当前速率等指标可通过 get_metrics() / print_metrics() 查看。
+"""
+
+import threading
+
+from bilibili_http_client import is_json_response
+
+# 被视为风控拦截的HTTP状态码和接口返回码
+THROTTLE_STATUS_CODES = {412}
+THROTTLE_API_CODES = {-352, -412, -799}
+
+def get_throttle_code(response):
+    """
+    判断响应是否为风控拦截
+    
+    返回:
+        拦截时返回HTTP状态码或接口返回码，否则返回None
+    """
+    if response is None:
+        return None
+    if response.status_code in THROTTLE_STATUS_CODES:
+        return response.status_code
+    if response.status_code != 200:
+        return None
+    # 弹幕分段等protobuf响应不是JSON，跳过解析
+    if not is_json_response(response):
+        return None
+    
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if isinstance(data, dict) and data.get('code') in THROTTLE_API_CODES:
+        return data['code']
+    return None
+
+class AimdController:
+    """按接口族调整请求速率和并发数的AIMD控制器（线程安全）"""
+    
+    def __init__(self, decrease_factor=0.5, rate_step=0.1, concurrency_step=1,
+                 success_threshold=20, min_rate=0.05, min_concurrency=1,
+                 base_backoff=2.0, max_backoff=60.0):
+        """
+        参数:
+            decrease_factor: 遇到拦截时速率和并发数的乘数
+            rate_step: 每次回升增加的速率(次/秒)
+            concurrency_step: 每次回升增加的并发数
+            success_threshold: 连续成功多少次后回升一次
+            min_rate: 速率下限(次/秒)
+            min_concurrency: 并发数下限
+            base_backoff: 首次拦截后的重试等待(秒)，连续拦截时翻倍
+            max_backoff: 重试等待的上限(秒)
+        """
+        self.decrease_factor = decrease_factor
+        self.rate_step = rate_step
+        self.concurrency_step = concurrency_step
+        self.success_threshold = success_threshold
+        self.min_rate = min_rate
+        self.min_concurrency = min_concurrency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._states = {}
+        self._lock = threading.Lock()
+    
+    def _get_state(self, family, max_rate=None, max_concurrency=None):
+        """获取接口族状态，首次使用时以给定上限初始化"""
+        state = self._states.get(family)
+        if state is None:
+            state = {
+                'rate': max_rate,
+                'max_rate': max_rate,
+                'concurrency': max_concurrency,
+                'max_concurrency': max_concurrency,
+                'success_streak': 0,
+                'throttle_streak': 0,
+                'successes': 0,
+                'throttles': 0,
+            }
+            self._states[family] = state
+        else:
+            # 上限可能在首次注册之后才提供（如限速器和异步引擎分别注册）
+            if state['max_rate'] is None and max_rate is not None:
+                state['rate'] = state['max_rate'] = max_rate
+            if state['max_concurrency'] is None and max_concurrency is not None:
+                state['concurrency'] = state['max_concurrency'] = max_concurrency
+        return state
+    
+    def get_rate(self, family, max_rate):
+        """获取接口族当前允许的速率(次/秒)"""
+        with self._lock:
+            return self._get_state(family, max_rate=max_rate)['rate']
+    
+    def get_concurrency(self, family, max_concurrency):
+        """获取接口族当前允许的并发数"""
+        with self._lock:
+            return self._get_state(family, max_concurrency=max_concurrency)['concurrency']
+    
+    def on_success(self, family):
+        """记录一次成功请求，连续成功达到阈值后加性回升"""
+        with self._lock:
+            state = self._get_state(family)
+            state['successes'] += 1
+            state['throttle_streak'] = 0
+            state['success_streak'] += 1
+            if state['success_streak'] < self.success_threshold:
+                return
+            
+            state['success_streak'] = 0
+            if state['max_rate'] is not None:
+                state['rate'] = min(state['max_rate'], state['rate'] + self.rate_step)
+            if state['max_concurrency'] is not None:
+                state['concurrency'] = min(state['max_concurrency'],
+                                           state['concurrency'] + self.concurrency_step)
+    
+    def on_throttle(self, family):
+        """
+        记录一次风控拦截，速率和并发数乘性下调
+        
+        返回:
+            建议的重试等待时间(秒)，连续拦截时指数增长
+        """
+        with self._lock:
+            state = self._get_state(family)
+            state['throttles'] += 1
+            state['success_streak'] = 0
+            state['throttle_streak'] += 1
+            if state['rate'] is not None:
+                state['rate'] = max(self.min_rate, state['rate'] * self.decrease_factor)
+            if state['concurrency'] is not None:
+                state['concurrency'] = max(self.min_concurrency,
+                                           int(state['concurrency'] * self.decrease_factor))
+            rate = state['rate']
+            backoff = self.base_backoff * (2 ** (state['throttle_streak'] - 1))
+        
+        print(f"接口族 {family} 触发风控，速率下调至 {rate} 次/秒" if rate is not None
+              else f"接口族 {family} 触发风控")
+        return min(self.max_backoff, backoff)
+    
+    def get_metrics(self):
+        """获取各接口族的当前速率、并发数和累计计数"""
+        with self._lock:
+            return {family: dict(state) for family, state in self._states.items()}
+    
+    def print_metrics(self):
+        """打印各接口族的当前速率和并发数"""
+        for family, state in sorted(self.get_metrics().items()):
+            rate = f"{state['rate']:.2f}/{state['max_rate']:.2f}" if state['rate'] is not None else "-"
+            concurrency = (f"{state['concurrency']}/{state['max_concurrency']}"
+                           if state['concurrency'] is not None else "-")
+            print(f"[{family}] 速率(次/秒): {rate}, 并发: {concurrency}, "
+                  f"成功: {state['successes']}, 拦截: {state['throttles']}")
+
+# 进程内共享的默认控制器
+_default_controller = None
+_default_controller_lock = threading.Lock()
+
+def get_aimd_controller():
+    """获取进程内共享的默认AIMD控制器"""
+    global _default_controller
+    if _default_controller is None:
+        with _default_controller_lock:
+            if _default_controller is None:
+                _default_controller = AimdController()
+    return _default_controller
+
+def configure_aimd_controller(**kwargs):
+    """按 AimdController 的参数重新创建默认控制器"""
+    global _default_controller
+    with _default_controller_lock:
+        _default_controller = AimdController(**kwargs)
+    return _default_controller
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+B站异步抓取引擎
+==============
+
+基于 asyncio + aiohttp 的并发抓取引擎，将各爬虫中的同步抓取函数改写为协程，
+按接口族分别限制并发数，替代原先逐个请求并 sleep 的串行流程。
+
+功能：
+1. 获取视频详情（/x/web-interface/view）
+2. 获取UP主投稿列表、UP主信息（/x/space/wbi/*，自动WBI签名）
+3. 获取字幕列表和字幕内容（/x/player/v2）
+4. 批量抓取多个UP主的全部视频，输出格式与 up_all_video_spider 相同
+
+并发控制：
+- 每个接口族（见 bilibili_http_client.ENDPOINT_FAMILIES）使用独立的并发限制
+- 默认并发数上限见 DEFAULT_CONCURRENCY，可在创建引擎时按接口族覆盖
+- 发送前从共享令牌桶限速器获取许可（见 bilibili_rate_limiter）
+- 遇到风控(412/-352/-412/-799)时由AIMD控制器下调该接口族的速率和并发数，
+  连续成功后逐步回升；仅当前请求等待后重试，不阻塞其他接口族
+- 与同步爬虫共用响应缓存（见 bilibili_response_cache），命中时不发送请求
+- 同时进行的相同请求只发送一次，其余协程共享结果（见 bilibili_single_flight）
+
+使用方法：
+    python bilibili_async_engine.py 13265324 23947287 --view-concurrency 8
+    
+    或在代码中：
+    async with AsyncCrawlEngine(cookie_dict, concurrency={"view": 8}) as engine:
+        detail = await engine.get_video_detail(bvid="BV1vVL4zpEAV")
+"""
+
+import argparse
+import asyncio
+import json
+import os
+
+import aiohttp
+
+from bilibili_cookie_manager import get_cookie, report_auth_error, AUTH_ERROR_CODE
+from bilibili_http_client import get_headers, get_endpoint_family, DEFAULT_ENDPOINT_FAMILY
+from bilibili_http_client import record_transfer, print_transfer_stats
+from bilibili_rate_limiter import get_rate_limiter
+from bilibili_adaptive_control import get_aimd_controller, THROTTLE_STATUS_CODES, THROTTLE_API_CODES
+from bilibili_wbi import get_wbi_signer
+from bilibili_response_cache import get_response_cache, get_cache_key, is_cacheable_data
+from bilibili_single_flight import AsyncSingleFlight
+from bilibili_player import PLAYER_URL, get_player_cache, get_player_cache_key, parse_player_response
+from up_all_video_spider import (format_video_basic, apply_video_detail, build_up_videos_params,
+                                 dedup_videos, UP_VIDEOS_PAGE_SIZE)
+from signature_avatar_spider_job import format_up_info
+from bilibili_record_io import open_record_sink, DEFAULT_OUTPUT_FORMAT, SINK_FORMATS
+
+# 各接口族的默认并发数
+DEFAULT_CONCURRENCY = {
+    "view": 8,
+    "space_wbi": 2,
+    "player": 4,
+    DEFAULT_ENDPOINT_FAMILY: 4,
+}
+
+# 同时抓取的UP主数量
+DEFAULT_MID_CONCURRENCY = 4
+
+class AdaptiveConcurrencyLimit:
+    """上限可动态调整的异步并发限制（用法同 asyncio.Semaphore）"""
+    
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._active = 0
+        self._condition = asyncio.Condition()
+    
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+    
+    async def set_limit(self, limit):
+        """调整并发上限，调低时已在执行的请求不受影响，调高时唤醒等待中的请求"""
+        limit = max(1, limit)
+        raised = limit > self.limit
+        self.limit = limit
+        if raised:
+            async with self._condition:
+                self._condition.notify_all()
+
+class AsyncCrawlEngine:
+    """按接口族限制并发的异步抓取引擎"""
+    
+    def __init__(self, cookie_dict=None, concurrency=None, max_retries=3, timeout=30):
+        """
+        参数:
+            cookie_dict: Cookie字典
+            concurrency: 按接口族覆盖默认并发数上限，如 {"view": 8, "space_wbi": 2}
+            max_retries: 被风控拦截时的最大重试次数
+            timeout: 单个请求的超时时间(秒)
+        """
+        self.cookie_dict = cookie_dict or {}
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        if concurrency:
+            self.concurrency.update(concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._limits = {}
+        self._session = None
+        self._flight = AsyncSingleFlight()
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def start(self):
+        """创建底层HTTP会话"""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=sum(self.concurrency.values()), ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+    
+    async def close(self):
+        """关闭底层HTTP会话"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    def _get_limit(self, family):
+        """获取接口族对应的并发限制"""
+        limit = self._limits.get(family)
+        if limit is None:
+            max_concurrency = self.concurrency.get(family, self.concurrency[DEFAULT_ENDPOINT_FAMILY])
+            limit = AdaptiveConcurrencyLimit(get_aimd_controller().get_concurrency(family, max_concurrency))
+            self._limits[family] = limit
+        return limit
+    
+    async def request_json(self, url, params=None, sign_wbi=False, use_cache=True):
+        """
+        发送GET请求并返回解析后的JSON
+        
+        参数:
+            url: 请求地址
+            params: 请求参数
+            sign_wbi: 是否对参数进行WBI签名（每次重试都会重新签名）
+            use_cache: 是否使用响应缓存，命中时不发送请求
+        
+        返回:
+            dict，请求失败或多次被412拦截后返回None；
+            多次返回风控码(-352/-412/-799)时返回最后一次的JSON
+        """
+        # 先查响应缓存（缓存键按签名前的参数计算）
+        cache = get_response_cache() if use_cache else None
+        cache_key = get_cache_key(url, params, self.cookie_dict)
+        if cache is not None:
+            # 磁盘层查找在线程池中执行，其他进程锁住缓存数据库时不阻塞事件循环
+            entry = await cache.get_async(cache_key)
+            if entry is not None:
+                return json.loads(entry["content"])
+        
+        # 其他协程正在进行相同请求时等待其完成并共享结果，不重复发送
+        return await self._flight.do(cache_key, lambda: self._fetch_json(url, params, sign_wbi, cache, cache_key))
+    
+    async def _fetch_json(self, url, params, sign_wbi, cache, cache_key):
+        """request_json 的实际发送流程（限速、并发限制、风控重试、写入缓存）"""
+        family = get_endpoint_family(url)
+        await self.start()
+        limit = self._get_limit(family)
+        controller = get_aimd_controller()
+        
+        data = None
+        retries = 0
+        while retries < self.max_retries:
+            request_params = dict(params) if params else {}
+            if sign_wbi:
+                request_params = get_wbi_signer().sign(request_params)
+            
+            # 先按令牌桶获取发送许可，等待期间不占用并发名额
+            await get_rate_limiter().acquire_async(url, self.cookie_dict)
+            
+            # 不指定Accept-Encoding，由aiohttp按本地可用的解码器协商压缩格式并自动解压
+            headers = get_headers(self.cookie_dict)
+            headers.pop("Accept-Encoding", None)
+            
+            async with limit:
+                try:
+                    async with self._session.get(url, params=request_params, headers=headers) as response:
+                        status = response.status
+                        data = None
+                        if status == 200:
+                            body = await response.read()
+                            # Content-Length 为压缩后的传输大小，分块传输时无此头，按解压后大小计
+                            record_transfer(url, response.content_length or len(body), len(body),
+                                            response.headers.get("Content-Encoding"))
+                            data = json.loads(body)
+                            if cache is not None and is_cacheable_data(data):
+                                await cache.set_async(cache_key, body, family=family, url=url,
+                                                      headers={"Content-Type": response.headers.get("Content-Type", "")})
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    print(f"请求 {url} 出错: {e}")
+                    return None
+            
+            # 检查是否被拦截（在并发限制外等待，不占用并发名额）
+            throttle_code = None
+            if status in THROTTLE_STATUS_CODES:
+                throttle_code = status
+            elif isinstance(data, dict) and data.get('code') in THROTTLE_API_CODES:
+                throttle_code = data['code']
+            
+            if throttle_code is not None:
+                backoff = controller.on_throttle(family)
+                await limit.set_limit(controller.get_concurrency(family, limit.limit))
+                print(f"请求被拦截(代码 {throttle_code})，{backoff:.1f}秒后重试...")
+                await asyncio.sleep(backoff)
+                retries += 1
+                continue
+            
+            if status != 200:
+                print(f"请求 {url} 失败，状态码: {status}")
+                return None
+            
+            if self.cookie_dict and isinstance(data, dict) and data.get('code') == AUTH_ERROR_CODE:
+                # 登录态失效，通知Cookie会话下次获取时重新检查
+                report_auth_error(self.cookie_dict)
+            controller.on_success(family)
+            await limit.set_limit(controller.get_concurrency(family, limit.limit))
+            return data
+        
+        print(f"请求失败，已尝试{self.max_retries}次")
+        return data
+    
+    async def get_video_detail(self, bvid=None, aid=None):
+        """获取单个视频的详细信息，返回值与同步版本相同"""
+        params = {}
+        if bvid:
+            params['bvid'] = bvid
+        elif aid:
+            params['aid'] = aid
+        else:
+            return None
+        
+        url = "https://api.bilibili.com/x/web-interface/view"
+        return await self.request_json(url, params)
+    
+    async def get_up_videos(self, mid, max_pages=100):
+        """
+        获取UP主所有视频列表(vlist)
+        
+        先请求第1页，从 page.count 得到总页数后并发请求剩余分页（受 space_wbi 并发上限约束），
+        按页码顺序拼接并按bvid去重；第1页没有总数时退回逐页请求
+        """
+        url = "https://api.bilibili.com/x/space/wbi/arc/search"
+        
+        async def fetch_page(page):
+            data = await self.request_json(url, build_up_videos_params(mid, page), sign_wbi=True)
+            if data is None:
+                print(f"UP主 {mid} 第{page}页请求失败，跳过该页")
+                return None
+            if data.get('code') != 0 or not data['data'].get('list', {}).get('vlist'):
+                print(f"UP主 {mid} 获取第{page}页失败或已无更多视频，状态码：{data.get('code')}")
+                return None
+            videos = data['data']['list']['vlist']
+            print(f"UP主 {mid} 成功获取第{page}页，共{len(videos)}个视频")
+            return data
+        
+        first = await fetch_page(1)
+        if first is None:
+            return []
+        all_videos = list(first['data']['list']['vlist'])
+        
+        total = first['data'].get('page', {}).get('count')
+        if total:
+            page_count = min(max_pages, (total + UP_VIDEOS_PAGE_SIZE - 1) // UP_VIDEOS_PAGE_SIZE)
+            # gather 按页码顺序返回结果
+            results = await asyncio.gather(*(fetch_page(page) for page in range(2, page_count + 1)))
+            for data in results:
+                if data is not None:
+                    all_videos.extend(data['data']['list']['vlist'])
+        else:
+            # 没有总数时逐页请求，直到某页不足一整页
+            page = 1
+            last_count = len(all_videos)
+            while last_count >= UP_VIDEOS_PAGE_SIZE and page < max_pages:
+                page += 1
+                data = await fetch_page(page)
+                if data is None:
+                    break
+                videos = data['data']['list']['vlist']
+                all_videos.extend(videos)
+                last_count = len(videos)
+        
+        return dedup_videos(all_videos)
+    
+    async def get_up_info(self, mid):
+        """获取UP主签名和头像信息"""
+        url = "https://api.bilibili.com/x/space/wbi/acc/info"
+        data = await self.request_json(url, {'mid': mid}, sign_wbi=True)
+        
+        if data is None:
+            print(f"获取UP主 {mid} 信息失败，请求超时或被拒绝")
+            return None
+        
+        if data.get('code') != 0:
+            print(f"获取UP主 {mid} 信息失败，状态码：{data.get('code')}，信息：{data.get('message')}")
+            return None
+        
+        return format_up_info(data['data'])
+    
+    async def get_player_info(self, aid, cid):
+        """获取分P的播放器信息，与同步爬虫共用播放器信息缓存"""
+        cache = get_player_cache()
+        key = get_player_cache_key(aid, cid, self.cookie_dict)
+        info = cache.get(key)
+        if info is not None:
+            return info
+        
+        info = parse_player_response(aid, cid, await self.request_json(PLAYER_URL, {'aid': aid, 'cid': cid}))
+        if info is not None:
+            cache.set(key, info)
+        return info
+    
+    async def get_subtitle_list(self, aid, cid):
+        """获取视频某一分P的字幕列表"""
+        info = await self.get_player_info(aid, cid)
+        return info.subtitles if info is not None else []
+    
+    async def get_subtitle_content(self, subtitle_url):
+        """获取字幕内容（JSON格式，包含body）"""
+        if not subtitle_url:
+            return None
+        
+        # 补全URL
+        if not subtitle_url.startswith('http'):
+            subtitle_url = f"https:{subtitle_url}"
+        
+        return await self.request_json(subtitle_url)
+    
+    async def crawl_up_videos(self, mid, on_result=None):
+        """
+        获取UP主所有视频及其详情，返回格式化后的视频列表
+        
+        on_result 为每个视频补全后立即调用的函数（按完成顺序），用于逐条写出结果
+        """
+        videos = await self.get_up_videos(mid)
+        print(f"UP主 {mid} 共有 {len(videos)} 个视频")
+        
+        async def enrich(video):
+            video_data = format_video_basic(video)
+            detail = await self.get_video_detail(bvid=video['bvid'])
+            apply_video_detail(video_data, detail)
+            if on_result is not None:
+                on_result(video_data)
+            return video_data
+        
+        # 并发获取详情，gather 保持原有顺序
+        return await asyncio.gather(*(enrich(video) for video in videos))
+
+async def crawl_up_masters(mids, cookie_dict=None, concurrency=None, mid_concurrency=DEFAULT_MID_CONCURRENCY,
+                           output_format=DEFAULT_OUTPUT_FORMAT):
+    """
+    并发抓取多个UP主的全部视频
+    
+    每个UP主的结果逐条写入 data/up_{mid}_videos_combined.ndjson（记录顺序为完成顺序），
+    output_format="json" 时保存为与 up_all_video_spider 原有格式相同的JSON数组
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+        print(f"创建data目录: {data_dir}")
+    
+    mid_semaphore = asyncio.Semaphore(mid_concurrency)
+    
+    async with AsyncCrawlEngine(cookie_dict, concurrency=concurrency) as engine:
+        async def crawl_one(mid):
+            output_path = os.path.join(data_dir, f"up_{mid}_videos_combined")
+            # 先取得名额再打开输出文件，同时打开的文件数不超过 mid_concurrency
+            async with mid_semaphore:
+                with open_record_sink(output_path, output_format) as sink:
+                    await engine.crawl_up_videos(mid, on_result=sink.write)
+            print(f"视频信息已保存至: {sink.path}")
+            return sink.path
+        
+        output_files = await asyncio.gather(*(crawl_one(mid) for mid in mids))
+    
+    # 打印各接口族最终的自适应速率和传输字节数
+    get_aimd_controller().print_metrics()
+    print_transfer_stats()
+    return output_files
+
+def main():
+    parser = argparse.ArgumentParser(description='异步并发抓取B站UP主的全部视频数据')
+    parser.add_argument('mids', nargs='+', type=int, help='UP主的mid，可指定多个')
+    parser.add_argument('--view-concurrency', type=int, default=DEFAULT_CONCURRENCY['view'],
+                        help='视频详情接口(/x/web-interface/view)并发数')
+    parser.add_argument('--space-concurrency', type=int, default=DEFAULT_CONCURRENCY['space_wbi'],
+                        help='用户空间接口(/x/space/wbi/*)并发数')
+    parser.add_argument('--player-concurrency', type=int, default=DEFAULT_CONCURRENCY['player'],
+                        help='播放器接口(/x/player/v2)并发数')
+    parser.add_argument('--mid-concurrency', type=int, default=DEFAULT_MID_CONCURRENCY,
+                        help='同时抓取的UP主数量')
+    parser.add_argument('--output-format', choices=sorted(SINK_FORMATS), default=DEFAULT_OUTPUT_FORMAT,
+                        help='输出格式，json 为原有的JSON数组格式')
+    args = parser.parse_args()
+    
+    # 使用 bilibili_cookie_manager 获取 cookie
+    cookie_dict = get_cookie()
+    if not cookie_dict:
+        print("没有有效的Cookie，将使用无登录模式请求（可能会受到更多限制）")
+        cookie_dict = {}
+    
+    concurrency = {
+        'view': args.view_concurrency,
+        'space_wbi': args.space_concurrency,
+        'player': args.player_concurrency,
+    }
+    asyncio.run(crawl_up_masters(args.mids, cookie_dict=cookie_dict, concurrency=concurrency,
+                                 mid_concurrency=args.mid_concurrency, output_format=args.output_format))
+
+if __name__ == "__main__":
+    main()
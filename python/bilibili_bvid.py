@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+B站AV号/BV号转换模块
+====================
+
+按照 docs/misc/bvid_desc.md 中的算法在本地完成AV号与BV号的互相转换，无需请求接口。
+
+功能：
+1. av2bv / bv2av：单个ID转换
+2. av2bv_batch / bv2av_batch：批量转换，安装 NumPy 时按列向量化计算，百万级ID也不会卡在Python循环上
+3. normalize_video_ids：将混合格式的ID列表（BV号、av123、纯数字）统一为去重后的AV号
+
+使用方法：
+    from bilibili_bvid import av2bv, bv2av, bv2av_batch, normalize_video_ids
+    
+    bvid = av2bv(111298867365120)   # "BV1L9Uoa9EUx"
+    aid = bv2av("BV1L9Uoa9EUx")     # 111298867365120
+    aids = bv2av_batch(bvids)        # 无效的BV号对应 -1
+    aids = normalize_video_ids(["BV1L9Uoa9EUx", "av170001", "170001"])
+
+性能对比（同时校验批量结果与逐个转换完全一致）：
+    python bilibili_bvid.py --benchmark
+"""
+
+import argparse
+import random
+import time
+
+# 可选依赖：NumPy 向量化批量转换
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+XOR_CODE = 23442827791579
+MASK_CODE = 2251799813685247
+MAX_AID = 1 << 51
+ALPHABET = "FcwAPNKTMug3GV5Lj7EJnHpWsx4tb8haYeviqBz6rkCy12mUSDQX9RdoZf"
+ENCODE_MAP = 8, 7, 0, 5, 1, 3, 2, 4, 6
+DECODE_MAP = tuple(reversed(ENCODE_MAP))
+
+BASE = len(ALPHABET)
+PREFIX = "BV1"
+PREFIX_LEN = len(PREFIX)
+CODE_LEN = len(ENCODE_MAP)
+
+def av2bv(aid):
+    """AV号转BV号，AV号超出 1 到 2^51-1 的范围时抛出 ValueError"""
+    if not 0 < aid < MAX_AID:
+        raise ValueError(f"AV号超出可转换范围: {aid}")
+    bvid = [""] * CODE_LEN
+    tmp = (MAX_AID | aid) ^ XOR_CODE
+    for i in range(CODE_LEN):
+        bvid[ENCODE_MAP[i]] = ALPHABET[tmp % BASE]
+        tmp //= BASE
+    return PREFIX + "".join(bvid)
+
+def bv2av(bvid):
+    """BV号转AV号，BV号格式不正确时抛出 ValueError"""
+    if len(bvid) != PREFIX_LEN + CODE_LEN or bvid[:PREFIX_LEN].upper() != PREFIX.upper():
+        raise ValueError(f"无效的BV号: {bvid}")
+    
+    code = bvid[PREFIX_LEN:]
+    tmp = 0
+    for i in range(CODE_LEN):
+        idx = ALPHABET.find(code[DECODE_MAP[i]])
+        if idx < 0:
+            raise ValueError(f"无效的BV号: {bvid}")
+        tmp = tmp * BASE + idx
+    return (tmp & MASK_CODE) ^ XOR_CODE
+
+# BV号总长度
+BVID_LEN = PREFIX_LEN + CODE_LEN
+
+if HAS_NUMPY:
+    # 字符编码 -> 在 ALPHABET 中的位置，不在表中的字符为 -1
+    _DECODE_TABLE = np.full(256, -1, dtype=np.int64)
+    _DECODE_TABLE[np.frombuffer(ALPHABET.encode('ascii'), dtype=np.uint8)] = np.arange(BASE)
+    _ALPHABET_CODES = np.frombuffer(ALPHABET.encode('ascii'), dtype=np.uint8)
+    _PREFIX_CODES = np.frombuffer(PREFIX.encode('ascii'), dtype=np.uint8)
+
+def av2bv_batch(aids):
+    """
+    批量AV号转BV号
+    
+    安装 NumPy 时返回 numpy 字符串数组，否则返回列表；AV号需在 1 到 2^51-1 之间，超出范围时抛出 ValueError
+    """
+    if not HAS_NUMPY:
+        return [av2bv(aid) for aid in aids]
+    
+    aids = np.asarray(aids, dtype=np.int64)
+    if aids.size and (aids.min() <= 0 or aids.max() >= MAX_AID):
+        raise ValueError("AV号超出可转换范围")
+    
+    tmp = (aids | MAX_AID) ^ XOR_CODE
+    codes = np.empty((aids.size, BVID_LEN), dtype=np.uint8)
+    codes[:, :PREFIX_LEN] = _PREFIX_CODES
+    for i in range(CODE_LEN):
+        codes[:, PREFIX_LEN + ENCODE_MAP[i]] = _ALPHABET_CODES[tmp % BASE]
+        tmp //= BASE
+    return codes.view(f"S{BVID_LEN}").ravel().astype(f"U{BVID_LEN}")
+
+def bv2av_batch(bvids):
+    """
+    批量BV号转AV号
+    
+    安装 NumPy 时返回 int64 数组，否则返回列表；格式不正确的BV号对应 -1
+    """
+    if not HAS_NUMPY:
+        result = []
+        for bvid in bvids:
+            try:
+                result.append(bv2av(bvid))
+            except (TypeError, ValueError):
+                result.append(-1)
+        return result
+    
+    bvids = np.asarray(bvids, dtype=str)
+    # 多取一位用于识别超长的字符串；非ASCII字符无法编码为字节串，先按无效值替换
+    ascii_mask = np.char.isascii(bvids) if hasattr(np.char, 'isascii') else np.array(
+        [bvid.isascii() for bvid in bvids.ravel()], dtype=bool).reshape(bvids.shape)
+    encoded = np.where(ascii_mask, bvids, "").astype(f"S{BVID_LEN + 1}")
+    codes = encoded.view(np.uint8).reshape(-1, BVID_LEN + 1)
+    
+    # 前缀不区分大小写，长度必须正好为 BVID_LEN
+    valid = ((codes[:, :PREFIX_LEN] | 0x20) == (_PREFIX_CODES | 0x20)).all(axis=1)
+    valid &= (codes[:, BVID_LEN - 1] != 0) & (codes[:, BVID_LEN] == 0)
+    
+    tmp = np.zeros(codes.shape[0], dtype=np.int64)
+    for i in range(CODE_LEN):
+        idx = _DECODE_TABLE[codes[:, PREFIX_LEN + DECODE_MAP[i]]]
+        valid &= idx >= 0
+        tmp = tmp * BASE + idx
+    
+    result = (tmp & MASK_CODE) ^ XOR_CODE
+    result[~valid] = -1
+    return result
+
+def normalize_video_ids(video_ids, unique=True):
+    """
+    将混合格式的视频ID（BV号、av123、纯数字）统一转换为AV号
+    
+    只去掉一个不区分大小写的 av 前缀，前缀之后必须全部是数字（如 avav3、av+3 视为无法识别）
+    
+    参数:
+        video_ids: 视频ID列表
+        unique: 是否去重并排序
+    
+    返回:
+        安装 NumPy 时为 int64 数组，否则为列表；无法识别的ID被丢弃
+    """
+    if not HAS_NUMPY:
+        aids = []
+        for video_id in video_ids:
+            video_id = str(video_id).strip()
+            try:
+                if video_id[:2].upper() == "BV":
+                    aids.append(bv2av(video_id))
+                else:
+                    number = video_id[2:] if video_id[:2].lower() == "av" else video_id
+                    if number.isdecimal() and len(number) <= 18 and int(number) > 0:
+                        aids.append(int(number))
+            except ValueError:
+                continue
+        return sorted(set(aids)) if unique else aids
+    
+    ids = np.char.strip(np.asarray(video_ids, dtype=str))
+    is_bvid = np.char.startswith(np.char.upper(ids), "BV")
+    aids = np.full(ids.size, -1, dtype=np.int64)
+    
+    if is_bvid.any():
+        aids[is_bvid] = bv2av_batch(ids[is_bvid])
+    
+    others = ~is_bvid
+    if others.any():
+        numbers = ids[others]
+        lowered = np.char.lower(numbers)
+        has_prefix = np.char.startswith(lowered, "av")
+        # 以 av 开头时 partition 的第三部分就是去掉这一个前缀后的内容
+        numbers = np.where(has_prefix, np.char.partition(lowered, "av")[..., 2], numbers)
+        # 最多取18位数字，避免超出 int64 范围
+        is_number = np.char.isdecimal(numbers) & (np.char.str_len(numbers) <= 18)
+        values = np.full(numbers.size, -1, dtype=np.int64)
+        values[is_number] = numbers[is_number].astype(np.int64)
+        aids[others] = values
+    
+    aids = aids[aids > 0]
+    return np.unique(aids) if unique else aids
+
+def benchmark_bvid_conversion(count=1000000):
+    """对比逐个转换与批量转换的速度，并校验结果完全一致"""
+    aids = [random.randrange(1, MAX_AID) for _ in range(count)]
+    
+    start = time.perf_counter()
+    scalar_bvids = [av2bv(aid) for aid in aids]
+    av2bv_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    scalar_aids = [bv2av(bvid) for bvid in scalar_bvids]
+    bv2av_time = time.perf_counter() - start
+    assert scalar_aids == aids, "逐个转换结果不一致"
+    
+    print(f"转换 {count} 个ID")
+    print(f"av2bv 逐个转换: {av2bv_time:.3f}秒")
+    print(f"bv2av 逐个转换: {bv2av_time:.3f}秒")
+    
+    if not HAS_NUMPY:
+        print("未安装 NumPy，批量转换使用逐个转换，跳过对比")
+        return av2bv_time, bv2av_time, None, None
+    
+    aid_array = np.array(aids, dtype=np.int64)
+    start = time.perf_counter()
+    batch_bvids = av2bv_batch(aid_array)
+    av2bv_batch_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    batch_aids = bv2av_batch(batch_bvids)
+    bv2av_batch_time = time.perf_counter() - start
+    
+    assert batch_bvids.tolist() == scalar_bvids, "av2bv 批量转换结果与逐个转换不一致"
+    assert (batch_aids == aid_array).all(), "bv2av 批量转换结果与逐个转换不一致"
+    
+    print(f"av2bv_batch: {av2bv_batch_time:.3f}秒 (提速 {av2bv_time / av2bv_batch_time:.1f}x)")
+    print(f"bv2av_batch: {bv2av_batch_time:.3f}秒 (提速 {bv2av_time / bv2av_batch_time:.1f}x)")
+    print("批量转换结果与逐个转换完全一致")
+    return av2bv_time, bv2av_time, av2bv_batch_time, bv2av_batch_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站AV号/BV号转换工具')
+    parser.add_argument('ids', nargs='*', help='要转换的AV号或BV号')
+    parser.add_argument('--benchmark', action='store_true', help='运行转换性能对比')
+    parser.add_argument('--count', type=int, default=1000000, help='性能对比使用的ID数量')
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark_bvid_conversion(args.count)
+    else:
+        for video_id in args.ids:
+            try:
+                if video_id[:2].upper() == "BV":
+                    print(f"{video_id} -> av{bv2av(video_id)}")
+                else:
+                    aid = int(video_id[2:] if video_id[:2].lower() == "av" else video_id)
+                    print(f"av{aid} -> {av2bv(aid)}")
+            except ValueError as e:
+                print(f"无法转换 {video_id}: {e}")
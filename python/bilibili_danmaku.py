@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+B站protobuf弹幕抓取模块
+======================
+
+基于 /x/v2/dm/web/seg.so 分段接口获取视频弹幕（见 docs/danmaku/danmaku_proto.md），
+替代下载整个XML弹幕文件（list.so）再用正则计数的做法。
+
+功能：
+1. 按视频时长计算6分钟分段数，并发获取一个cid的全部分段，按分段顺序逐条输出弹幕记录
+2. 解码使用 bilibili.community.service.dm.v1 中 DmSegMobileReply / DanmakuElem 的定义
+   （grpc_api/bilibili/community/service/dm/v1/dm.proto）
+3. 只需要数量时走计数快速路径：只扫描每个分段的顶层字段，不解码弹幕内容
+4. 结果可写入 ndjson / json / sqlite 等输出格式（见 bilibili_record_io）
+
+依赖：
+- 安装 protobuf 时按 dm.proto 中的字段定义构建消息类，由 protobuf 的C实现解码
+- 未安装时使用内置的纯Python解码器，结果相同
+
+使用方法：
+    python bilibili_danmaku.py BV1L9Uoa9EUx            # 保存全部分P的弹幕
+    python bilibili_danmaku.py BV1L9Uoa9EUx --count    # 只统计弹幕数
+    
+    或在代码中：
+    from bilibili_danmaku import iter_danmaku, count_danmaku
+    
+    for elem in iter_danmaku(cid, aid=aid, duration=duration):
+        print(elem['progress'], elem['content'])
+    total = count_danmaku(cid, aid=aid, duration=duration)
+"""
+
+import argparse
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from bilibili_cookie_manager import get_cookie
+from bilibili_http_client import controlled_request, is_json_response
+from bilibili_record_io import open_record_sink, DEFAULT_OUTPUT_FORMAT, SINK_FORMATS
+
+# 可选依赖：protobuf
+try:
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+    HAS_PROTOBUF = True
+except ImportError:
+    HAS_PROTOBUF = False
+
+DM_SEG_URL = "https://api.bilibili.com/x/v2/dm/web/seg.so"
+# 历史弹幕（需要登录，见 docs/danmaku/history.md）
+HISTORY_INDEX_URL = "https://api.bilibili.com/x/v2/dm/history/index"
+HISTORY_SEG_URL = "https://api.bilibili.com/x/v2/dm/web/history/seg.so"
+VIEW_URL = "https://api.bilibili.com/x/web-interface/view"
+
+# 每个分段包含6分钟的弹幕
+SEGMENT_DURATION_MS = 6 * 60 * 1000
+# 同时获取的分段数（实际请求速率仍由共享令牌桶限速器控制）
+DEFAULT_SEGMENT_WORKERS = 4
+# 时长未知时逐段探测的最大分段数
+MAX_PROBE_SEGMENTS = 100
+
+# DanmakuElem 中使用的字段：(字段号, 字段名, 类型)
+DANMAKU_ELEM_FIELDS = (
+    (1, "id", "int64"),
+    (2, "progress", "int32"),
+    (3, "mode", "int32"),
+    (4, "fontsize", "int32"),
+    (5, "color", "uint32"),
+    (6, "midHash", "string"),
+    (7, "content", "string"),
+    (8, "ctime", "int64"),
+    (9, "weight", "int32"),
+    (10, "action", "string"),
+    (11, "pool", "int32"),
+    (12, "idStr", "string"),
+    (13, "attr", "int32"),
+    (22, "animation", "string"),
+)
+DANMAKU_FIELD_NAMES = tuple(name for _, name, _ in DANMAKU_ELEM_FIELDS)
+
+# DmSegMobileReply.elems 的字段号
+ELEMS_FIELD_NUMBER = 1
+
+def _build_message_classes():
+    """按 dm.proto 的字段定义构建 DmSegMobileReply 消息类（未用到的字段按未知字段跳过）"""
+    field_types = {
+        "int64": descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+        "int32": descriptor_pb2.FieldDescriptorProto.TYPE_INT32,
+        "uint32": descriptor_pb2.FieldDescriptorProto.TYPE_UINT32,
+        "string": descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    }
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="bilibili/community/service/dm/v1/dm_seg.proto",
+        package="bilibili.community.service.dm.v1",
+        syntax="proto3",
+    )
+    elem = file_proto.message_type.add(name="DanmakuElem")
+    for number, name, kind in DANMAKU_ELEM_FIELDS:
+        elem.field.add(name=name, number=number, type=field_types[kind],
+                       label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL)
+    reply = file_proto.message_type.add(name="DmSegMobileReply")
+    reply.field.add(name="elems", number=ELEMS_FIELD_NUMBER,
+                    type=descriptor_pb2.FieldDescriptorProto.TYPE_MESSAGE,
+                    label=descriptor_pb2.FieldDescriptorProto.LABEL_REPEATED,
+                    type_name=".bilibili.community.service.dm.v1.DanmakuElem")
+    
+    # 使用独立的描述符池，不与自行编译的 dm_pb2 冲突
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    descriptor = pool.FindMessageTypeByName("bilibili.community.service.dm.v1.DmSegMobileReply")
+    if hasattr(message_factory, "GetMessageClass"):
+        return message_factory.GetMessageClass(descriptor)
+    return message_factory.MessageFactory(pool).GetPrototype(descriptor)
+
+DmSegMobileReply = _build_message_classes() if HAS_PROTOBUF else None
+
+def _read_varint(data, pos):
+    """读取一个varint，返回 (值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _skip_field(data, pos, wire_type):
+    """跳过一个字段的值，返回新位置"""
+    if wire_type == 0:
+        return _read_varint(data, pos)[1]
+    if wire_type == 1:
+        return pos + 8
+    if wire_type == 2:
+        length, pos = _read_varint(data, pos)
+        return pos + length
+    if wire_type == 5:
+        return pos + 4
+    raise ValueError(f"不支持的protobuf字段类型: {wire_type}")
+
+def _iter_elem_spans(data):
+    """遍历 DmSegMobileReply 中每条弹幕 (起始位置, 结束位置)"""
+    pos = 0
+    end = len(data)
+    while pos < end:
+        key, pos = _read_varint(data, pos)
+        if key >> 3 == ELEMS_FIELD_NUMBER and key & 7 == 2:
+            length, pos = _read_varint(data, pos)
+            yield pos, pos + length
+            pos += length
+        else:
+            pos = _skip_field(data, pos, key & 7)
+    if pos != end:
+        raise ValueError("弹幕分段数据不完整")
+
+# 纯Python解码器使用的字段表：字段号 -> (字段名, 类型)
+_FIELDS_BY_NUMBER = {number: (name, kind) for number, name, kind in DANMAKU_ELEM_FIELDS}
+_DEFAULTS = {name: ("" if kind == "string" else 0) for _, name, kind in DANMAKU_ELEM_FIELDS}
+
+def _decode_elem(data, pos, end):
+    """纯Python解码一条 DanmakuElem"""
+    elem = dict(_DEFAULTS)
+    while pos < end:
+        key, pos = _read_varint(data, pos)
+        field = _FIELDS_BY_NUMBER.get(key >> 3)
+        wire_type = key & 7
+        if field is None:
+            pos = _skip_field(data, pos, wire_type)
+            continue
+        
+        name, kind = field
+        if kind == "string":
+            length, pos = _read_varint(data, pos)
+            elem[name] = bytes(data[pos:pos + length]).decode("utf-8", errors="replace")
+            pos += length
+        else:
+            value, pos = _read_varint(data, pos)
+            if kind == "int32":
+                # 负数int32按64位补码编码
+                value &= 0xFFFFFFFF
+                if value >= 0x80000000:
+                    value -= 0x100000000
+            elif kind == "int64" and value >= 0x8000000000000000:
+                value -= 0x10000000000000000
+            elem[name] = value
+    return elem
+
+def decode_segment(data):
+    """
+    解码一个 DmSegMobileReply 分段
+    
+    返回:
+        弹幕记录列表，每条为 DANMAKU_FIELD_NAMES 字段组成的字典
+    """
+    if not data:
+        return []
+    if DmSegMobileReply is not None:
+        reply = DmSegMobileReply()
+        reply.ParseFromString(data)
+        return [{name: getattr(elem, name) for name in DANMAKU_FIELD_NAMES} for elem in reply.elems]
+    
+    view = memoryview(data)
+    return [_decode_elem(view, start, end) for start, end in _iter_elem_spans(view)]
+
+def count_segment(data):
+    """统计分段中的弹幕数，只扫描顶层字段，不解码弹幕内容"""
+    if not data:
+        return 0
+    return sum(1 for _ in _iter_elem_spans(memoryview(data)))
+
+def get_segment_count(duration):
+    """根据视频时长(秒)计算分段数"""
+    if not duration or duration <= 0:
+        return None
+    return max(1, math.ceil(duration * 1000 / SEGMENT_DURATION_MS))
+
+def get_segment_content(response, description):
+    """
+    取出分段响应中的protobuf数据
+    
+    接口出错（如 -101、-404）时同样返回HTTP 200，但响应体为JSON，此时打印错误信息并返回None
+    """
+    if response.status_code != 200:
+        print(f"获取{description}失败，状态码: {response.status_code}")
+        return None
+    if response.content and is_json_response(response):
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        print(f"获取{description}失败: {data.get('code')} {data.get('message')}")
+        return None
+    return response.content
+
+def fetch_segment(cid, segment_index, aid=None, cookie_dict=None):
+    """
+    获取一个弹幕分段的原始protobuf数据
+    
+    返回:
+        bytes（没有弹幕的分段为空字节串），请求失败时返回None
+    """
+    params = {
+        'type': 1,
+        'oid': cid,
+        'segment_index': segment_index,
+    }
+    if aid:
+        params['pid'] = aid
+    
+    try:
+        response = controlled_request(DM_SEG_URL, params, cookie_dict=cookie_dict)
+        if response is None:
+            return None
+        return get_segment_content(response, f"cid {cid} 第{segment_index}段弹幕")
+    except Exception as e:
+        print(f"获取cid {cid} 第{segment_index}段弹幕出错: {str(e)}")
+        return None
+
+def get_history_dates(cid, month, cookie_dict):
+    """
+    查询某月中有历史弹幕的日期（需要登录）
+    
+    参数:
+        month: 年月，格式 YYYY-MM
+    
+    返回:
+        日期列表（YYYY-MM-DD），没有弹幕时为空列表，请求失败时返回None
+    """
+    try:
+        response = controlled_request(HISTORY_INDEX_URL, {'type': 1, 'oid': cid, 'month': month},
+                                      cookie_dict=cookie_dict, use_cache=False)
+        if response is None or response.status_code != 200:
+            return None
+        data = response.json()
+        if data.get('code') != 0:
+            print(f"查询cid {cid} {month} 历史弹幕日期失败: {data.get('message')}")
+            return None
+        return data.get('data') or []
+    except Exception as e:
+        print(f"查询cid {cid} {month} 历史弹幕日期出错: {str(e)}")
+        return None
+
+def fetch_history_segment(cid, date, cookie_dict):
+    """
+    获取某一天的历史弹幕分段原始protobuf数据（需要登录）
+    
+    返回:
+        bytes，请求失败时返回None
+    """
+    try:
+        response = controlled_request(HISTORY_SEG_URL, {'type': 1, 'oid': cid, 'date': date},
+                                      cookie_dict=cookie_dict)
+        if response is None:
+            return None
+        return get_segment_content(response, f"cid {cid} {date} 历史弹幕")
+    except Exception as e:
+        print(f"获取cid {cid} {date} 历史弹幕出错: {str(e)}")
+        return None
+
+def iter_segments(cid, aid=None, duration=None, cookie_dict=None, max_workers=DEFAULT_SEGMENT_WORKERS,
+                  segment_count=None, transform=None, failed=None):
+    """
+    并发获取一个cid的全部弹幕分段，按分段顺序逐个产出
+    
+    参数:
+        cid: 视频cid
+        aid: 稿件avid（可选）
+        duration: 视频时长(秒)，用于计算分段数
+        cookie_dict: Cookie字典，无 SESSDATA 时部分视频只返回部分弹幕
+        max_workers: 同时获取的分段数
+        segment_count: 直接指定分段数，优先于 duration
+        transform: 在工作线程中对分段数据的处理函数（如 decode_segment / count_segment）
+        failed: 可选列表，请求或解析失败（被跳过）的分段序号会追加到其中，调用方据此判断结果是否完整
+    
+    产出:
+        (分段序号, transform(数据))；请求失败的分段被跳过。
+        分段数未知时逐段探测，遇到第一个空分段即停止
+    """
+    if segment_count is None:
+        segment_count = get_segment_count(duration)
+    limit = segment_count or MAX_PROBE_SEGMENTS
+    
+    def fetch(index):
+        data = fetch_segment(cid, index, aid=aid, cookie_dict=cookie_dict)
+        if data is None:
+            return None, False
+        if transform is None:
+            return data, bool(data)
+        try:
+            return transform(data), bool(data)
+        except Exception as e:
+            # 分段数据无法解析时按请求失败处理，不中断整个cid
+            print(f"解析cid {cid} 第{index}段弹幕出错: {str(e)}")
+            return None, False
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        window = deque()
+        next_index = 1
+        try:
+            while window or next_index <= limit:
+                # 保持 max_workers 个分段在途，结果按分段顺序产出
+                while next_index <= limit and len(window) < max(1, max_workers):
+                    window.append((next_index, executor.submit(fetch, next_index)))
+                    next_index += 1
+                
+                index, future = window.popleft()
+                result, has_data = future.result()
+                if result is None:
+                    if failed is not None:
+                        failed.append(index)
+                    continue
+                if not has_data and segment_count is None:
+                    # 探测模式下空分段视为结束，丢弃之后的分段
+                    break
+                yield index, result
+        finally:
+            for _, future in window:
+                future.cancel()
+
+def iter_danmaku(cid, aid=None, duration=None, cookie_dict=None, max_workers=DEFAULT_SEGMENT_WORKERS,
+                 segment_count=None):
+    """逐条产出一个cid的全部弹幕记录（按分段顺序，每条记录附带cid）"""
+    for _, elems in iter_segments(cid, aid=aid, duration=duration, cookie_dict=cookie_dict,
+                                  max_workers=max_workers, segment_count=segment_count,
+                                  transform=decode_segment):
+        for elem in elems:
+            elem['cid'] = cid
+            yield elem
+
+def count_danmaku(cid, aid=None, duration=None, cookie_dict=None, max_workers=DEFAULT_SEGMENT_WORKERS,
+                  segment_count=None):
+    """统计一个cid的弹幕数（计数快速路径，不解码弹幕内容）"""
+    return sum(count for _, count in iter_segments(cid, aid=aid, duration=duration, cookie_dict=cookie_dict,
+                                                   max_workers=max_workers, segment_count=segment_count,
+                                                   transform=count_segment))
+
+def get_video_pages(video_id, cookie_dict=None):
+    """
+    获取视频的aid和各分P信息
+    
+    返回:
+        (aid, [{'cid', 'page', 'part', 'duration'}, ...])，失败时返回 (None, [])
+    """
+    # 延迟导入，避免与 single_video_spider 循环引用
+    from single_video_spider import convert_video_id
+    
+    id_dict = convert_video_id(video_id)
+    if not id_dict:
+        print(f"无效的视频ID: {video_id}")
+        return None, []
+    
+    params = {'bvid': id_dict['bvid']} if id_dict['bvid'] else {'aid': id_dict['aid']}
+    response = controlled_request(VIEW_URL, params, cookie_dict=cookie_dict)
+    if response is None or response.status_code != 200:
+        print(f"获取视频 {video_id} 信息失败")
+        return None, []
+    data = response.json()
+    if data.get('code') != 0:
+        print(f"获取视频 {video_id} 信息失败: {data.get('message')}")
+        return None, []
+    
+    video_data = data['data']
+    pages = [{
+        'cid': page['cid'],
+        'page': page.get('page'),
+        'part': page.get('part'),
+        'duration': page.get('duration'),
+    } for page in video_data.get('pages') or []]
+    if not pages and video_data.get('cid'):
+        pages = [{'cid': video_data['cid'], 'page': 1, 'part': video_data.get('title'),
+                  'duration': video_data.get('duration')}]
+    return video_data.get('aid'), pages
+
+def main(video_id=None, count_only=False, output_format=DEFAULT_OUTPUT_FORMAT, max_workers=DEFAULT_SEGMENT_WORKERS):
+    cookie_dict = get_cookie()
+    if not cookie_dict:
+        print("警告: 没有有效的Cookie，部分视频只能获取部分弹幕")
+        cookie_dict = None
+    
+    if not video_id:
+        video_id = input("请输入视频BV号或AV号: ").strip()
+    
+    aid, pages = get_video_pages(video_id, cookie_dict)
+    if not pages:
+        return
+    
+    if count_only:
+        total = 0
+        for page in pages:
+            count = count_danmaku(page['cid'], aid=aid, duration=page['duration'],
+                                  cookie_dict=cookie_dict, max_workers=max_workers)
+            print(f"P{page['page']} {page['part']} (cid {page['cid']}): {count} 条弹幕")
+            total += count
+        print(f"共 {total} 条弹幕")
+        return total
+    
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    with open_record_sink(os.path.join(data_dir, f"danmaku_av{aid}"), output_format) as sink:
+        for page in pages:
+            before = sink.count
+            for elem in iter_danmaku(page['cid'], aid=aid, duration=page['duration'],
+                                     cookie_dict=cookie_dict, max_workers=max_workers):
+                sink.write(elem)
+            print(f"P{page['page']} {page['part']} (cid {page['cid']}): {sink.count - before} 条弹幕")
+    print(f"共 {sink.count} 条弹幕，已保存至: {sink.path}")
+    return sink.count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站protobuf弹幕抓取工具')
+    parser.add_argument('video_id', nargs='?', help='视频BV号或AV号')
+    parser.add_argument('--count', action='store_true', help='只统计弹幕数，不保存弹幕内容')
+    # sqlite 输出为视频库，不适用于弹幕记录
+    parser.add_argument('--output-format', choices=sorted(f for f in SINK_FORMATS if f != 'sqlite'),
+                        default=DEFAULT_OUTPUT_FORMAT,
+                        help=f'输出格式，默认为 {DEFAULT_OUTPUT_FORMAT}')
+    parser.add_argument('--workers', type=int, default=DEFAULT_SEGMENT_WORKERS,
+                        help=f'同时获取的分段数，默认为 {DEFAULT_SEGMENT_WORKERS}')
+    args = parser.parse_args()
+    
+    main(args.video_id, count_only=args.count, output_format=args.output_format, max_workers=args.workers)
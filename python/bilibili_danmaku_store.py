@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+B站弹幕列式存储模块
+==================
+
+按cid保存弹幕的列式存储，替代逐条保存XML或JSON字典，适合百万级cid的长期积累。
+
+特性：
+1. 每个cid一个压缩的 .npz 文件，按列保存 dmid、progress、mode、fontsize、color、ctime、
+   midHash（按16进制解析为uint32）、pool、weight；弹幕内容按 Arrow 的方式保存为
+   UTF-8字节块 + 偏移量数组，可通过 store_content=False 不保存
+2. 追加时按 dmid 去重，已有的弹幕不会重复保存，同一cid的数据始终按 dmid 排序
+3. cid文件按 cid 分散到256个子目录中，写入时先写临时文件再原子替换
+4. 清单数据库（manifest.db，SQLite）记录每个cid的弹幕数、最大发送时间和同步水位线
+5. 增量同步：登录状态下只获取水位线日期（含）之后有弹幕的历史弹幕日期分段
+   （/x/v2/dm/web/history/seg.so），不再重新下载全部分段；未登录或首次同步时获取全部分段，
+   依靠 dmid 去重只追加新弹幕
+
+使用方法：
+    from bilibili_danmaku_store import DanmakuStore
+    
+    store = DanmakuStore()
+    added = store.sync(cid, aid=aid, duration=duration, cookie_dict=cookie_dict)
+    columns = store.load(cid)   # {'dmid': ndarray, 'progress': ndarray, ...}
+
+命令行：
+    python bilibili_danmaku_store.py sync BV1L9Uoa9EUx
+    python bilibili_danmaku_store.py info 1176840
+    python bilibili_danmaku_store.py export 1176840 --output-format ndjson
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+# 可选依赖：NumPy
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from bilibili_cookie_manager import get_cookie
+from bilibili_danmaku import (iter_segments, get_history_dates, fetch_history_segment, get_video_pages,
+                              decode_segment, DEFAULT_SEGMENT_WORKERS)
+from bilibili_record_io import open_record_sink, DEFAULT_OUTPUT_FORMAT, SINK_FORMATS
+
+# 数据存储目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_STORE_DIR = os.path.join(DATA_DIR, "danmaku_store")
+
+# 定长列：(列名, 类型, 对应 DanmakuElem 字段)
+COLUMNS = (
+    ("dmid", "int64", "id"),
+    ("progress", "int32", "progress"),
+    ("mode", "uint8", "mode"),
+    ("fontsize", "uint8", "fontsize"),
+    ("color", "uint32", "color"),
+    ("ctime", "int64", "ctime"),
+    ("mid_hash", "uint32", "midHash"),
+    ("pool", "uint8", "pool"),
+    ("weight", "int8", "weight"),
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+
+MANIFEST_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS danmaku_cids ("
+    "cid INTEGER PRIMARY KEY, count INTEGER NOT NULL, max_ctime INTEGER, "
+    "watermark TEXT, synced_at REAL NOT NULL)"
+)
+
+def parse_mid_hash(value):
+    """midHash（crc32的16进制字符串）转为整数，无法解析时为0"""
+    try:
+        return int(value, 16) & 0xFFFFFFFF
+    except (TypeError, ValueError):
+        return 0
+
+def elems_to_columns(elems, store_content=True):
+    """将 decode_segment() 得到的弹幕记录转换为列数组"""
+    n = len(elems)
+    columns = {}
+    for name, dtype, field in COLUMNS:
+        if field == "midHash":
+            values = (parse_mid_hash(elem[field]) for elem in elems)
+        else:
+            values = (elem[field] for elem in elems)
+        columns[name] = np.fromiter(values, dtype=dtype, count=n)
+    
+    if store_content:
+        encoded = [elem['content'].encode('utf-8') for elem in elems]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=n), out=offsets[1:])
+        columns['content_offsets'] = offsets
+        columns['content'] = np.frombuffer(b''.join(encoded), dtype=np.uint8).copy()
+    return columns
+
+def decode_segment_columns(data, store_content=True):
+    """解码一个弹幕分段并直接转换为列数组（在工作线程中执行）"""
+    return elems_to_columns(decode_segment(data), store_content=store_content)
+
+def concat_columns(parts):
+    """按行拼接多组列数组"""
+    parts = [part for part in parts if part and len(part['dmid'])]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMN_NAMES}
+    if all('content' in part for part in parts):
+        offsets = [parts[0]['content_offsets']]
+        base = parts[0]['content_offsets'][-1]
+        for part in parts[1:]:
+            offsets.append(part['content_offsets'][1:] + base)
+            base += part['content_offsets'][-1]
+        columns['content_offsets'] = np.concatenate(offsets)
+        columns['content'] = np.concatenate([part['content'] for part in parts])
+    return columns
+
+def take_rows(columns, index):
+    """按行号选取行（弹幕内容按偏移量向量化重排）"""
+    result = {name: columns[name][index] for name in COLUMN_NAMES}
+    if 'content' in columns:
+        offsets = columns['content_offsets']
+        starts = offsets[:-1][index]
+        lengths = offsets[1:][index] - starts
+        new_offsets = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_offsets[1:])
+        # 每个字节在原字节块中的位置 = 所在行的原起点 + 行内偏移
+        positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+        result['content_offsets'] = new_offsets
+        result['content'] = columns['content'][positions]
+    return result
+
+def iter_months(start, end):
+    """产出 start 到 end（含）之间的每个月份 YYYY-MM"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f"{year:04d}-{month:02d}"
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+class DanmakuStore:
+    """按cid分文件保存的弹幕列式存储"""
+    
+    def __init__(self, root=DEFAULT_STORE_DIR, store_content=True):
+        """
+        参数:
+            root: 存储目录
+            store_content: 是否保存弹幕内容（不保存时只有定长列，占用更小）
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError("弹幕列式存储需要安装 numpy")
+        self.root = root
+        self.store_content = store_content
+        self._local = threading.local()
+        # 同一cid的读-合并-写需要互斥
+        self._cid_locks = {}
+        self._cid_locks_lock = threading.Lock()
+    
+    def _get_connection(self):
+        """每个线程使用独立的清单数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.root):
+                os.makedirs(self.root)
+            conn = sqlite3.connect(os.path.join(self.root, "manifest.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(MANIFEST_SCHEMA)
+            self._local.conn = conn
+        return conn
+    
+    def _get_cid_lock(self, cid):
+        with self._cid_locks_lock:
+            return self._cid_locks.setdefault(cid, threading.Lock())
+    
+    def get_path(self, cid):
+        """cid对应的数据文件路径"""
+        return os.path.join(self.root, f"{int(cid) % 256:02x}", f"{int(cid)}.npz")
+    
+    def load(self, cid):
+        """读取一个cid的全部列，不存在时返回None"""
+        path = self.get_path(cid)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    
+    def _save(self, cid, columns):
+        """写入临时文件后原子替换"""
+        path = self.get_path(cid)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(tmp_path, path)
+    
+    def append(self, cid, columns, watermark=None):
+        """
+        追加弹幕并按 dmid 去重
+        
+        参数:
+            cid: 视频cid
+            columns: elems_to_columns() 得到的列数组，可以为None（只更新水位线）
+            watermark: 新的同步水位线（YYYY-MM-DD）
+        
+        返回:
+            实际新增的弹幕数
+        """
+        with self._get_cid_lock(cid):
+            existing = self.load(cid)
+            old_count = len(existing['dmid']) if existing is not None else 0
+            if existing is not None and columns is not None and ('content' in existing) != ('content' in columns):
+                # 内容列不一致时只保留定长列
+                existing = {name: existing[name] for name in COLUMN_NAMES}
+                columns = {name: columns[name] for name in COLUMN_NAMES}
+            
+            merged = concat_columns([existing, columns])
+            new_count = old_count
+            if merged is not None and columns is not None and len(columns['dmid']):
+                # np.unique 返回每个 dmid 第一次出现的位置，已有的行排在前面因而优先保留
+                _, first = np.unique(merged['dmid'], return_index=True)
+                merged = take_rows(merged, first)
+                new_count = len(merged['dmid'])
+                if new_count != old_count:
+                    self._save(cid, merged)
+            
+            max_ctime = int(merged['ctime'].max()) if merged is not None and new_count else None
+            self._get_connection().execute(
+                "INSERT INTO danmaku_cids (cid, count, max_ctime, watermark, synced_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(cid) DO UPDATE SET count = excluded.count, max_ctime = excluded.max_ctime, "
+                "watermark = COALESCE(excluded.watermark, danmaku_cids.watermark), synced_at = excluded.synced_at",
+                (int(cid), new_count, max_ctime, watermark, time.time())
+            )
+            return new_count - old_count
+    
+    def get_info(self, cid):
+        """获取cid的清单信息 {'count', 'max_ctime', 'watermark', 'synced_at'}，未保存过时返回None"""
+        row = self._get_connection().execute(
+            "SELECT count, max_ctime, watermark, synced_at FROM danmaku_cids WHERE cid = ?", (int(cid),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'count': row[0], 'max_ctime': row[1], 'watermark': row[2], 'synced_at': row[3]}
+    
+    def iter_records(self, cid):
+        """逐条产出一个cid的弹幕记录，字段名与 decode_segment() 相同"""
+        columns = self.load(cid)
+        if columns is None:
+            return
+        has_content = 'content' in columns
+        if has_content:
+            offsets = columns['content_offsets']
+            content = columns['content'].tobytes()
+        lists = {name: columns[name].tolist() for name in COLUMN_NAMES}
+        for i in range(len(lists['dmid'])):
+            record = {field: lists[name][i] for name, _, field in COLUMNS}
+            record['midHash'] = format(record['midHash'], 'x')
+            record['idStr'] = str(record['id'])
+            if has_content:
+                record['content'] = content[offsets[i]:offsets[i + 1]].decode('utf-8')
+            record['cid'] = cid
+            yield record
+    
+    def _fetch_all(self, cid, aid, duration, cookie_dict, max_workers):
+        """
+        获取全部分段并转换为列数组
+        
+        返回:
+            (列数组或None, 是否所有分段都获取成功)
+        """
+        transform = lambda data: decode_segment_columns(data, self.store_content)
+        failed = []
+        parts = [columns for _, columns in iter_segments(cid, aid=aid, duration=duration, cookie_dict=cookie_dict,
+                                                         max_workers=max_workers, transform=transform,
+                                                         failed=failed)]
+        if failed:
+            print(f"cid {cid} 有 {len(failed)} 个分段获取失败: {failed}")
+        return concat_columns(parts), not failed
+    
+    def _fetch_history_since(self, cid, since, cookie_dict, max_workers):
+        """
+        获取水位线日期（含）之后每一天的历史弹幕分段并转换为列数组
+        
+        返回:
+            (列数组或None, 是否所有日期都获取成功)；查询日期失败时返回None
+        """
+        today = date.today()
+        dates = []
+        for month in iter_months(since, today):
+            month_dates = get_history_dates(cid, month, cookie_dict)
+            if month_dates is None:
+                return None
+            dates.extend(d for d in month_dates if d >= since.isoformat())
+        if not dates:
+            return None, True
+        
+        def fetch(day):
+            """返回 (列数组或None, 是否成功)"""
+            data = fetch_history_segment(cid, day, cookie_dict)
+            if data is None:
+                return None, False
+            if not data:
+                return None, True
+            try:
+                return decode_segment_columns(data, self.store_content), True
+            except Exception as e:
+                # 单天数据无法解析时按获取失败处理，其他日期的结果仍然保存
+                print(f"解析cid {cid} {day} 历史弹幕出错: {str(e)}")
+                return None, False
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = list(executor.map(fetch, dates))
+        failed = [day for day, (_, ok) in zip(dates, results) if not ok]
+        if failed:
+            print(f"cid {cid} 有 {len(failed)} 天的历史弹幕获取失败: {failed}")
+        return concat_columns([columns for columns, _ in results]), not failed
+    
+    def sync(self, cid, aid=None, duration=None, cookie_dict=None, full=False,
+             max_workers=DEFAULT_SEGMENT_WORKERS):
+        """
+        同步一个cid的弹幕
+        
+        已有水位线、已保存过弹幕且已登录时只获取水位线之后的历史弹幕日期；否则（或 full=True 时）获取全部分段。
+        两种方式都按 dmid 去重，只追加新弹幕。只有全部分段/日期都获取成功时才推进水位线，
+        有失败时保留原水位线（首次同步则不设置），下次同步重新获取
+        
+        返回:
+            新增的弹幕数
+        """
+        info = self.get_info(cid)
+        logged_in = bool(cookie_dict and cookie_dict.get('SESSDATA'))
+        watermark = date.today().isoformat()
+        
+        incremental = info is not None and info['watermark'] and info['count'] and logged_in and not full
+        if incremental:
+            result = self._fetch_history_since(cid, date.fromisoformat(info['watermark']), cookie_dict, max_workers)
+            if result is not None:
+                columns, complete = result
+            else:
+                print(f"cid {cid} 历史弹幕日期查询失败，改为获取全部分段")
+                incremental = False
+        if not incremental:
+            columns, complete = self._fetch_all(cid, aid, duration, cookie_dict, max_workers)
+        
+        if not complete:
+            print(f"cid {cid} 同步不完整，保留原水位线，下次同步时重新获取")
+            watermark = None
+        return self.append(cid, columns, watermark=watermark)
+    
+    def get_stats(self):
+        """获取存储统计：cid数、弹幕总数、数据文件总字节数"""
+        row = self._get_connection().execute("SELECT COUNT(*), COALESCE(SUM(count), 0) FROM danmaku_cids").fetchone()
+        total_bytes = 0
+        for directory, _, files in os.walk(self.root):
+            total_bytes += sum(os.path.getsize(os.path.join(directory, name))
+                               for name in files if name.endswith(".npz"))
+        return {'cids': row[0], 'danmaku': row[1], 'bytes': total_bytes}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站弹幕列式存储')
+    parser.add_argument('--root', default=DEFAULT_STORE_DIR, help='存储目录')
+    parser.add_argument('--no-content', action='store_true', help='不保存弹幕内容')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    sync_parser = subparsers.add_parser('sync', help='同步视频全部分P的弹幕')
+    sync_parser.add_argument('video_ids', nargs='+', help='视频BV号或AV号')
+    sync_parser.add_argument('--full', action='store_true', help='忽略水位线，重新获取全部分段')
+    sync_parser.add_argument('--workers', type=int, default=DEFAULT_SEGMENT_WORKERS)
+    
+    info_parser = subparsers.add_parser('info', help='查看cid的同步状态')
+    info_parser.add_argument('cids', nargs='*', type=int)
+    
+    export_parser = subparsers.add_parser('export', help='导出cid的弹幕记录')
+    export_parser.add_argument('cid', type=int)
+    export_parser.add_argument('--output-format', choices=sorted(f for f in SINK_FORMATS if f != 'sqlite'),
+                               default=DEFAULT_OUTPUT_FORMAT)
+    args = parser.parse_args()
+    
+    store = DanmakuStore(args.root, store_content=not args.no_content)
+    if args.command == 'sync':
+        cookie_dict = get_cookie() or None
+        if not cookie_dict:
+            print("警告: 没有有效的Cookie，无法增量同步历史弹幕，将获取全部分段")
+        for video_id in args.video_ids:
+            aid, pages = get_video_pages(video_id, cookie_dict)
+            for page in pages:
+                added = store.sync(page['cid'], aid=aid, duration=page['duration'], cookie_dict=cookie_dict,
+                                   full=args.full, max_workers=args.workers)
+                info = store.get_info(page['cid'])
+                print(f"{video_id} P{page['page']} (cid {page['cid']}): 新增 {added} 条，共 {info['count']} 条")
+    elif args.command == 'info':
+        for cid in args.cids:
+            print(f"cid {cid}: {store.get_info(cid)}")
+        stats = store.get_stats()
+        print(f"共 {stats['cids']} 个cid，{stats['danmaku']} 条弹幕，数据文件 {stats['bytes']} 字节")
+    elif args.command == 'export':
+        with open_record_sink(os.path.join(DATA_DIR, f"danmaku_cid{args.cid}"), args.output_format) as sink:
+            for record in store.iter_records(args.cid):
+                sink.write(record)
+        print(f"已导出 {sink.count} 条弹幕至: {sink.path}")
+    else:
+        parser.print_help()
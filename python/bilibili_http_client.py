@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+B站共享HTTP客户端模块
+====================
+
+所有爬虫脚本和 bilibili_cookie_manager 共用的HTTP传输层。
+
+功能：
+1. 按主机维护带连接池的 requests.Session，复用 TCP+TLS 连接（keep-alive）
+2. 统一生成请求头（get_headers），协商gzip/brotli/zstd压缩传输并透明解压
+3. 统一的频率控制请求函数 controlled_request（保留原有的412重试语义，默认使用令牌桶限速）
+4. 获取 bili_ticket（同时返回最新的WBI密钥）
+5. 按接口族统计压缩传输字节数与解压后字节数（print_transfer_stats）
+6. controlled_request 透明使用响应缓存（bilibili_response_cache），重复请求直接返回缓存
+7. controlled_request 合并同时进行的相同请求（bilibili_single_flight），只发送一次
+
+使用方法：
+    from bilibili_http_client import controlled_request, http_get
+
+    response = controlled_request(url, params, cookie_dict=cookie_dict)
+    response = http_get(url, params=params, headers=get_headers(cookie_dict))
+
+连接池参数可通过 configure_pool() 调整，调整后会重建所有会话。
+"""
+
+import hashlib
+import hmac
+import random
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from bilibili_single_flight import SingleFlight
+
+# 连接池默认参数
+DEFAULT_POOL_CONNECTIONS = 10  # 每个会话缓存的连接池数量
+DEFAULT_POOL_MAXSIZE = 20  # 每个主机连接池中保持的最大连接数
+DEFAULT_POOL_BLOCK = False  # 连接池耗尽时是否阻塞等待
+DEFAULT_CONNECT_RETRIES = 0  # 底层连接失败的重试次数（412重试由 controlled_request 负责）
+
+_pool_config = {
+    "pool_connections": DEFAULT_POOL_CONNECTIONS,
+    "pool_maxsize": DEFAULT_POOL_MAXSIZE,
+    "pool_block": DEFAULT_POOL_BLOCK,
+    "max_retries": DEFAULT_CONNECT_RETRIES,
+}
+
+# 按主机缓存的会话
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# controlled_request 的请求合并：相同请求同时只发送一次
+_request_flight = SingleFlight()
+
+# 按接口族统计的传输字节数（压缩后的传输大小和解压后的大小）
+_transfer_stats = {}
+_transfer_stats_lock = threading.Lock()
+
+# 接口族划分：并发数、频率控制等按接口族分别配置
+ENDPOINT_FAMILIES = [
+    ("view", ("/x/web-interface/view",)),  # 视频详情
+    ("space_wbi", ("/x/space/wbi/",)),  # 用户空间（投稿列表、用户信息等）
+    ("player", ("/x/player/v2", "/x/player/wbi/v2")),  # 播放器信息（字幕等）
+    ("danmaku", ("/x/v2/dm/",)),  # 分段弹幕
+]
+DEFAULT_ENDPOINT_FAMILY = "default"
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
+]
+
+def get_headers(cookie_dict=None):
+    """生成HTTP请求头"""
+    headers = {
+        "User-Agent": random.choice(USER_AGENTS),
+        "Referer": "https://www.bilibili.com/",
+        "Accept": "application/json, text/plain, */*",
+        "Origin": "https://www.bilibili.com",
+        # 按本地可用的解码器协商压缩格式（gzip/deflate，安装brotli、zstandard后追加br、zstd），
+        # requests 会自动透明解压
+        "Accept-Encoding": ACCEPT_ENCODING,
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
+    }
+    
+    # 如果提供了Cookie字典，转换为Cookie字符串
+    if cookie_dict and isinstance(cookie_dict, dict) and len(cookie_dict) > 0:
+        cookie_str = '; '.join([f"{k}={v}" for k, v in cookie_dict.items()])
+        headers["Cookie"] = cookie_str
+    
+    return headers
+
+def get_endpoint_family(url):
+    """根据URL路径获取所属接口族名称"""
+    path = urlsplit(url).path
+    for family, prefixes in ENDPOINT_FAMILIES:
+        if path.startswith(prefixes):
+            return family
+    return DEFAULT_ENDPOINT_FAMILY
+
+def configure_pool(pool_connections=None, pool_maxsize=None, pool_block=None, max_retries=None):
+    """
+    调整连接池参数
+    
+    参数:
+        pool_connections: 每个会话缓存的连接池数量
+        pool_maxsize: 每个主机连接池中保持的最大连接数，并发请求时应不小于并发数
+        pool_block: 连接池耗尽时是否阻塞等待空闲连接
+        max_retries: 底层连接失败（非HTTP状态码）的重试次数
+    """
+    with _sessions_lock:
+        if pool_connections is not None:
+            _pool_config["pool_connections"] = pool_connections
+        if pool_maxsize is not None:
+            _pool_config["pool_maxsize"] = pool_maxsize
+        if pool_block is not None:
+            _pool_config["pool_block"] = pool_block
+        if max_retries is not None:
+            _pool_config["max_retries"] = max_retries
+        
+        # 关闭旧会话，下次请求时按新参数重建
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def _create_session():
+    """创建一个挂载了连接池适配器的会话"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_pool_config["pool_connections"],
+        pool_maxsize=_pool_config["pool_maxsize"],
+        pool_block=_pool_config["pool_block"],
+        max_retries=_pool_config["max_retries"]
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # 会话只用于复用连接，不在请求之间保存服务器下发的Cookie，
+    # Cookie始终由调用方通过请求头显式传入
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+def get_session(url):
+    """获取目标URL所在主机的共享会话"""
+    host = urlsplit(url).netloc
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+    
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _create_session()
+            _sessions[host] = session
+        return session
+
+def close_sessions():
+    """关闭所有共享会话并释放连接"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def record_transfer(url, wire_bytes, decoded_bytes, content_encoding=None):
+    """记录一次响应的传输字节数（wire_bytes 为网络传输大小，decoded_bytes 为解压后大小）"""
+    family = get_endpoint_family(url)
+    encoding = content_encoding or "identity"
+    with _transfer_stats_lock:
+        stats = _transfer_stats.setdefault(family, {
+            "requests": 0,
+            "wire_bytes": 0,
+            "decoded_bytes": 0,
+            "encodings": {}
+        })
+        stats["requests"] += 1
+        stats["wire_bytes"] += wire_bytes
+        stats["decoded_bytes"] += decoded_bytes
+        stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+
+def get_request_flight_stats():
+    """获取请求合并统计：calls 为实际发送次数，shared 为被合并的请求数"""
+    return _request_flight.get_stats()
+
+def get_transfer_stats():
+    """获取按接口族统计的传输字节数"""
+    with _transfer_stats_lock:
+        return {family: dict(stats, encodings=dict(stats["encodings"]))
+                for family, stats in _transfer_stats.items()}
+
+def print_transfer_stats():
+    """打印按接口族统计的压缩前后字节数"""
+    for family, stats in sorted(get_transfer_stats().items()):
+        ratio = stats["decoded_bytes"] / stats["wire_bytes"] if stats["wire_bytes"] else 0
+        encodings = ", ".join(f"{k}={v}" for k, v in sorted(stats["encodings"].items()))
+        print(f"[{family}] 请求: {stats['requests']}, 传输: {stats['wire_bytes']} 字节, "
+              f"解压后: {stats['decoded_bytes']} 字节, 压缩比: {ratio:.2f}, 编码: {encodings}")
+
+def _record_response_transfer(url, response):
+    """统计已读取完毕的响应的传输字节数"""
+    decoded_bytes = len(response.content)
+    try:
+        # urllib3 的 tell() 返回从网络读取的原始（未解压）字节数
+        wire_bytes = response.raw.tell()
+    except Exception:
+        wire_bytes = 0
+    if not wire_bytes:
+        wire_bytes = int(response.headers.get("Content-Length") or decoded_bytes)
+    record_transfer(url, wire_bytes, decoded_bytes, response.headers.get("Content-Encoding"))
+
+def http_request(method, url, **kwargs):
+    """通过共享连接池发送请求，参数与 requests.request 相同"""
+    response = get_session(url).request(method, url, **kwargs)
+    if not kwargs.get("stream"):
+        _record_response_transfer(url, response)
+    return response
+
+def http_get(url, **kwargs):
+    """通过共享连接池发送GET请求"""
+    return http_request("GET", url, **kwargs)
+
+def http_post(url, **kwargs):
+    """通过共享连接池发送POST请求"""
+    return http_request("POST", url, **kwargs)
+
+def controlled_request(url, params, cookie_dict=None, delay_range=None, max_retries=3,
+                       blocked_delay_range=(30, 60), use_bili_ticket=False, use_cache=True):
+    """
+    发送请求并控制频率
+    
+    参数:
+        url: 请求地址
+        params: 请求参数
+        cookie_dict: Cookie字典
+        delay_range: 每次请求前的随机延时范围(秒)，为None时使用共享令牌桶限速器
+        max_retries: 被风控拦截时的最大重试次数
+        blocked_delay_range: 指定delay_range时，被拦截后重试前的固定随机等待范围(秒)；
+                             未指定delay_range时由AIMD控制器计算等待时间
+        use_bili_ticket: 未提供Cookie时是否先获取bili_ticket附加到请求中
+        use_cache: 是否使用响应缓存，命中时不发送请求也不消耗令牌；需要最新数据时传入False
+    
+    返回:
+        requests.Response（同时进行的相同请求共享同一个响应对象），多次被412拦截后返回None；
+        多次返回风控码(-352/-412/-799)时返回最后一次响应
+    """
+    # 延迟导入，避免与缓存模块循环引用
+    from bilibili_response_cache import get_response_cache, get_cache_key
+    
+    # 先查响应缓存（缓存键忽略wts/w_rid，已签名的请求同样可以命中）
+    cache = get_response_cache() if use_cache else None
+    cache_key = get_cache_key(url, params, cookie_dict)
+    if cache is not None:
+        cached = cache.get_response(cache_key)
+        if cached is not None:
+            return cached
+    
+    # 其他线程正在进行相同请求时等待其完成并共享同一个响应，不重复发送
+    return _request_flight.do(cache_key, lambda: _send_controlled_request(
+        url, params, cookie_dict, delay_range, max_retries, blocked_delay_range,
+        use_bili_ticket, cache, cache_key))
+
+def _send_controlled_request(url, params, cookie_dict, delay_range, max_retries,
+                             blocked_delay_range, use_bili_ticket, cache, cache_key):
+    """controlled_request 的实际发送流程（限速、风控重试、写入缓存）"""
+    # 延迟导入，避免与限速模块循环引用
+    from bilibili_adaptive_control import get_aimd_controller, get_throttle_code
+    from bilibili_rate_limiter import get_rate_limiter
+    
+    # 合并等待期间其他请求可能刚写入缓存
+    if cache is not None:
+        cached = cache.get_response(cache_key)
+        if cached is not None:
+            return cached
+    
+    # 获取bili_ticket（如果未提供自定义Cookie）
+    bili_ticket = None
+    if use_bili_ticket and not cookie_dict:
+        bili_ticket, _, _ = get_bili_ticket()
+    
+    family = get_endpoint_family(url)
+    controller = get_aimd_controller()
+    
+    response = None
+    retries = 0
+    while retries < max_retries:
+        if delay_range:
+            # 随机延时
+            sleep_time = random.uniform(*delay_range)
+            time.sleep(sleep_time)
+        else:
+            # 按接口族和账号获取令牌，多个进程共享同一份频率预算
+            get_rate_limiter().acquire(url, cookie_dict)
+        
+        # 发送请求
+        headers = get_headers(cookie_dict)
+        
+        # 如果没有提供自定义Cookie，但获取了bili_ticket，则使用它
+        if not cookie_dict and bili_ticket:
+            if "Cookie" in headers:
+                headers["Cookie"] += f"; bili_ticket={bili_ticket}"
+            else:
+                headers["Cookie"] = f"bili_ticket={bili_ticket}"
+        
+        response = http_get(url, params=params, headers=headers)
+        
+        # 检查是否被拦截
+        throttle_code = get_throttle_code(response)
+        if throttle_code is None:
+            if cookie_dict and is_auth_error_response(response):
+                # 登录态失效，通知Cookie会话下次获取时重新检查
+                from bilibili_cookie_manager import report_auth_error
+                report_auth_error(cookie_dict)
+            controller.on_success(family)
+            if cache is not None:
+                cache.store_response(cache_key, response, family)
+            return response
+        
+        backoff = controller.on_throttle(family)
+        if throttle_code == -352:
+            # 风控校验失败，尝试处理 v_voucher
+            handle_gaia_vtoken(response, cookie_dict)
+        
+        if delay_range:
+            backoff = random.uniform(*blocked_delay_range)
+        print(f"请求被拦截(代码 {throttle_code})，{backoff:.1f}秒后重试...")
+        time.sleep(backoff)
+        retries += 1
+    
+    print(f"请求失败，已尝试{max_retries}次")
+    if response is not None and response.status_code == 412:
+        return None
+    return response
+
+def is_json_response(response):
+    """响应是否为JSON（按Content-Type或响应体首字符判断），避免对protobuf等二进制响应调用 response.json()"""
+    if "json" in response.headers.get("Content-Type", ""):
+        return True
+    return response.content[:64].lstrip()[:1] in (b"{", b"[")
+
+def is_auth_error_response(response):
+    """响应是否为 -101（未登录），只检查响应开头，不解析完整JSON"""
+    return response.status_code == 200 and b'"code":-101' in response.content[:32]
+
+def is_valid_wbi_key(key):
+    """检查WBI密钥的格式是否正确"""
+    # 通常WBI密钥是32位16进制字符串
+    if not key or not isinstance(key, str):
+        return False
+    
+    # 检查长度
+    if len(key) != 32:
+        return False
+    
+    # 检查是否只包含16进制字符
+    try:
+        int(key, 16)
+        return True
+    except ValueError:
+        return False
+
+def get_bili_ticket():
+    """获取bili_ticket，同时获取最新的wbi密钥"""
+    try:
+        ts = int(time.time())
+        key = "XgwSnGZ1p"
+        message = f"ts{ts}"
+        hexsign = hmac.new(key.encode(), message.encode(), hashlib.sha256).hexdigest()
+        
+        url = "https://api.bilibili.com/bapis/bilibili.api.ticket.v1.Ticket/GenWebTicket"
+        params = {
+            "key_id": "ec02",
+            "hexsign": hexsign,
+            "context[ts]": str(ts),
+            "csrf": ""
+        }
+        
+        headers = get_headers()
+        headers.update({
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Connection": "keep-alive"
+        })
+        
+        print(f"正在请求bili_ticket，参数: {params}")
+        
+        response = http_post(url, params=params, headers=headers)
+        
+        print(f"响应状态码: {response.status_code}")
+        print(f"响应头: {dict(response.headers)}")
+        
+        if not response.text:
+            return None, None, None
+        
+        data = response.json()
+        
+        if data.get("code") == 0:
+            ticket = data["data"]["ticket"]
+            if "nav" in data["data"]:
+                img_url = data["data"]["nav"]["img"]
+                sub_url = data["data"]["nav"]["sub"]
+                img_key = img_url.split("/")[-1].split(".")[0]
+                sub_key = sub_url.split("/")[-1].split(".")[0]
+                
+                if is_valid_wbi_key(img_key) and is_valid_wbi_key(sub_key):
+                    print(f"成功获取最新WBI密钥: img_key={img_key}, sub_key={sub_key}")
+                    return ticket, img_key, sub_key
+        
+        return None, None, None
+    except Exception as e:
+        print(f"获取bili_ticket失败: {e}")
+        return None, None, None
+
+def handle_gaia_vtoken(response, cookie_dict=None):
+    """处理风控校验失败的情况"""
+    if response.status_code == 200:
+        try:
+            data = response.json()
+            if data.get("code") == -352:
+                v_voucher = data.get("data", {}).get("v_voucher")
+                if not v_voucher:
+                    headers = response.headers
+                    v_voucher = headers.get("x-bili-gaia-vvoucher")
+                
+                if v_voucher:
+                    print(f"遇到风控校验，v_voucher: {v_voucher}")
+                    
+                    # 如果有Cookie，尝试自动处理验证码
+                    if cookie_dict and len(cookie_dict) > 0:
+                        if handle_v_voucher(v_voucher, cookie_dict):
+                            print("验证码处理成功")
+                            return False  # 不需要重试
+                    
+                    print("请手动处理风控验证，参考 bili_ticket.md 和 v_voucher.md 文档")
+                    return True  # 需要重试
+        except Exception as e:
+            print(f"处理风控验证出错: {e}")
+    return False
+
+def handle_v_voucher(v_voucher, cookie_dict=None):
+    """尝试自动处理v_voucher验证"""
+    try:
+        print(f"正在尝试处理风控验证: {v_voucher}")
+        
+        # 构造请求
+        url = "https://api.bilibili.com/x/gaia-vgate/v1/register"
+        params = {
+            "csrf": cookie_dict.get("bili_jct", ""),
+            "v_voucher": v_voucher
+        }
+        
+        headers = get_headers(cookie_dict)
+        headers.update({
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Origin": "https://www.bilibili.com",
+            "Referer": "https://www.bilibili.com/"
+        })
+        
+        # 发送请求获取验证信息
+        response = http_post(url, data=params, headers=headers)
+        data = response.json()
+        
+        if data["code"] == 0 and data["data"]["type"] == "geetest":
+            print("需要人工完成验证码，请在浏览器中登录后重试")
+            print(f"验证信息: {data['data']}")
+            # 获取验证码信息
+            token = data["data"]["token"]
+            challenge = data["data"]["geetest"]["challenge"]
+            gt = data["data"]["geetest"]["gt"]
+            
+            # 实际环境中这里可以集成自动验证码识别服务
+            print(f"验证码token: {token}")
+            print(f"验证码challenge: {challenge}")
+            print(f"验证码gt: {gt}")
+            print("请手动在浏览器中处理验证码后重试")
+            
+            # 等待人工介入
+            time.sleep(30)
+            return False
+        else:
+            print(f"获取验证码信息失败: {data}")
+            return False
+    except Exception as e:
+        print(f"处理验证码过程出错: {e}")
+        return False
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+B站播放器信息模块
+================
+
+统一获取 /x/player/v2 播放器信息（见 docs/video/player.md），按 (账号, aid, cid) 缓存解析结果，
+字幕列表、AI字幕、在线人数、章节看点等都从同一份数据读取，不再为同一个分P重复请求。
+
+使用方法：
+    from bilibili_player import get_player_info
+    
+    info = get_player_info(aid=aid, cid=cid, cookie_dict=cookie_dict)
+    if info:
+        print(info.online_count, len(info.subtitles), info.view_points)
+        ai_tracks = info.ai_subtitles
+
+缓存有效期默认 DEFAULT_PLAYER_TTL 秒（字幕地址带有时效签名），可通过 configure_player_cache() 调整。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from bilibili_bvid import bv2av
+from bilibili_http_client import controlled_request
+from bilibili_rate_limiter import get_account_id
+
+PLAYER_URL = "https://api.bilibili.com/x/player/v2"
+
+# 播放器信息缓存有效期(秒)
+DEFAULT_PLAYER_TTL = 600
+# 最多缓存的分P数
+DEFAULT_PLAYER_CACHE_SIZE = 4096
+
+def is_ai_subtitle(subtitle):
+    """判断字幕是否为AI自动生成"""
+    return subtitle.get('lan', '').startswith('ai-') or bool(subtitle.get('ai_type'))
+
+class PlayerInfo:
+    """解析后的播放器信息"""
+    
+    def __init__(self, aid, cid, data):
+        """
+        参数:
+            aid: 稿件avid
+            cid: 分P cid
+            data: /x/player/v2 返回的 data 对象
+        """
+        subtitle = data.get('subtitle') or {}
+        self.aid = aid
+        self.cid = cid
+        self.bvid = data.get('bvid')
+        self.subtitles = subtitle.get('subtitles') or []
+        self.ai_subtitles = [item for item in self.subtitles if is_ai_subtitle(item)]
+        self.need_login_subtitle = bool(data.get('need_login_subtitle'))
+        self.online_count = data.get('online_count')
+        self.view_points = data.get('view_points') or []
+        self.dm_mask = data.get('dm_mask')
+        self.raw = data
+        self.fetched_at = time.time()
+    
+    def get_subtitle(self, lan):
+        """按语言代码查找字幕，没有时返回None"""
+        for item in self.subtitles:
+            if item.get('lan') == lan:
+                return item
+        return None
+    
+    def __repr__(self):
+        return (f"PlayerInfo(aid={self.aid}, cid={self.cid}, subtitles={len(self.subtitles)}, "
+                f"online_count={self.online_count})")
+
+class PlayerInfoCache:
+    """按 (账号, aid, cid) 缓存播放器信息的LRU缓存（线程安全）"""
+    
+    def __init__(self, ttl=DEFAULT_PLAYER_TTL, max_entries=DEFAULT_PLAYER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """获取未过期的 PlayerInfo，没有时返回None"""
+        with self._lock:
+            info = self._entries.get(key)
+            if info is None:
+                return None
+            if time.time() - info.fetched_at >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return info
+    
+    def set(self, key, info):
+        with self._lock:
+            self._entries[key] = info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def get_player_cache_key(aid, cid, cookie_dict=None):
+    """播放器信息缓存键，登录与未登录的字幕列表不同，因此区分账号"""
+    return (get_account_id(cookie_dict), int(aid), int(cid))
+
+def parse_player_response(aid, cid, data):
+    """
+    解析 /x/player/v2 返回的JSON
+    
+    返回:
+        PlayerInfo，返回码不为0时打印错误并返回None
+    """
+    if not data:
+        print(f"获取播放器信息失败(aid={aid}, cid={cid}): 请求失败")
+        return None
+    if data.get('code') != 0:
+        print(f"获取播放器信息失败(aid={aid}, cid={cid}): {data.get('message')}")
+        return None
+    return PlayerInfo(aid, cid, data.get('data') or {})
+
+def resolve_aid(aid=None, bvid=None):
+    """优先使用aid，只有bvid时本地转换为aid"""
+    if aid:
+        return int(aid)
+    if bvid:
+        return bv2av(bvid)
+    raise ValueError("aid 与 bvid 至少需要提供一个")
+
+def get_player_info(aid=None, cid=None, bvid=None, cookie_dict=None, use_cache=True):
+    """
+    获取分P的播放器信息
+    
+    参数:
+        aid: 稿件avid（与bvid任选）
+        cid: 分P cid
+        bvid: 稿件bvid
+        cookie_dict: Cookie字典，未登录时字幕列表为空
+        use_cache: 是否使用缓存
+    
+    返回:
+        PlayerInfo，失败时返回None
+    """
+    aid = resolve_aid(aid, bvid)
+    cache = get_player_cache()
+    key = get_player_cache_key(aid, cid, cookie_dict)
+    if use_cache:
+        info = cache.get(key)
+        if info is not None:
+            return info
+    
+    try:
+        response = controlled_request(PLAYER_URL, {'aid': aid, 'cid': cid}, cookie_dict=cookie_dict,
+                                      use_cache=use_cache)
+        if response is None or response.status_code != 200:
+            status = response.status_code if response is not None else '请求失败'
+            print(f"获取播放器信息失败(aid={aid}, cid={cid}): {status}")
+            return None
+        info = parse_player_response(aid, cid, response.json())
+    except Exception as e:
+        print(f"获取播放器信息出错(aid={aid}, cid={cid}): {e}")
+        return None
+    
+    if info is not None:
+        cache.set(key, info)
+    return info
+
+# 进程内共享的播放器信息缓存
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_player_cache():
+    """获取进程内共享的播放器信息缓存"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PlayerInfoCache()
+    return _default_cache
+
+def configure_player_cache(ttl=DEFAULT_PLAYER_TTL, max_entries=DEFAULT_PLAYER_CACHE_SIZE):
+    """重新配置播放器信息缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = PlayerInfoCache(ttl=ttl, max_entries=max_entries)
+    return _default_cache
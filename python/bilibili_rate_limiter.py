@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+B站请求频率限制模块
+==================
+
+基于令牌桶的请求频率限制器，替代请求前固定的随机 sleep。
+
+特性：
+1. 按"接口族 + 账号(DedeUserID)"分别限速，未登录请求归入 anonymous
+2. 令牌桶状态保存在本地SQLite数据库中，同一台机器上的多个爬虫进程共享同一份QPS预算
+3. 每次获取令牌只需一次短事务：先扣减令牌（允许为负，相当于预约），再按欠额计算等待时间
+4. DEFAULT_RATES 为各接口族的速率上限，实际速率由AIMD控制器（bilibili_adaptive_control）动态调整
+
+使用方法：
+    from bilibili_rate_limiter import get_rate_limiter
+    
+    limiter = get_rate_limiter()
+    limiter.acquire(url, cookie_dict)          # 同步代码
+    await limiter.acquire_async(url, cookie_dict)  # 异步代码
+
+限速参数可通过 configure_rate_limiter() 调整。
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from bilibili_adaptive_control import get_aimd_controller
+from bilibili_http_client import get_endpoint_family, DEFAULT_ENDPOINT_FAMILY
+
+# 数据存储目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "rate_limiter.db")
+
+# 各接口族默认限速上限：(每秒令牌数, 桶容量)
+DEFAULT_RATES = {
+    "view": (2.0, 4),
+    "space_wbi": (0.5, 2),
+    "player": (1.0, 2),
+    "danmaku": (2.0, 4),
+    DEFAULT_ENDPOINT_FAMILY: (1.0, 2),
+}
+
+def get_account_id(cookie_dict=None):
+    """从Cookie中获取账号标识，未登录返回 anonymous"""
+    if cookie_dict and cookie_dict.get('DedeUserID'):
+        return str(cookie_dict['DedeUserID'])
+    return "anonymous"
+
+class TokenBucketLimiter:
+    """跨进程共享的令牌桶限速器"""
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH, rates=None):
+        """
+        参数:
+            db_path: 保存令牌桶状态的SQLite数据库路径
+            rates: 按接口族覆盖默认限速，如 {"view": (4.0, 8)}
+        """
+        self.db_path = db_path
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        self._local = threading.local()
+    
+    def _get_connection(self):
+        """每个线程使用独立的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+    
+    def get_rate(self, family):
+        """获取接口族的限速参数 (每秒令牌数, 桶容量)"""
+        return self.rates.get(family, self.rates[DEFAULT_ENDPOINT_FAMILY])
+    
+    def reserve(self, key, rate, burst):
+        """
+        预约一个令牌，返回需要等待的秒数
+        
+        令牌数允许为负：负数表示已被预约的额度，后来的请求按顺序排在其后
+        """
+        conn = self._get_connection()
+        # BEGIN IMMEDIATE 获取写锁，保证多进程间读-改-写的原子性
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                tokens = float(burst)
+            else:
+                tokens = min(float(burst), row[0] + (now - row[1]) * rate)
+            
+            tokens -= 1
+            conn.execute(
+                "INSERT INTO token_buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        
+        return 0.0 if tokens >= 0 else -tokens / rate
+    
+    def _reserve_for(self, url, cookie_dict):
+        family = get_endpoint_family(url)
+        max_rate, burst = self.get_rate(family)
+        # 实际速率由AIMD控制器根据风控情况在上限以内动态调整
+        rate = get_aimd_controller().get_rate(family, max_rate)
+        key = f"{family}:{get_account_id(cookie_dict)}"
+        return self.reserve(key, rate, burst)
+    
+    def acquire(self, url, cookie_dict=None):
+        """阻塞直到可以向该URL发送请求，返回实际等待的秒数"""
+        try:
+            wait = self._reserve_for(url, cookie_dict)
+        except sqlite3.Error as e:
+            print(f"限速器数据库出错，本次请求不限速: {e}")
+            return 0.0
+        
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+    
+    async def acquire_async(self, url, cookie_dict=None):
+        """acquire 的异步版本，等待期间不阻塞事件循环"""
+        try:
+            wait = await asyncio.get_running_loop().run_in_executor(None, self._reserve_for, url, cookie_dict)
+        except sqlite3.Error as e:
+            print(f"限速器数据库出错，本次请求不限速: {e}")
+            return 0.0
+        
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+# 进程内共享的默认限速器
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """获取进程内共享的默认限速器"""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = TokenBucketLimiter()
+    return _default_limiter
+
+def configure_rate_limiter(db_path=None, rates=None):
+    """
+    重新配置默认限速器
+    
+    参数:
+        db_path: 令牌桶状态数据库路径，多个进程使用同一路径即可共享限速
+        rates: 按接口族覆盖默认限速，如 {"view": (4.0, 8)}
+    """
+    global _default_limiter
+    with _default_limiter_lock:
+        _default_limiter = TokenBucketLimiter(db_path=db_path or DEFAULT_DB_PATH, rates=rates)
+    return _default_limiter
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+B站爬虫结果输出模块
+==================
+
+为各爬虫提供统一的结果输出层，每抓取完一条记录立即写入文件，替代运行结束时一次性 json.dump。
+
+输出格式：
+1. ndjson（默认）：每行一个JSON对象，追加写入；定期 fsync，程序中途崩溃时已写入的记录仍然可用
+2. ndjson.zst：zstd 压缩的 ndjson，需要 Python 3.14+ 或安装 backports.zstd
+3. json：原有的 indent=4 JSON 数组格式，同样逐条写入
+4. sqlite：批量 upsert 到本地视频数据库 data/videos.db（见 bilibili_video_store）
+
+使用方法：
+    from bilibili_record_io import open_record_sink
+    
+    # path 不含扩展名，扩展名由输出格式决定
+    with open_record_sink("data/up_123_videos_combined") as sink:
+        for record in records:
+            sink.write(record)
+    
+    # 将 ndjson 转换为原有的 JSON 数组格式
+    python bilibili_record_io.py convert data/up_123_videos_combined.ndjson
+
+其他输出格式可通过 register_sink_format() 注册。
+"""
+
+import argparse
+import io
+import json
+import os
+import threading
+import time
+
+# 可选依赖：增量解析JSON数组
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+# 可选依赖：zstd 压缩（Python 3.14 标准库或 backports.zstd）
+try:
+    from compression import zstd
+    HAS_ZSTD = True
+except ImportError:
+    try:
+        from backports import zstd
+        HAS_ZSTD = True
+    except ImportError:
+        HAS_ZSTD = False
+
+DEFAULT_OUTPUT_FORMAT = "ndjson"
+# 每写入多少条记录或经过多少秒执行一次 fsync
+DEFAULT_FSYNC_EVERY = 100
+DEFAULT_FSYNC_INTERVAL = 5.0
+
+class RecordSink:
+    """输出层基类，子类实现 write 和 close"""
+    
+    path = None
+    
+    def write(self, record):
+        raise NotImplementedError
+    
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class NdjsonSink(RecordSink):
+    """
+    逐条写入的 ndjson 输出，文件在写入第一条记录时才创建
+    
+    append=False 时覆盖同名文件（与原有的整体写入行为一致），append=True 时在已有文件末尾追加
+    """
+    
+    def __init__(self, path, compress=False, append=False, fsync_every=DEFAULT_FSYNC_EVERY,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL):
+        if compress and not HAS_ZSTD:
+            raise RuntimeError("zstd 压缩需要 Python 3.14+ 或安装 backports.zstd")
+        self.path = path
+        self.compress = compress
+        self.append = append
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._file = None
+        self._stream = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, 'ab' if self.append else 'wb')
+        # 追加到已有的压缩文件时会新建一个zstd帧，多帧文件可以正常解压
+        self._stream = zstd.ZstdFile(self._file, 'w') if self.compress else self._file
+    
+    def _sync(self):
+        self._stream.flush()
+        if self._stream is not self._file:
+            self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+    
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._stream.write(line)
+            self.count += 1
+            self._pending += 1
+            
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            elif not self.compress:
+                # 未压缩时每条记录都交给操作系统，其他进程可以立即读到；压缩时逐条刷新会严重降低压缩率
+                self._file.flush()
+    
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+    
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            if self._stream is not self._file:
+                self._stream.close()
+            self._file.close()
+            self._file = None
+            self._stream = None
+
+class JsonArraySink(RecordSink):
+    """
+    原有的 indent=4 JSON 数组输出，逐条写入，文件在写入第一条记录时才创建，
+    没有写入任何记录时在关闭时写入 []
+    
+    输出与 json.dump(records, f, ensure_ascii=False, indent=4) 完全一致，内存占用不随记录数增长；
+    关闭前文件不是完整的JSON，需要完整性保证时先写入临时文件再替换
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._closed = False
+        self._lock = threading.Lock()
+    
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, 'w', encoding='utf-8')
+    
+    def write(self, record):
+        text = json.dumps(record, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(("[\n    " if self.count == 0 else ",\n    ") + text)
+            self.count += 1
+    
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._file is None:
+                # 与 json.dump([]) 保持一致
+                self._open()
+                self._file.write("[]")
+            else:
+                self._file.write("\n]")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+def _create_sqlite_sink(path, **options):
+    # 延迟导入，避免与 bilibili_video_store 循环导入；所有爬虫共用同一个数据库，不使用按输出文件生成的路径
+    from bilibili_video_store import VideoStoreSink
+    return VideoStoreSink(**options)
+
+# 输出格式 -> (文件扩展名, 创建函数)
+SINK_FORMATS = {
+    "ndjson": (".ndjson", lambda path, **options: NdjsonSink(path, **options)),
+    "ndjson.zst": (".ndjson.zst", lambda path, **options: NdjsonSink(path, compress=True, **options)),
+    "json": (".json", lambda path, **options: JsonArraySink(path)),
+    "sqlite": (".db", _create_sqlite_sink),
+}
+
+def register_sink_format(name, extension, factory):
+    """注册新的输出格式，factory 参数为 (完整路径, **options)，返回 RecordSink"""
+    SINK_FORMATS[name] = (extension, factory)
+
+def get_output_path(path, output_format=DEFAULT_OUTPUT_FORMAT):
+    """获取不含扩展名的输出路径在指定格式下的完整路径"""
+    if output_format not in SINK_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选: {', '.join(SINK_FORMATS)}")
+    return path + SINK_FORMATS[output_format][0]
+
+def open_record_sink(path, output_format=DEFAULT_OUTPUT_FORMAT, **options):
+    """
+    创建输出层
+    
+    参数:
+        path: 不含扩展名的输出路径
+        output_format: 输出格式，见 SINK_FORMATS
+        options: 传给具体输出层的参数，如 fsync_every
+    """
+    full_path = get_output_path(path, output_format)
+    return SINK_FORMATS[output_format][1](full_path, **options)
+
+def _open_text(path):
+    if path.endswith(".zst"):
+        if not HAS_ZSTD:
+            raise RuntimeError("读取 zstd 压缩文件需要 Python 3.14+ 或安装 backports.zstd")
+        return io.TextIOWrapper(zstd.ZstdFile(path, 'r'), encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def read_records(path):
+    """
+    逐条读取 ndjson / ndjson.zst 文件中的记录
+    
+    程序崩溃时最后一行可能不完整，此时跳过该行
+    """
+    with _open_text(path) as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"跳过不完整的记录: {line[:50]}")
+        except EOFError:
+            # 压缩文件最后一帧不完整
+            print(f"文件 {path} 末尾不完整，已读取到最后一条完整记录")
+
+def iter_json_array(path):
+    """
+    逐条读取JSON数组文件中的元素
+    
+    安装 ijson 时增量解析，内存占用与文件大小无关；未安装时退回 json.load 整体读取。
+    文件内容不是JSON数组时抛出 ValueError
+    """
+    with open(path, 'rb') as f:
+        # 检查第一个非空白字符，避免把非数组文件当作空数组处理
+        head = f.read(4096)
+        # 跳过 UTF-8 BOM
+        offset = 3 if head.startswith(b"\xef\xbb\xbf") else 0
+        if not head[offset:].lstrip().startswith(b"["):
+            raise ValueError(f"文件 {path} 的内容不是JSON数组")
+        f.seek(offset)
+        
+        if HAS_IJSON:
+            yield from ijson.items(f, 'item', use_float=True)
+        else:
+            yield from json.loads(f.read().decode('utf-8'))
+
+def iter_records(path):
+    """按扩展名逐条读取记录：.json 为JSON数组，其余按 ndjson / ndjson.zst 逐行读取"""
+    if path.endswith(".json"):
+        return iter_json_array(path)
+    return read_records(path)
+
+def convert_to_json(src_path, dst_path=None):
+    """
+    将 ndjson / ndjson.zst 文件转换为原有的 indent=4 JSON 数组格式
+    
+    逐条读取、逐条写入，输出与 json.dump(records, f, ensure_ascii=False, indent=4) 完全一致
+    
+    返回:
+        (输出文件路径, 记录数)
+    """
+    if dst_path is None:
+        base = src_path
+        for extension in (".zst", ".ndjson"):
+            if base.endswith(extension):
+                base = base[:-len(extension)]
+        dst_path = base + ".json"
+    
+    sink = JsonArraySink(dst_path)
+    with sink:
+        for record in read_records(src_path):
+            sink.write(record)
+    
+    print(f"已将 {sink.count} 条记录转换为JSON: {dst_path}")
+    return dst_path, sink.count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站爬虫结果文件工具')
+    subparsers = parser.add_subparsers(dest='command')
+    convert_parser = subparsers.add_parser('convert', help='将 ndjson 转换为原有的JSON数组格式')
+    convert_parser.add_argument('src', help='ndjson 或 ndjson.zst 文件路径')
+    convert_parser.add_argument('dst', nargs='?', help='输出JSON文件路径，默认与输入文件同名')
+    args = parser.parse_args()
+    
+    if args.command == 'convert':
+        convert_to_json(args.src, args.dst)
+    else:
+        parser.print_help()
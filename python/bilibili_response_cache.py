@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+B站接口响应缓存模块
+==================
+
+共享传输层（controlled_request 和异步引擎）使用的透明响应缓存，重复运行或多个任务
+请求同一份数据时直接返回缓存，不再重复请求接口。
+
+特性：
+1. 缓存键为规范化的 URL + 参数（参数排序，忽略每次签名都会变化的 wts/w_rid），
+   并区分账号（DedeUserID），登录与未登录的响应互不混用
+2. 按接口族设置缓存有效期（DEFAULT_TTLS），有效期为0的接口族不缓存
+3. 内存层按LRU淘汰，超过 max_entries 时淘汰最久未使用的条目
+4. 可选的磁盘层保存在本地SQLite数据库中，进程重启后和同一台机器上的多个爬虫进程都能命中
+5. 只缓存HTTP 200且接口返回码为0的响应，错误和风控响应不会被缓存
+
+使用方法：
+    from bilibili_response_cache import get_response_cache, configure_response_cache
+    
+    # controlled_request 默认使用缓存，需要最新数据时传入 use_cache=False
+    response = controlled_request(url, params, cookie_dict=cookie_dict, use_cache=False)
+    
+    # 调整有效期、内存条目数，或关闭磁盘层
+    configure_response_cache(ttls={"view": 86400}, max_entries=4096, persist=False)
+    get_response_cache().print_stats()
+"""
+
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from bilibili_http_client import get_endpoint_family, is_json_response, DEFAULT_ENDPOINT_FAMILY
+from bilibili_rate_limiter import get_account_id
+
+# 数据存储目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "response_cache.db")
+
+# 各接口族默认缓存有效期(秒)，为0时不缓存
+DEFAULT_TTLS = {
+    "view": 3600,  # 视频详情
+    "space_wbi": 600,  # 用户空间（投稿列表、用户信息等）
+    "player": 600,  # 播放器信息（字幕地址带有时效签名，不宜缓存过久）
+    DEFAULT_ENDPOINT_FAMILY: 0,
+}
+
+# 内存层默认最多保存的条目数
+DEFAULT_MAX_ENTRIES = 1024
+
+# 不参与缓存键计算的参数（WBI签名每次请求都不同）
+IGNORED_PARAMS = frozenset({"wts", "w_rid"})
+
+def get_cache_key(url, params=None, cookie_dict=None):
+    """
+    计算请求的缓存键
+    
+    URL中的查询参数与 params 合并后排序，忽略 IGNORED_PARAMS，
+    因此 "view?bvid=x" 和 view + {"bvid": "x"} 得到相同的键
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+    query = sorted((k, v) for k, v in query if k not in IGNORED_PARAMS)
+    return f"{get_account_id(cookie_dict)}|{parts.scheme}://{parts.netloc}{parts.path}?{urlencode(query)}"
+
+def is_cacheable_data(data):
+    """判断解析后的JSON是否可以缓存（接口返回码为0）"""
+    return isinstance(data, dict) and data.get("code") == 0
+
+def build_response(entry):
+    """由缓存条目构造 requests.Response，调用方可以像普通响应一样使用"""
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response._content = entry["content"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.url = entry["url"]
+    response.encoding = "utf-8"
+    response.from_cache = True
+    return response
+
+class ResponseCache:
+    """内存LRU + 可选SQLite磁盘层的响应缓存（线程安全）"""
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH, ttls=None, max_entries=DEFAULT_MAX_ENTRIES, persist=True):
+        """
+        参数:
+            db_path: 磁盘层SQLite数据库路径
+            ttls: 按接口族覆盖默认缓存有效期，如 {"view": 86400}
+            max_entries: 内存层最多保存的条目数
+            persist: 是否启用磁盘层
+        """
+        self.db_path = db_path
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_entries = max_entries
+        self.persist = persist
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+    
+    def _get_connection(self):
+        """每个线程使用独立的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, family TEXT NOT NULL, status INTEGER NOT NULL, "
+                "headers TEXT NOT NULL, content BLOB NOT NULL, url TEXT, expires_at REAL NOT NULL)"
+            )
+            # 打开时顺便清理已过期的条目
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            self._local.conn = conn
+        return conn
+    
+    def get_ttl(self, family):
+        """获取接口族的缓存有效期(秒)"""
+        return self.ttls.get(family, self.ttls[DEFAULT_ENDPOINT_FAMILY])
+    
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+    
+    def _remember(self, key, entry):
+        """放入内存层，超出条目数时淘汰最久未使用的条目"""
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+    
+    def _get_from_memory(self, key, now):
+        """在内存层查找未过期的条目"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry
+                del self._memory[key]
+        return None
+    
+    def _get_from_disk(self, key, now):
+        """在磁盘层查找未过期的条目，命中时放入内存层"""
+        try:
+            row = self._get_connection().execute(
+                "SELECT status, headers, content, url, expires_at FROM responses "
+                "WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"响应缓存数据库出错，跳过磁盘缓存: {e}")
+            return None
+        if row is None:
+            return None
+        entry = {
+            "status": row[0],
+            "headers": json.loads(row[1]),
+            "content": bytes(row[2]),
+            "url": row[3],
+            "expires_at": row[4],
+        }
+        self._remember(key, entry)
+        self._count("disk_hits")
+        return entry
+    
+    def get(self, key):
+        """
+        查找缓存条目
+        
+        返回:
+            dict（status, headers, content, url），未命中或已过期时返回None
+        """
+        now = time.time()
+        entry = self._get_from_memory(key, now)
+        if entry is None and self.persist:
+            entry = self._get_from_disk(key, now)
+        if entry is None:
+            self._count("misses")
+        return entry
+    
+    async def get_async(self, key):
+        """异步版本的 get()：内存层直接查找，磁盘层在线程池中查找，不阻塞事件循环"""
+        now = time.time()
+        entry = self._get_from_memory(key, now)
+        if entry is None and self.persist:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self._get_from_disk, key, now)
+        if entry is None:
+            self._count("misses")
+        return entry
+    
+    def set(self, key, content, family=None, status=200, headers=None, url=None):
+        """
+        保存一个响应
+        
+        参数:
+            key: get_cache_key() 计算的缓存键
+            content: 解压后的响应体(bytes)
+            family: 接口族，决定缓存有效期，为0时不保存
+            status: HTTP状态码
+            headers: 需要保留的响应头
+            url: 请求地址
+        """
+        ttl = self.get_ttl(family or DEFAULT_ENDPOINT_FAMILY)
+        if ttl <= 0:
+            return
+        
+        entry = {
+            "status": status,
+            "headers": dict(headers or {}),
+            "content": content,
+            "url": url,
+            "expires_at": time.time() + ttl,
+        }
+        self._remember(key, entry)
+        self._count("stores")
+        
+        if self.persist:
+            try:
+                self._get_connection().execute(
+                    "INSERT OR REPLACE INTO responses (key, family, status, headers, content, url, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, family or DEFAULT_ENDPOINT_FAMILY, status, json.dumps(entry["headers"]),
+                     sqlite3.Binary(content), url, entry["expires_at"])
+                )
+            except sqlite3.Error as e:
+                print(f"响应缓存数据库出错，本次响应只保存在内存中: {e}")
+    
+    async def set_async(self, key, content, family=None, status=200, headers=None, url=None):
+        """异步版本的 set()：启用磁盘层时在线程池中写入，不阻塞事件循环"""
+        if not self.persist:
+            self.set(key, content, family=family, status=status, headers=headers, url=url)
+            return
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.set, key, content, family=family, status=status, headers=headers, url=url))
+    
+    def get_response(self, key):
+        """查找缓存并构造 requests.Response，未命中时返回None"""
+        entry = self.get(key)
+        return build_response(entry) if entry is not None else None
+    
+    def store_response(self, key, response, family=None):
+        """保存 requests.Response（只保存HTTP 200且接口返回码为0的响应）"""
+        if response is None or response.status_code != 200 or not is_json_response(response):
+            return
+        try:
+            data = response.json()
+        except ValueError:
+            return
+        if not is_cacheable_data(data):
+            return
+        
+        headers = {}
+        if response.headers.get("Content-Type"):
+            headers["Content-Type"] = response.headers["Content-Type"]
+        self.set(key, response.content, family=family or get_endpoint_family(response.url or ""),
+                 headers=headers, url=response.url)
+    
+    def invalidate(self, key):
+        """删除一个缓存条目"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.persist:
+            try:
+                self._get_connection().execute("DELETE FROM responses WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                print(f"响应缓存数据库出错: {e}")
+    
+    def clear(self):
+        """清空内存层和磁盘层"""
+        with self._lock:
+            self._memory.clear()
+        if self.persist:
+            try:
+                self._get_connection().execute("DELETE FROM responses")
+            except sqlite3.Error as e:
+                print(f"响应缓存数据库出错: {e}")
+    
+    def get_stats(self):
+        """获取命中统计"""
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory))
+    
+    def print_stats(self):
+        """打印命中统计"""
+        stats = self.get_stats()
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        hit_rate = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0
+        print(f"响应缓存: 内存命中 {stats['memory_hits']}, 磁盘命中 {stats['disk_hits']}, "
+              f"未命中 {stats['misses']}, 命中率 {hit_rate:.1%}, 内存条目 {stats['memory_entries']}")
+
+# 进程内共享的默认缓存
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """获取进程内共享的默认响应缓存"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
+
+def configure_response_cache(db_path=None, ttls=None, max_entries=None, persist=True):
+    """
+    重新配置默认响应缓存
+    
+    参数:
+        db_path: 磁盘层数据库路径，多个进程使用同一路径即可共享缓存
+        ttls: 按接口族覆盖默认缓存有效期，如 {"view": 86400}；设为0可关闭该接口族的缓存
+        max_entries: 内存层最多保存的条目数
+        persist: 是否启用磁盘层
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = ResponseCache(db_path=db_path or DEFAULT_DB_PATH, ttls=ttls,
+                                       max_entries=max_entries or DEFAULT_MAX_ENTRIES, persist=persist)
+    return _default_cache
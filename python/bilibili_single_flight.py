@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+B站请求合并模块（single-flight）
+==============================
+
+并发任务同时请求同一份数据时（例如同一个视频既在UP主投稿列表中又在合集中），
+只有第一个请求真正发送，其余请求等待它完成并共享结果，不再重复请求接口。
+
+与响应缓存（bilibili_response_cache）互补：缓存处理先后发生的重复请求，
+请求合并处理同时进行中的重复请求，两者使用相同的缓存键。
+
+使用方法：
+    from bilibili_single_flight import SingleFlight, AsyncSingleFlight
+    
+    flight = SingleFlight()
+    response = flight.do(key, lambda: http_get(url, params=params))          # 多线程
+    
+    async_flight = AsyncSingleFlight()
+    data = await async_flight.do(key, lambda: fetch_json(url, params))       # 协程
+"""
+
+import asyncio
+import copy
+import threading
+
+class _Call:
+    """一次进行中的请求"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """多线程版本的请求合并（线程安全）"""
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "shared": 0}
+    
+    def do(self, key, fn):
+        """
+        执行 fn()，同一 key 同时只执行一次
+        
+        参数:
+            key: 请求标识，通常为 get_cache_key() 的结果
+            fn: 实际发送请求的函数
+        
+        返回:
+            fn() 的返回值，等待者与执行者得到同一个对象；fn() 抛出的异常同样会传给所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["calls"] += 1
+            else:
+                self._stats["shared"] += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 先移除再唤醒，之后到达的请求重新发起（或命中响应缓存）
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+    
+    def get_stats(self):
+        """获取统计：calls 为实际执行次数，shared 为被合并的请求数"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+class AsyncSingleFlight:
+    """协程版本的请求合并，只能在同一个事件循环中使用"""
+    
+    def __init__(self):
+        self._calls = {}
+        self._stats = {"calls": 0, "shared": 0}
+    
+    async def do(self, key, coro_fn):
+        """
+        执行 await coro_fn()，同一 key 同时只执行一次
+        
+        等待者得到结果的深拷贝，各自修改返回的字典互不影响；
+        某个等待者被取消时不会取消正在进行的请求
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self._stats["shared"] += 1
+            result = await asyncio.shield(task)
+            return copy.deepcopy(result)
+        
+        task = asyncio.ensure_future(coro_fn())
+        self._calls[key] = task
+        self._stats["calls"] += 1
+        task.add_done_callback(lambda t: self._calls.pop(key) if self._calls.get(key) is t else None)
+        return await asyncio.shield(task)
+    
+    def get_stats(self):
+        """获取统计：calls 为实际执行次数，shared 为被合并的请求数"""
+        return dict(self._stats, in_flight=len(self._calls))
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+B站字幕格式转换模块
+==================
+
+将字幕JSON中的 body（from/to/content）一次遍历转换为 SRT、WebVTT、LRC 或纯文本。
+
+特性：
+1. body 可以是列表，也可以是逐条产出字幕的生成器，不需要先构造完整的字符串列表
+2. 每 chunk_size 条字幕拼接为一个字符串块后一次写入，时间戳按整数毫秒一次换算
+3. 可直接写入 zip / tar（.tar、.tar.gz、.tgz、.tar.xz）归档，批量导出时不产生大量小文件
+
+使用方法：
+    from bilibili_subtitle_format import write_subtitle, SubtitleArchive
+    
+    write_subtitle(subtitle_json['body'], 'srt', 'output.srt')
+    
+    with SubtitleArchive('subtitles.zip') as archive:
+        archive.add('P001_zh-CN.srt', body, 'srt')
+
+性能对比（10000条字幕，逐条三次 write 的旧写法 vs 分块写入）：
+    python bilibili_subtitle_format.py --benchmark
+"""
+
+import argparse
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from itertools import islice
+
+# 每次写入拼接的字幕条数
+DEFAULT_CHUNK_SIZE = 1000
+
+SUBTITLE_FORMATS = ('srt', 'vtt', 'lrc', 'txt')
+
+def format_timestamp(seconds, separator=','):
+    """秒转 时:分:秒,毫秒（按最接近的整数毫秒换算，避免浮点误差少1毫秒）"""
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{separator}{ms % 1000:03d}"
+
+def format_lrc_timestamp(seconds):
+    """秒转LRC时间标签 分:秒.百分秒"""
+    cs = int(round(seconds * 100))
+    return f"{cs // 6000:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+def _format_srt(items, start_index):
+    return "".join(
+        f"{i}\n{format_timestamp(item['from'])} --> {format_timestamp(item['to'])}\n{item['content']}\n\n"
+        for i, item in enumerate(items, start_index)
+    )
+
+def _format_vtt(items, start_index):
+    return "".join(
+        f"{format_timestamp(item['from'], '.')} --> {format_timestamp(item['to'], '.')}\n{item['content']}\n\n"
+        for item in items
+    )
+
+def _format_lrc(items, start_index):
+    # LRC 每行只能有一个时间标签，换行替换为空格
+    return "".join(
+        f"[{format_lrc_timestamp(item['from'])}]{item['content'].replace(chr(10), ' ')}\n"
+        for item in items
+    )
+
+def _format_txt(items, start_index):
+    return "".join(f"{item['content']}\n" for item in items)
+
+# 格式 -> (文件头, 字幕块格式化函数)
+_FORMATTERS = {
+    'srt': ("", _format_srt),
+    'vtt': ("WEBVTT\n\n", _format_vtt),
+    'lrc': ("", _format_lrc),
+    'txt': ("", _format_txt),
+}
+
+def iter_subtitle_chunks(body, fmt='srt', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    逐块产出格式化后的字幕文本
+    
+    参数:
+        body: 字幕条目的列表或生成器，每条为 {'from', 'to', 'content'}
+        fmt: srt / vtt / lrc / txt
+        chunk_size: 每块包含的字幕条数
+    """
+    if fmt not in _FORMATTERS:
+        raise ValueError(f"不支持的字幕格式: {fmt}，可选: {', '.join(SUBTITLE_FORMATS)}")
+    header, formatter = _FORMATTERS[fmt]
+    if header:
+        yield header
+    
+    items = iter(body)
+    index = 1
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            break
+        yield formatter(chunk, index)
+        index += len(chunk)
+
+def subtitle_to_string(body, fmt='srt'):
+    """将字幕转换为完整字符串"""
+    return "".join(iter_subtitle_chunks(body, fmt))
+
+def write_subtitle(body, fmt, output, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    将字幕写入文件
+    
+    参数:
+        body: 字幕条目的列表或生成器
+        fmt: srt / vtt / lrc / txt
+        output: 文件路径或已打开的文本文件对象
+    
+    返回:
+        写入的字符数
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'w', encoding='utf-8') as f:
+            return write_subtitle(body, fmt, f, chunk_size)
+    
+    written = 0
+    for chunk in iter_subtitle_chunks(body, fmt, chunk_size):
+        written += output.write(chunk)
+    return written
+
+class SubtitleArchive:
+    """将多个字幕文件写入同一个 zip / tar 归档（线程安全）"""
+    
+    def __init__(self, path):
+        """
+        参数:
+            path: 归档路径，按扩展名选择 .zip / .tar / .tar.gz / .tgz / .tar.xz
+        """
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        
+        if path.endswith('.zip'):
+            self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+            self._tar = None
+        elif path.endswith(('.tar', '.tar.gz', '.tgz', '.tar.xz')):
+            mode = 'w:gz' if path.endswith(('.gz', '.tgz')) else 'w:xz' if path.endswith('.xz') else 'w'
+            self._tar = tarfile.open(path, mode)
+            self._zip = None
+        else:
+            raise ValueError(f"不支持的归档格式: {path}，可选: .zip / .tar / .tar.gz / .tgz / .tar.xz")
+    
+    def add(self, name, body, fmt='srt', chunk_size=DEFAULT_CHUNK_SIZE):
+        """将一个字幕写入归档中的 name 文件"""
+        if self._zip is not None:
+            with self._lock:
+                # zip 成员可以流式写入
+                with self._zip.open(name, 'w') as member:
+                    for chunk in iter_subtitle_chunks(body, fmt, chunk_size):
+                        member.write(chunk.encode('utf-8'))
+                self.count += 1
+            return
+        
+        # tar 成员需要预先知道大小，先在内存中拼接（锁外完成格式化）
+        data = subtitle_to_string(body, fmt).encode('utf-8')
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        with self._lock:
+            self._tar.addfile(info, io.BytesIO(data))
+            self.count += 1
+    
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+            if self._tar is not None:
+                self._tar.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _legacy_format_time(seconds):
+    """旧写法：每个字段分别 divmod"""
+    m, s = divmod(seconds, 60)
+    h, m = divmod(m, 60)
+    ms = int((seconds - int(seconds)) * 1000)
+    return f"{int(h):02d}:{int(m):02d}:{int(s):02d},{ms:03d}"
+
+def _legacy_save_as_srt(body, output_file):
+    """旧写法：每条字幕三次 write"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for i, item in enumerate(body, 1):
+            f.write(f"{i}\n")
+            f.write(f"{_legacy_format_time(item['from'])} --> {_legacy_format_time(item['to'])}\n")
+            f.write(f"{item['content']}\n\n")
+
+def benchmark_subtitle_format(cues=10000, rounds=5):
+    """对比旧写法与分块写入的SRT输出速度，并校验输出完全一致"""
+    # 时间取0.5秒的整数倍，旧写法按截断换算毫秒也不会产生误差，便于逐字节比较
+    body = [{'from': i * 2.5, 'to': i * 2.5 + 2.0, 'content': f"第{i}条字幕 subtitle line {i}"} for i in range(cues)]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, "legacy.srt")
+        new_path = os.path.join(tmp_dir, "new.srt")
+        
+        start = time.perf_counter()
+        for _ in range(rounds):
+            _legacy_save_as_srt(body, legacy_path)
+        legacy_time = (time.perf_counter() - start) / rounds
+        
+        start = time.perf_counter()
+        for _ in range(rounds):
+            write_subtitle(body, 'srt', new_path)
+        new_time = (time.perf_counter() - start) / rounds
+        
+        # 生成器输入
+        start = time.perf_counter()
+        for _ in range(rounds):
+            write_subtitle((item for item in body), 'srt', new_path)
+        generator_time = (time.perf_counter() - start) / rounds
+        
+        with open(legacy_path, 'rb') as f1, open(new_path, 'rb') as f2:
+            assert f1.read() == f2.read(), "SRT输出与旧写法不一致"
+        
+        archive_path = os.path.join(tmp_dir, "subtitles.zip")
+        start = time.perf_counter()
+        with SubtitleArchive(archive_path) as archive:
+            for fmt in SUBTITLE_FORMATS:
+                archive.add(f"bench.{fmt}", body, fmt)
+        archive_time = time.perf_counter() - start
+    
+    print(f"{cues} 条字幕，SRT输出（{rounds} 次平均）")
+    print(f"旧写法（逐条三次write）: {legacy_time * 1000:.1f} 毫秒")
+    print(f"分块写入: {new_time * 1000:.1f} 毫秒 (提速 {legacy_time / new_time:.1f}x)")
+    print(f"分块写入（生成器输入）: {generator_time * 1000:.1f} 毫秒")
+    print(f"写入zip（srt/vtt/lrc/txt 四种格式）: {archive_time * 1000:.1f} 毫秒")
+    print("输出与旧写法完全一致")
+    return legacy_time, new_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站字幕格式转换')
+    parser.add_argument('--benchmark', action='store_true', help='运行字幕写入性能对比')
+    parser.add_argument('--cues', type=int, default=10000, help='性能对比使用的字幕条数')
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark_subtitle_format(args.cues)
+    else:
+        parser.print_help()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+B站字幕全文索引模块
+==================
+
+将字幕 body（from/to/content）写入本地SQLite FTS5全文索引，按关键词查询时直接返回
+bvid、cid、分P和毫秒级时间偏移，替代在成千上万个SRT文件中逐个grep。
+
+特性：
+1. 使用FTS5的 trigram 分词器（按3字符切分），中日韩文字无需额外分词即可检索
+2. 每个 (cid, 语言) 一条字幕轨道，重复导入时整条替换，不会产生重复条目
+3. 查询按相关度排序；少于3个字符的关键词无法使用trigram索引，退回 LIKE 扫描
+4. 可作为批量字幕下载的输出阶段（bilibili_video_subtitle_spider --index）
+
+使用方法：
+    from bilibili_subtitle_index import SubtitleIndex
+    
+    index = SubtitleIndex()
+    index.add_subtitle(subtitle_json['body'], cid=cid, bvid=bvid, lan='zh-CN')
+    for hit in index.search("关键词"):
+        print(hit['bvid'], hit['cid'], hit['from_ms'], hit['content'])
+
+命令行：
+    python bilibili_subtitle_index.py search 关键词 --limit 20
+    python bilibili_video_subtitle_spider.py BV1L9Uoa9EUx --index --format   # 只建索引不写文件
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+# 数据存储目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "subtitle_index.db")
+
+# trigram 分词器可索引的最短关键词长度
+MIN_INDEXED_QUERY_LEN = 3
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS subtitle_tracks ("
+    "track_id INTEGER PRIMARY KEY, cid INTEGER NOT NULL, lan TEXT NOT NULL, bvid TEXT, aid INTEGER, "
+    "page INTEGER, title TEXT, part TEXT, cues INTEGER NOT NULL, first_rowid INTEGER, last_rowid INTEGER, "
+    "indexed_at REAL NOT NULL, "
+    "UNIQUE (cid, lan))",
+    "CREATE INDEX IF NOT EXISTS idx_subtitle_tracks_bvid ON subtitle_tracks (bvid)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS subtitle_cues USING fts5("
+    "content, track_id UNINDEXED, from_ms UNINDEXED, to_ms UNINDEXED, tokenize='trigram')",
+)
+
+def to_ms(seconds):
+    """秒转毫秒"""
+    return int(round(float(seconds or 0) * 1000))
+
+def build_video_url(bvid, page=None, from_ms=0):
+    """生成跳转到字幕位置的视频链接"""
+    if not bvid:
+        return None
+    url = f"https://www.bilibili.com/video/{bvid}?t={from_ms / 1000:.1f}"
+    if page and page > 1:
+        url += f"&p={page}"
+    return url
+
+class SubtitleIndex:
+    """基于SQLite FTS5的字幕全文索引"""
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+    
+    def _get_connection(self):
+        """每个线程使用独立的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            try:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            except sqlite3.OperationalError as e:
+                conn.close()
+                raise RuntimeError(f"字幕索引需要支持FTS5 trigram分词器的SQLite(3.34+)，当前为 {sqlite3.sqlite_version}: {e}")
+            self._local.conn = conn
+        return conn
+    
+    def add_subtitle(self, body, cid, lan, bvid=None, aid=None, page=None, title=None, part=None):
+        """
+        导入一条字幕轨道，已存在的 (cid, lan) 整条替换
+        
+        参数:
+            body: 字幕JSON中的 body 列表（或产出 {'from', 'to', 'content'} 的可迭代对象）
+            cid: 分P cid
+            lan: 语言代码
+            bvid, aid, page, title, part: 视频信息，查询结果中原样返回
+        
+        返回:
+            导入的字幕条数
+        """
+        rows = [(item.get('content') or '', to_ms(item.get('from')), to_ms(item.get('to')))
+                for item in body if item.get('content')]
+        
+        conn = self._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete_track(conn, cid, lan)
+            
+            cursor = conn.execute(
+                "INSERT INTO subtitle_tracks (cid, lan, bvid, aid, page, title, part, cues, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (int(cid), lan, bvid, int(aid) if aid else None, page, title, part, len(rows), time.time())
+            )
+            track_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO subtitle_cues (content, track_id, from_ms, to_ms) VALUES (?, ?, ?, ?)",
+                ((content, track_id, from_ms, end_ms) for content, from_ms, end_ms in rows)
+            )
+            if rows:
+                # 同一事务内连续插入，rowid 连续；记录范围以便替换时按 rowid 删除，不必扫描全表
+                last_rowid = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                conn.execute("UPDATE subtitle_tracks SET first_rowid = ?, last_rowid = ? WHERE track_id = ?",
+                             (last_rowid - len(rows) + 1, last_rowid, track_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+    
+    def _delete_track(self, conn, cid, lan):
+        """在当前事务中删除一条字幕轨道及其字幕条目"""
+        old = conn.execute("SELECT track_id, first_rowid, last_rowid FROM subtitle_tracks WHERE cid = ? AND lan = ?",
+                           (int(cid), lan)).fetchone()
+        if old is None:
+            return
+        if old[1] is not None:
+            conn.execute("DELETE FROM subtitle_cues WHERE rowid BETWEEN ? AND ?", (old[1], old[2]))
+        conn.execute("DELETE FROM subtitle_tracks WHERE track_id = ?", (old[0],))
+    
+    def search(self, query, limit=20, bvid=None, lan=None):
+        """
+        全文检索字幕
+        
+        参数:
+            query: 关键词（按短语匹配）
+            limit: 最多返回条数
+            bvid: 只在某个视频中检索
+            lan: 只检索某种语言
+        
+        返回:
+            [{'bvid', 'aid', 'cid', 'page', 'lan', 'title', 'part', 'from_ms', 'to_ms', 'content', 'url'}, ...]
+        """
+        query = query.strip()
+        if not query:
+            return []
+        
+        if len(query) >= MIN_INDEXED_QUERY_LEN:
+            condition = "subtitle_cues MATCH ?"
+            # 按短语匹配，双引号需要转义
+            params = ['"' + query.replace('"', '""') + '"']
+            order = "subtitle_cues.rank"
+        else:
+            condition = "subtitle_cues.content LIKE ? ESCAPE '\\'"
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params = [f"%{escaped}%"]
+            order = "t.track_id, subtitle_cues.from_ms"
+        
+        sql = ("SELECT t.bvid, t.aid, t.cid, t.page, t.lan, t.title, t.part, "
+               "subtitle_cues.from_ms, subtitle_cues.to_ms, subtitle_cues.content "
+               "FROM subtitle_cues JOIN subtitle_tracks t ON t.track_id = subtitle_cues.track_id "
+               f"WHERE {condition}")
+        if bvid:
+            sql += " AND t.bvid = ?"
+            params.append(bvid)
+        if lan:
+            sql += " AND t.lan = ?"
+            params.append(lan)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(int(limit))
+        
+        results = []
+        for row in self._get_connection().execute(sql, params):
+            hit = dict(zip(('bvid', 'aid', 'cid', 'page', 'lan', 'title', 'part',
+                            'from_ms', 'to_ms', 'content'), row))
+            hit['url'] = build_video_url(hit['bvid'], hit['page'], hit['from_ms'])
+            results.append(hit)
+        return results
+    
+    def get_stats(self):
+        """获取索引统计：字幕轨道数、字幕条数"""
+        row = self._get_connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(cues), 0) FROM subtitle_tracks").fetchone()
+        return {'tracks': row[0], 'cues': row[1]}
+    
+    def remove_track(self, cid, lan):
+        """删除一条字幕轨道"""
+        conn = self._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete_track(conn, cid, lan)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def optimize(self):
+        """合并FTS5索引段，大量导入后执行可加快查询"""
+        self._get_connection().execute("INSERT INTO subtitle_cues (subtitle_cues) VALUES ('optimize')")
+
+def format_offset(ms):
+    """毫秒格式化为 时:分:秒"""
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站字幕全文索引')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='索引数据库路径')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    search_parser = subparsers.add_parser('search', help='检索字幕')
+    search_parser.add_argument('query')
+    search_parser.add_argument('--limit', type=int, default=20)
+    search_parser.add_argument('--bvid')
+    search_parser.add_argument('--lang')
+    
+    subparsers.add_parser('stats', help='查看索引统计')
+    subparsers.add_parser('optimize', help='合并索引段')
+    args = parser.parse_args()
+    
+    index = SubtitleIndex(args.db)
+    if args.command == 'search':
+        for hit in index.search(args.query, limit=args.limit, bvid=args.bvid, lan=args.lang):
+            print(f"{hit['bvid']} cid={hit['cid']} P{hit['page']} [{format_offset(hit['from_ms'])}] "
+                  f"({hit['from_ms']}ms) {hit['content']}")
+            print(f"    {hit['url']}")
+    elif args.command == 'stats':
+        stats = index.get_stats()
+        print(f"共 {stats['tracks']} 条字幕轨道，{stats['cues']} 条字幕")
+    elif args.command == 'optimize':
+        index.optimize()
+        print("索引已优化")
+    else:
+        parser.print_help()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+B站视频详情批量补全模块
+======================
+
+通过 /x/v3/fav/resource/infos 批量获取视频的UP主、播放、弹幕、收藏、发布时间等信息，
+一次请求可查询多个稿件，替代逐个请求 /x/web-interface/view。
+
+缺少所需 /view 专有字段（VIEW_ONLY_FIELDS：投币、点赞、分享、评论、动态、分区、cid 等）的稿件
+直接逐个请求 /view（/view 的数据包含批量接口的全部字段，不再额外发送批量请求），
+其余稿件通过批量接口补全 BATCH_FIELDS 中的字段，批量结果中缺失的稿件回退到 /view。
+因此请求量不会多于逐个请求 /view。
+
+使用方法：
+    from bilibili_video_enrich import enrich_videos, BATCH_FIELDS
+    
+    # videos 为包含 aid/bvid 的字典列表，原地补全
+    results = enrich_videos(videos, fetch_detail, apply_detail, cookie_dict, fields=BATCH_FIELDS)
+
+批量接口的单次稿件数量上限没有文档说明，默认每批 DEFAULT_BATCH_SIZE 个，
+接口返回参数错误（可能超出数量上限或包含无效稿件）时将每批数量减半后重试；
+返回未登录或风控错误时停止批量请求，剩余稿件直接回退到 /view。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from bilibili_http_client import controlled_request
+
+RESOURCE_INFOS_URL = "https://api.bilibili.com/x/v3/fav/resource/infos"
+# 视频稿件的内容类型
+RESOURCE_TYPE_VIDEO = 2
+# 每批查询的稿件数量
+DEFAULT_BATCH_SIZE = 50
+# 回退到 /view 时的并行线程数（实际发送速率仍由令牌桶限速器控制）
+DEFAULT_DETAIL_WORKERS = 4
+
+# 批量接口能提供的输出字段
+BATCH_FIELDS = frozenset({
+    'aid', 'bvid', 'title', 'desc', 'pic', 'created', 'length',
+    'author', 'mid', 'owner_face', 'play', 'danmaku', 'favorite'
+})
+
+# 只有 /view 接口能提供的输出字段（标签不在 /view 的数据中，不计入）
+VIEW_ONLY_FIELDS = frozenset({
+    'dynamic', 'cid', 'coin', 'share', 'like', 'dislike', 'comment', 'tid', 'tname'
+})
+# 批量接口 attr 表示稿件失效的取值：1 为已失效，9 为UP主已删除
+INVALID_RESOURCE_ATTRS = frozenset({1, 9})
+
+# 批量过大或包含无效稿件时的返回码，减半后重试
+BATCH_SPLIT_CODES = frozenset({-400, -404})
+# 未登录、无权限或风控拦截的返回码，减半也不会成功，停止批量请求
+BATCH_ABORT_CODES = frozenset({-101, -111, -403, -352, -412, -799})
+
+def fetch_resource_infos(aids, cookie_dict=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    批量获取稿件信息
+    
+    返回:
+        dict，aid -> 接口返回的内容信息；请求失败的稿件不在结果中
+    """
+    infos = {}
+    aids = list(aids)
+    position = 0
+    
+    while position < len(aids):
+        batch = aids[position:position + batch_size]
+        params = {
+            'resources': ','.join(f"{aid}:{RESOURCE_TYPE_VIDEO}" for aid in batch),
+            'platform': 'web'
+        }
+        response = controlled_request(RESOURCE_INFOS_URL, params, cookie_dict=cookie_dict)
+        if response is None:
+            print(f"批量获取{len(batch)}个稿件信息失败")
+            position += len(batch)
+            continue
+        
+        try:
+            data = response.json()
+        except Exception as e:
+            print(f"解析批量稿件信息出错: {str(e)}")
+            position += len(batch)
+            continue
+        
+        code = data.get('code')
+        if code in BATCH_ABORT_CODES:
+            print(f"批量获取稿件信息被拒绝，状态码：{code}，停止批量请求")
+            break
+        if code != 0:
+            if code in BATCH_SPLIT_CODES and len(batch) > 1:
+                # 可能超出单次数量上限或包含无效稿件，减半后重试，后续批次沿用减半后的数量
+                batch_size = len(batch) // 2
+            else:
+                print(f"批量获取{len(batch)}个稿件信息失败，状态码：{code}")
+                position += len(batch)
+            continue
+        
+        position += len(batch)
+        
+        for info in data.get('data') or []:
+            if info.get('type') == RESOURCE_TYPE_VIDEO:
+                infos[info.get('id')] = info
+        print(f"批量获取稿件信息成功，本批{len(batch)}个，已获取{len(infos)}个")
+    
+    return infos
+
+def apply_resource_info(video_data, info):
+    """将批量接口返回的内容信息合并到视频数据中，已有的基本字段不覆盖"""
+    upper = info.get('upper') or {}
+    cnt_info = info.get('cnt_info') or {}
+    video_data.update({
+        'author': upper.get('name'),
+        'mid': upper.get('mid'),
+        'owner_face': upper.get('face'),
+        'play': cnt_info.get('play'),
+        'danmaku': cnt_info.get('danmaku'),
+        'favorite': cnt_info.get('collect')
+    })
+    
+    for key, info_key in (('aid', 'id'), ('bvid', 'bvid'), ('title', 'title'), ('desc', 'intro'),
+                          ('pic', 'cover'), ('created', 'pubtime'), ('length', 'duration')):
+        if video_data.get(key) is None:
+            video_data[key] = info.get(info_key)
+    return video_data
+
+def get_view_only_fields(fields):
+    """所需字段中只有 /view 接口提供的部分，fields 为 None 表示需要全部字段"""
+    if fields is None:
+        return VIEW_ONLY_FIELDS
+    return frozenset(fields) - BATCH_FIELDS
+
+def needs_view_detail(video_data, view_fields):
+    """该视频是否需要请求 /view（缺少任一所需的 /view 专有字段）"""
+    return any(video_data.get(field) is None for field in view_fields)
+
+def enrich_videos(videos, fetch_detail, apply_detail, cookie_dict=None, fields=None,
+                  batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_DETAIL_WORKERS, on_result=None):
+    """
+    补全视频详细信息
+    
+    参数:
+        videos: 视频数据字典列表，至少包含 aid 或 bvid，原地补全
+        fetch_detail: 函数，参数为视频数据字典，返回 /view 接口JSON或None
+        apply_detail: 函数，参数为 (视频数据字典, /view 接口JSON)，将详情合并到视频数据中
+        cookie_dict: Cookie字典
+        fields: 需要的字段集合，None 表示需要全部字段；缺少所需 /view 专有字段的视频逐个请求 /view，
+                其余视频批量补全
+        on_result: 函数，参数为 (视频数据字典, 是否成功)，按 videos 的顺序在每个视频补全后立即调用，
+                   用于逐条写出结果
+    
+    返回:
+        list，与 videos 一一对应的布尔值，表示该视频是否补全成功
+    """
+    results = [False] * len(videos)
+    view_fields = get_view_only_fields(fields)
+    
+    # 需要 /view 专有字段的视频直接请求 /view，其余视频批量补全
+    view_indexes = []
+    batch_indexes = []
+    for index, video in enumerate(videos):
+        if video.get('aid') and not needs_view_detail(video, view_fields):
+            batch_indexes.append(index)
+        else:
+            view_indexes.append(index)
+    
+    aids = [videos[index]['aid'] for index in batch_indexes]
+    infos = fetch_resource_infos(aids, cookie_dict=cookie_dict, batch_size=batch_size) if aids else {}
+    
+    for index in batch_indexes:
+        video = videos[index]
+        info = infos.get(video['aid'])
+        if info is None:
+            view_indexes.append(index)
+            continue
+        apply_resource_info(video, info)
+        # 稿件已失效或已删除，/view 同样无法获取
+        results[index] = info.get('attr') not in INVALID_RESOURCE_ATTRS
+    view_indexes.sort()
+    
+    print(f"批量接口补全{len(infos)}个视频，{len(view_indexes)}个逐个获取 /view")
+    
+    def fetch_and_apply(index):
+        video = videos[index]
+        print(f"正在获取视频 {video.get('bvid') or video.get('aid')} 的详细信息...")
+        detail = fetch_detail(video)
+        apply_detail(video, detail)
+        return bool(detail and detail.get('code') == 0)
+    
+    view_index_set = set(view_indexes)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # executor.map 按提交顺序返回结果，与批量结果按原顺序合并后逐条回调
+        view_results = executor.map(fetch_and_apply, view_indexes)
+        for index, video in enumerate(videos):
+            if index in view_index_set:
+                results[index] = next(view_results)
+            if on_result is not None:
+                on_result(video, results[index])
+    
+    return results
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+B站视频数据本地存储模块
+======================
+
+基于SQLite保存视频和UP主数据，替代反复整体读写的大JSON数组。
+
+特性：
+1. videos 表以 aid 为主键，并按 bvid、mid、pubdate、tid 建立索引，
+   "某UP主某日期之后的视频"等查询直接走索引
+2. uploaders 表以 mid 为主键，保存UP主信息
+3. 写入为批量 upsert：新记录与已有记录按字段合并（新值为 None 时保留旧值），
+   合并后没有变化的行不会被改写
+4. WAL 模式，多个爬虫进程可以同时读写
+
+使用方法：
+    from bilibili_video_store import VideoStore
+    
+    store = VideoStore()
+    store.upsert_videos(records)
+    for video in store.query_videos(mid=123, since=1700000000):
+        ...
+    
+    # 作为爬虫的输出层（见 bilibili_record_io）
+    main(mid, output_format="sqlite")
+
+命令行：
+    python bilibili_video_store.py import data/up_123_videos_combined.ndjson
+    python bilibili_video_store.py query --mid 123 --since 2024-01-01
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from bilibili_bvid import bv2av
+from bilibili_record_io import RecordSink, iter_records, DEFAULT_FSYNC_EVERY, DEFAULT_FSYNC_INTERVAL
+
+# 数据存储目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "videos.db")
+# 单条 SQL 中 IN (...) 的最大参数个数
+MAX_QUERY_PARAMS = 500
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS videos ("
+    "aid INTEGER PRIMARY KEY, bvid TEXT, mid INTEGER, tid INTEGER, pubdate INTEGER, title TEXT, "
+    "data TEXT NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_bvid ON videos (bvid)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_mid_pubdate ON videos (mid, pubdate)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_pubdate ON videos (pubdate)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_tid ON videos (tid)",
+    "CREATE TABLE IF NOT EXISTS uploaders ("
+    "mid INTEGER PRIMARY KEY, name TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL)",
+)
+
+def get_record_aid(record):
+    """获取记录的aid，只有bvid时在本地转换，无法确定时返回None"""
+    aid = record.get('aid')
+    if aid:
+        try:
+            return int(aid)
+        except (TypeError, ValueError):
+            pass
+    
+    bvid = record.get('bvid')
+    if bvid:
+        try:
+            return bv2av(bvid)
+        except ValueError:
+            pass
+    return None
+
+def merge_record(old, new):
+    """按字段合并记录，新值为 None 时保留旧值"""
+    if old is None:
+        return dict(new)
+    merged = dict(old)
+    for key, value in new.items():
+        if value is not None or key not in merged:
+            merged[key] = value
+    return merged
+
+def parse_timestamp(value):
+    """将时间戳或 YYYY-MM-DD 格式的日期转换为时间戳"""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.strptime(value, "%Y-%m-%d").timestamp())
+
+class VideoStore:
+    """SQLite视频数据存储"""
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+    
+    def _get_connection(self):
+        """每个线程使用独立的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
+    
+    def _load_existing(self, conn, table, key_column, keys):
+        existing = {}
+        for i in range(0, len(keys), MAX_QUERY_PARAMS):
+            chunk = keys[i:i + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT {key_column}, data FROM {table} WHERE {key_column} IN ({placeholders})", chunk
+            )
+            for key, data in rows:
+                existing[key] = json.loads(data)
+        return existing
+    
+    def _upsert(self, table, key_column, records, get_key, build_row, sql):
+        pending = {}
+        for record in records:
+            key = get_key(record)
+            if key is None:
+                print(f"跳过无法确定{key_column}的记录: {str(record)[:80]}")
+                continue
+            pending[key] = merge_record(pending.get(key), record)
+        if not pending:
+            return 0
+        
+        conn = self._get_connection()
+        # BEGIN IMMEDIATE 获取写锁，保证读取旧记录与写入之间不被其他进程修改
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = self._load_existing(conn, table, key_column, list(pending))
+            now = time.time()
+            rows = []
+            for key, record in pending.items():
+                old = existing.get(key)
+                merged = merge_record(old, record)
+                if merged == old:
+                    continue
+                rows.append(build_row(key, merged, now))
+            if rows:
+                conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+    
+    def upsert_videos(self, records):
+        """批量写入视频记录，返回实际新增或修改的行数"""
+        def build_row(aid, merged, now):
+            return (aid, merged.get('bvid'), merged.get('mid'), merged.get('tid'),
+                    merged.get('pubdate', merged.get('created')), merged.get('title'),
+                    json.dumps(merged, ensure_ascii=False), now)
+        
+        return self._upsert(
+            "videos", "aid", records, get_record_aid, build_row,
+            "INSERT INTO videos (aid, bvid, mid, tid, pubdate, title, data, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(aid) DO UPDATE SET bvid = excluded.bvid, mid = excluded.mid, tid = excluded.tid, "
+            "pubdate = excluded.pubdate, title = excluded.title, data = excluded.data, "
+            "updated_at = excluded.updated_at"
+        )
+    
+    def upsert_uploaders(self, records):
+        """批量写入UP主信息，返回实际新增或修改的行数"""
+        def get_mid(record):
+            try:
+                return int(record['mid'])
+            except (KeyError, TypeError, ValueError):
+                return None
+        
+        def build_row(mid, merged, now):
+            return (mid, merged.get('name'), json.dumps(merged, ensure_ascii=False), now)
+        
+        return self._upsert(
+            "uploaders", "mid", records, get_mid, build_row,
+            "INSERT INTO uploaders (mid, name, data, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(mid) DO UPDATE SET name = excluded.name, data = excluded.data, "
+            "updated_at = excluded.updated_at"
+        )
+    
+    def get_video(self, aid=None, bvid=None):
+        """按aid或bvid获取单个视频，不存在时返回None"""
+        conn = self._get_connection()
+        if aid is not None:
+            row = conn.execute("SELECT data FROM videos WHERE aid = ?", (int(aid),)).fetchone()
+        else:
+            row = conn.execute("SELECT data FROM videos WHERE bvid = ?", (bvid,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def get_uploader(self, mid):
+        """获取UP主信息，不存在时返回None"""
+        row = self._get_connection().execute("SELECT data FROM uploaders WHERE mid = ?", (int(mid),)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def query_videos(self, mid=None, since=None, until=None, tid=None, limit=None, newest_first=True):
+        """
+        按条件查询视频，逐条返回记录字典
+        
+        参数:
+            mid: UP主mid
+            since, until: 发布时间范围（时间戳，包含边界）
+            tid: 分区ID
+            limit: 最多返回的条数
+        """
+        conditions = []
+        params = []
+        for column, operator, value in (("mid", "=", mid), ("pubdate", ">=", since),
+                                         ("pubdate", "<=", until), ("tid", "=", tid)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        
+        sql = "SELECT data FROM videos"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY pubdate DESC" if newest_first else " ORDER BY pubdate"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        
+        for (data,) in self._get_connection().execute(sql, params):
+            yield json.loads(data)
+    
+    def count_videos(self):
+        return self._get_connection().execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+    
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class VideoStoreSink(RecordSink):
+    """
+    将爬虫结果写入SQLite存储的输出层
+    
+    包含aid或bvid的记录写入 videos 表，其余带 mid 的记录（如UP主信息）写入 uploaders 表，
+    三者都没有的记录无法写入，计入 skipped 并在关闭时提示。
+    记录先缓存，每 batch_size 条或每 flush_interval 秒批量写入一次
+    """
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size=DEFAULT_FSYNC_EVERY,
+                 flush_interval=DEFAULT_FSYNC_INTERVAL):
+        self.path = db_path
+        self.store = VideoStore(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.changed = 0
+        self.skipped = 0
+        self._videos = []
+        self._uploaders = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _flush(self):
+        if self._videos:
+            self.changed += self.store.upsert_videos(self._videos)
+            self._videos = []
+        if self._uploaders:
+            self.changed += self.store.upsert_uploaders(self._uploaders)
+            self._uploaders = []
+        self._last_flush = time.monotonic()
+    
+    def write(self, record):
+        with self._lock:
+            if record.get('aid') or record.get('bvid'):
+                self._videos.append(record)
+            elif record.get('mid'):
+                self._uploaders.append(record)
+            else:
+                self.skipped += 1
+                return
+            self.count += 1
+            
+            if (len(self._videos) + len(self._uploaders) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+    
+    def flush(self):
+        with self._lock:
+            self._flush()
+    
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.store.close()
+        if self.skipped:
+            print(f"警告: {self.skipped} 条记录缺少 aid/bvid/mid，未写入存储 {self.path}")
+
+def is_json_object_file(path):
+    """JSON文件的顶层是否为单个对象（如单视频爬虫的输出）"""
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    return head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{")
+
+def import_file(store, path, batch_size=1000):
+    """
+    将 ndjson / ndjson.zst / JSON数组文件导入视频存储，返回 (读取条数, 变化行数)
+    
+    所有格式都逐条读取（JSON数组在安装 ijson 时增量解析），内存占用与文件大小无关
+    """
+    if path.endswith(".json") and is_json_object_file(path):
+        # 单个视频对象，体积很小，直接读取
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            records = [json.load(f)]
+    else:
+        records = iter_records(path)
+    
+    total = 0
+    changed = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            changed += store.upsert_videos(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        changed += store.upsert_videos(batch)
+        total += len(batch)
+    return total, changed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站视频数据本地存储')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='数据库路径')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    import_parser = subparsers.add_parser('import', help='导入爬虫输出的 ndjson/json 文件')
+    import_parser.add_argument('files', nargs='+')
+    
+    query_parser = subparsers.add_parser('query', help='查询视频')
+    query_parser.add_argument('--mid', type=int)
+    query_parser.add_argument('--tid', type=int)
+    query_parser.add_argument('--since', help='发布时间下限，时间戳或 YYYY-MM-DD')
+    query_parser.add_argument('--until', help='发布时间上限，时间戳或 YYYY-MM-DD')
+    query_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+    
+    store = VideoStore(args.db)
+    if args.command == 'import':
+        for path in args.files:
+            total, changed = import_file(store, path)
+            print(f"{path}: 读取 {total} 条，新增或更新 {changed} 条")
+        print(f"数据库中共有 {store.count_videos()} 个视频")
+    elif args.command == 'query':
+        for video in store.query_videos(mid=args.mid, since=parse_timestamp(args.since),
+                                        until=parse_timestamp(args.until), tid=args.tid, limit=args.limit):
+            print(json.dumps(video, ensure_ascii=False))
+    else:
+        parser.print_help()
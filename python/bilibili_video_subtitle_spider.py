@@ -1,10 +1,24 @@
-import requests
+import argparse
 import json
 import re
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 
+# 共享HTTP客户端（controlled_request 带限速和响应缓存）
+from bilibili_http_client import http_get, controlled_request
+# 播放器信息（按aid/cid缓存）
+from bilibili_player import get_player_info
+from bilibili_bvid import av2bv
+# 字幕格式转换（SRT/WebVTT/LRC/TXT，支持写入zip/tar归档）
+from bilibili_subtitle_format import format_timestamp, write_subtitle, SubtitleArchive
+
+# 批量下载默认并发数（接口请求速率仍由共享令牌桶限速器控制）
+DEFAULT_SUBTITLE_WORKERS = 8
+# 批量下载默认输出目录
+DEFAULT_SUBTITLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "subtitles")
+
 # 尝试导入Cookie管理模块
 try:
     from bilibili_cookie_manager import get_cookie
@@ -30,6 +44,12 @@ def get_headers():
     
     return headers
 
+def get_cookie_dict():
+    """获取Cookie字典，没有Cookie管理模块时返回None"""
+    if HAS_COOKIE_MANAGER:
+        return get_cookie() or None
+    return None
+
 def extract_video_id(url):
     """从URL中提取视频ID (BV号或AV号)"""
     # 处理普通URL
@@ -61,15 +81,15 @@ def extract_video_id(url):
 
 def get_video_info(video_id):
     """获取视频信息，包括aid、cid和标题"""
-    headers = get_headers()
+    cookie_dict = get_cookie_dict()
     
     if video_id.lower().startswith('av'):
         # 处理AV号
         aid = video_id[2:]
-        url = f"https://api.bilibili.com/x/player/pagelist?aid={aid}"
+        url = "https://api.bilibili.com/x/player/pagelist"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = controlled_request(url, {'aid': aid}, cookie_dict=cookie_dict)
             data = response.json()
             
             if data['code'] != 0:
@@ -96,10 +116,10 @@ def get_video_info(video_id):
             
     else:
         # 处理BV号
-        url = f"https://api.bilibili.com/x/web-interface/view?bvid={video_id}"
+        url = "https://api.bilibili.com/x/web-interface/view"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = controlled_request(url, {'bvid': video_id}, cookie_dict=cookie_dict)
             data = response.json()
             
             if data['code'] != 0:
@@ -123,48 +143,24 @@ def get_video_info(video_id):
             return None
 
 def get_subtitle_list(aid, cid):
-    """获取字幕列表"""
-    url = f"https://api.bilibili.com/x/player/v2?aid={aid}&cid={cid}"
-    headers = get_headers()
-    
-    try:
-        response = requests.get(url, headers=headers)
-        data = response.json()
-        
-        if data['code'] != 0:
-            print(f"获取字幕列表失败: {data['message']}")
-            return []
-        
-        # 提取字幕列表
-        subtitle_info = data['data']['subtitle']
-        subtitles = subtitle_info.get('subtitles', [])
-        
-        return subtitles
-        
-    except Exception as e:
-        print(f"获取字幕列表时出错: {e}")
+    """获取字幕列表（读取共享的播放器信息缓存）"""
+    info = get_player_info(aid=aid, cid=cid, cookie_dict=get_cookie_dict())
+    if info is None:
         return []
+    return info.subtitles
 
 def get_ai_subtitle_url(aid, cid):
-    """获取AI自动生成字幕的URL"""
-    url = f"https://api.bilibili.com/x/player/v2?aid={aid}&cid={cid}"
-    headers = get_headers()
-    
-    try:
-        response = requests.get(url, headers=headers)
-        data = response.json()
-        
-        if data['code'] != 0:
-            print(f"获取AI字幕URL失败: {data['message']}")
-            return None
-            
-        # AI字幕通常在subtitle_url字段中，如果为空则需要使用另一个接口
-        ai_subtitle_url = f"https://api.bilibili.com/x/player/v2/ai/subtitle?aid={aid}&cid={cid}"
-        return ai_subtitle_url
-        
-    except Exception as e:
-        print(f"获取AI字幕URL时出错: {e}")
+    """获取AI自动生成字幕的URL（与 get_subtitle_list 共用同一份播放器信息）"""
+    info = get_player_info(aid=aid, cid=cid, cookie_dict=get_cookie_dict())
+    if info is None:
+        print("获取AI字幕URL失败")
         return None
+    
+    # 播放器信息中带有地址的AI字幕优先，否则使用AI字幕接口
+    for subtitle in info.ai_subtitles:
+        if subtitle.get('subtitle_url'):
+            return subtitle['subtitle_url']
+    return f"https://api.bilibili.com/x/player/v2/ai/subtitle?aid={aid}&cid={cid}"
 
 def get_subtitle_content(subtitle_url, aid=None, cid=None, is_ai_subtitle=False):
     """获取字幕内容"""
@@ -198,7 +194,7 @@ def get_subtitle_content(subtitle_url, aid=None, cid=None, is_ai_subtitle=False)
     headers = get_headers()
     
     try:
-        response = requests.get(subtitle_url, headers=headers)
+        response = http_get(subtitle_url, headers=headers)
         
         # 打印调试信息
         print(f"字幕URL状态码: {response.status_code}")
@@ -220,33 +216,194 @@ def get_subtitle_content(subtitle_url, aid=None, cid=None, is_ai_subtitle=False)
         return None
 
 def format_time(seconds):
-    """将秒数格式化为时:分:秒.毫秒格式"""
-    m, s = divmod(seconds, 60)
-    h, m = divmod(m, 60)
-    ms = int((seconds - int(seconds)) * 1000)
-    return f"{int(h):02d}:{int(m):02d}:{int(s):02d},{ms:03d}"
+    """将秒数格式化为时:分:秒,毫秒格式"""
+    return format_timestamp(seconds)
 
-def save_as_srt(subtitle_data, output_file):
-    """将字幕保存为SRT格式"""
+def save_subtitle_file(subtitle_data, output_file, fmt):
+    """将字幕按指定格式保存（见 bilibili_subtitle_format）"""
     if not subtitle_data or 'body' not in subtitle_data:
         print("字幕数据无效或为空")
         return False
-        
+    
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for i, item in enumerate(subtitle_data['body'], 1):
-                start_time = format_time(item['from'])
-                end_time = format_time(item['to'])
-                content = item['content']
-                
-                f.write(f"{i}\n")
-                f.write(f"{start_time} --> {end_time}\n")
-                f.write(f"{content}\n\n")
+        write_subtitle(subtitle_data['body'], fmt, output_file)
         return True
     except Exception as e:
         print(f"保存字幕文件时出错: {e}")
         return False
 
+def save_as_srt(subtitle_data, output_file):
+    """将字幕保存为SRT格式"""
+    return save_subtitle_file(subtitle_data, output_file, 'srt')
+
+def format_vtt_time(seconds):
+    """将秒数格式化为WebVTT时间格式 时:分:秒.毫秒"""
+    return format_timestamp(seconds, '.')
+
+def save_as_vtt(subtitle_data, output_file):
+    """将字幕保存为WebVTT格式"""
+    return save_subtitle_file(subtitle_data, output_file, 'vtt')
+
+def save_as_lrc(subtitle_data, output_file):
+    """将字幕保存为LRC歌词格式"""
+    return save_subtitle_file(subtitle_data, output_file, 'lrc')
+
+def save_as_txt(subtitle_data, output_file):
+    """将字幕保存为纯文本，每行一句"""
+    return save_subtitle_file(subtitle_data, output_file, 'txt')
+
+# 输出格式 -> 保存函数
+SUBTITLE_WRITERS = {
+    'srt': save_as_srt,
+    'vtt': save_as_vtt,
+    'lrc': save_as_lrc,
+    'txt': save_as_txt,
+}
+
+def safe_filename(name):
+    """去除文件名中的非法字符"""
+    return re.sub(r'[\\/*?:"<>|]', "_", str(name)).strip() or "untitled"
+
+def fetch_subtitle_json(subtitle_url):
+    """下载字幕JSON（批量模式使用，不打印调试信息），失败时返回None"""
+    if not subtitle_url:
+        return None
+    if not subtitle_url.startswith('http'):
+        subtitle_url = f"https:{subtitle_url}"
+    
+    try:
+        response = http_get(subtitle_url, headers=get_headers())
+        if response.status_code != 200:
+            print(f"下载字幕失败，状态码: {response.status_code}，URL: {subtitle_url}")
+            return None
+        return response.json()
+    except Exception as e:
+        print(f"下载字幕 {subtitle_url} 出错: {e}")
+        return None
+
+def select_subtitles(subtitles, languages=None):
+    """
+    按语言选择字幕
+    
+    参数:
+        subtitles: get_subtitle_list() 返回的字幕列表
+        languages: 语言代码列表（如 ['zh-CN', 'ai-zh']），按顺序匹配所有命中的语言；
+                   为None时选择第一个字幕，包含 'all' 时选择全部字幕
+    
+    返回:
+        选中的字幕列表，没有命中指定语言时退回第一个字幕
+    """
+    if not subtitles:
+        return []
+    if not languages:
+        return subtitles[:1]
+    if 'all' in languages:
+        return list(subtitles)
+    
+    selected = [subtitle for lang in languages for subtitle in subtitles if subtitle.get('lan') == lang]
+    return selected or subtitles[:1]
+
+def download_video_subtitles(video_ids, languages=None, formats=('srt',), output_dir=DEFAULT_SUBTITLE_DIR,
+                             max_workers=DEFAULT_SUBTITLE_WORKERS, index=None, archive=None):
+    """
+    批量下载多个视频全部分P的字幕
+    
+    三个阶段分别并发执行：获取视频分P信息 -> 按cid获取字幕列表(/x/player/v2) -> 下载选中语言的字幕JSON并写出文件
+    
+    参数:
+        video_ids: 视频BV号、AV号或视频URL列表
+        languages: 语言代码列表，见 select_subtitles()
+        formats: 输出格式，可选 srt / vtt / lrc / txt
+        output_dir: 输出目录，每个视频一个子目录
+        archive: 归档文件路径（.zip / .tar / .tar.gz / .tgz / .tar.xz），提供时所有字幕写入该归档而不是散落的小文件
+        max_workers: 并发数
+        index: SubtitleIndex，提供时同时将字幕写入全文索引（formats 可以为空，只建索引）
+    
+    返回:
+        写出的文件路径列表（写入归档时为归档内的文件名）
+    """
+    for fmt in formats:
+        if fmt not in SUBTITLE_WRITERS:
+            raise ValueError(f"不支持的字幕格式: {fmt}，可选: {', '.join(SUBTITLE_WRITERS)}")
+    
+    subtitle_archive = SubtitleArchive(archive) if archive and formats else None
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # 阶段1：获取每个视频的分P信息
+        def load_video(video_id):
+            try:
+                video_id = extract_video_id(video_id)
+            except ValueError as e:
+                print(f"{video_id}: {e}")
+                return None
+            info = get_video_info(video_id)
+            if info:
+                info['video_id'] = video_id
+            return info
+        
+        videos = [info for info in executor.map(load_video, video_ids) if info]
+        parts = [(video, page) for video in videos for page in video.get('pages') or []]
+        print(f"共 {len(videos)} 个视频，{len(parts)} 个分P")
+        
+        # 阶段2：按cid获取字幕列表并选择语言
+        def load_tracks(part):
+            video, page = part
+            subtitles = get_subtitle_list(video['aid'], page['cid'])
+            return [(video, page, subtitle) for subtitle in select_subtitles(subtitles, languages)]
+        
+        tracks = [track for part_tracks in executor.map(load_tracks, parts) for track in part_tracks]
+        print(f"共 {len(tracks)} 个字幕待下载")
+        
+        # 阶段3：下载字幕JSON并写出文件
+        def download_track(track):
+            video, page, subtitle = track
+            lang = subtitle.get('lan') or 'unknown'
+            content = fetch_subtitle_json(subtitle.get('subtitle_url'))
+            if not content:
+                print(f"{video['video_id']} P{page.get('page')} {lang}: 字幕内容为空或下载失败")
+                return []
+            
+            if index is not None:
+                bvid = video['video_id'] if video['video_id'].upper().startswith('BV') else av2bv(int(video['aid']))
+                index.add_subtitle(content.get('body') or [], cid=page['cid'], lan=lang, bvid=bvid,
+                                   aid=video['aid'], page=page.get('page'), title=video['title'],
+                                   part=page.get('part'))
+            if not formats:
+                return []
+            
+            video_dir_name = safe_filename(f"{video['video_id']}_{video['title']}")
+            base_name = safe_filename(f"P{page.get('page', 1):03d}_{page.get('part') or ''}_{lang}")
+            written = []
+            if subtitle_archive is not None:
+                for fmt in formats:
+                    member_name = f"{video_dir_name}/{base_name}.{fmt}"
+                    subtitle_archive.add(member_name, content.get('body') or [], fmt)
+                    written.append(member_name)
+                return written
+            
+            video_dir = os.path.join(output_dir, video_dir_name)
+            os.makedirs(video_dir, exist_ok=True)
+            for fmt in formats:
+                output_file = os.path.join(video_dir, f"{base_name}.{fmt}")
+                if SUBTITLE_WRITERS[fmt](content, output_file):
+                    written.append(output_file)
+            return written
+        
+        try:
+            files = [path for written in executor.map(download_track, tracks) for path in written]
+        finally:
+            if subtitle_archive is not None:
+                subtitle_archive.close()
+    
+    if subtitle_archive is not None:
+        print(f"已写入 {len(files)} 个字幕文件至归档: {archive}")
+    elif formats:
+        print(f"已写出 {len(files)} 个字幕文件至: {output_dir}")
+    if index is not None:
+        stats = index.get_stats()
+        print(f"字幕索引共 {stats['tracks']} 条字幕轨道，{stats['cues']} 条字幕")
+    return files
+
 def main():
     """主函数"""
     # 获取视频URL
@@ -313,7 +470,7 @@ def main():
             return
         
         # 保存为SRT格式
-        safe_title = re.sub(r'[\\/*?:"<>|]', "_", video_info['title'])
+        safe_title = safe_filename(video_info['title'])
         output_file = f"{safe_title}_{lang}.srt"
         
         if save_as_srt(subtitle_content, output_file):
@@ -325,4 +482,30 @@ def main():
         print(f"处理过程中出错: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description='B站视频字幕批量下载（全部分P）')
+        parser.add_argument('videos', nargs='*', help='视频BV号、AV号或视频URL')
+        parser.add_argument('-i', '--input-file', help='视频ID列表文件，每行一个')
+        parser.add_argument('--lang', nargs='+', default=None,
+                            help='字幕语言代码（如 zh-CN ai-zh），all 为全部语言，默认取第一个字幕')
+        parser.add_argument('--format', nargs='*', choices=sorted(SUBTITLE_WRITERS), default=['srt'],
+                            help='输出格式，默认为 srt；不跟格式时不写文件（配合 --index 只建索引）')
+        parser.add_argument('--index', action='store_true', help='同时写入字幕全文索引（见 bilibili_subtitle_index）')
+        parser.add_argument('--output-dir', default=DEFAULT_SUBTITLE_DIR, help='输出目录')
+        parser.add_argument('--archive', help='将字幕写入一个 zip / tar 归档（如 subtitles.zip、subtitles.tar.gz）')
+        parser.add_argument('--workers', type=int, default=DEFAULT_SUBTITLE_WORKERS, help='并发数')
+        args = parser.parse_args()
+        
+        video_ids = list(args.videos)
+        if args.input_file:
+            with open(args.input_file, 'r', encoding='utf-8') as f:
+                video_ids.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        index = None
+        if args.index:
+            from bilibili_subtitle_index import SubtitleIndex
+            index = SubtitleIndex()
+        download_video_subtitles(video_ids, languages=args.lang, formats=args.format,
+                                 output_dir=args.output_dir, max_workers=args.workers, index=index,
+                                 archive=args.archive)
+    else:
+        main()
\ No newline at end of file
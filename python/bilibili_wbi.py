@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+B站WBI签名模块
+=============
+
+集中管理WBI密钥和签名，供 up_all_video_spider、category_video_spider、
+signature_avatar_spider_job 及异步引擎共用。
+
+功能：
+1. 进程内共享的WBI密钥提供器（WbiKeyProvider），在内存中保存 img_key/sub_key
+   及预先计算好的混合密钥(mixin_key)，带有效期
+2. 临近过期时在后台线程刷新（同一时间只有一个刷新在进行），调用方不会被阻塞
+3. 仅在密钥发生变化时写入 data/wbi_keys_cache.json
+4. WBI签名计算（get_wbi_signature）
+
+使用方法：
+    from bilibili_wbi import get_wbi_keys, get_wbi_signature
+    
+    img_key, sub_key = get_wbi_keys()
+    params = get_wbi_signature(params, img_key, sub_key)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from bilibili_http_client import get_bili_ticket
+
+# 数据存储目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+WBI_KEYS_CACHE_FILE = os.path.join(DATA_DIR, "wbi_keys_cache.json")
+
+# 获取失败时使用的默认密钥
+DEFAULT_IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+DEFAULT_SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+
+# 密钥有效期（默认24小时），以及提前多久开始后台刷新
+DEFAULT_KEY_TTL = 86400
+DEFAULT_REFRESH_MARGIN = 3600
+# 使用默认密钥时，多久后再次尝试获取
+FALLBACK_KEY_TTL = 300
+
+# 混合密钥的重排索引
+MIXIN_KEY_ENC_TAB = [46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49, 33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13]
+
+def get_mixin_key(orig_key):
+    # B站混合盐值算法
+    mixed_key = ""
+    for i in MIXIN_KEY_ENC_TAB:
+        if i < len(orig_key):
+            mixed_key += orig_key[i]
+    return mixed_key
+
+def get_wbi_signature(params, img_key, sub_key):
+    # 合并key并计算混合密钥
+    mixin_key = get_mixin_key(img_key + sub_key)
+    
+    # 添加时间戳
+    params['wts'] = str(int(time.time()))
+    
+    # 按照key排序
+    sorted_params = dict(sorted(params.items()))
+    
+    # 过滤特殊字符
+    query_items = []
+    for k, v in sorted_params.items():
+        # 修正：WBI签名需要过滤掉一些特殊字符
+        v_str = str(v)
+        v_str = ''.join(ch for ch in v_str if ch not in "!'()*")
+        query_items.append(f"{k}={v_str}")
+    
+    query = "&".join(query_items)
+    
+    # 计算w_rid
+    md5 = hashlib.md5()
+    md5.update((query + mixin_key).encode())
+    params['w_rid'] = md5.hexdigest()
+    
+    return params
+
+def save_wbi_keys_to_cache(img_key, sub_key, cache_file=WBI_KEYS_CACHE_FILE):
+    """将WBI密钥保存到缓存文件"""
+    try:
+        # 创建data目录
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        
+        cache_data = {
+            "img_key": img_key,
+            "sub_key": sub_key,
+            "timestamp": int(time.time())
+        }
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(cache_data, f)
+        print("WBI密钥已保存到缓存")
+    except Exception as e:
+        print(f"保存WBI密钥到缓存失败: {e}")
+
+def load_wbi_keys_from_cache(cache_file=WBI_KEYS_CACHE_FILE, ttl=DEFAULT_KEY_TTL):
+    """从缓存文件加载WBI密钥，返回 (img_key, sub_key, timestamp)"""
+    try:
+        if not os.path.exists(cache_file):
+            return None, None, None
+        
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cache_data = json.load(f)
+            
+            # 检查缓存是否过期（默认24小时）
+            if int(time.time()) - cache_data["timestamp"] < ttl:
+                return cache_data["img_key"], cache_data["sub_key"], cache_data["timestamp"]
+            else:
+                print("缓存的WBI密钥已过期")
+    except Exception as e:
+        print(f"从缓存加载WBI密钥失败: {e}")
+    
+    return None, None, None
+
+class WbiKeyProvider:
+    """进程内共享的WBI密钥提供器（线程安全）"""
+    
+    def __init__(self, cache_file=WBI_KEYS_CACHE_FILE, ttl=DEFAULT_KEY_TTL,
+                 refresh_margin=DEFAULT_REFRESH_MARGIN):
+        """
+        参数:
+            cache_file: 密钥缓存文件路径
+            ttl: 密钥有效期(秒)
+            refresh_margin: 距离过期不足该秒数时触发后台刷新
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self._img_key = None
+        self._sub_key = None
+        self._mixin_key = None
+        self._expires_at = 0
+        self._refresh_at = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+    
+    def _set_keys(self, img_key, sub_key, fetched_at, ttl):
+        with self._lock:
+            self._img_key = img_key
+            self._sub_key = sub_key
+            self._mixin_key = get_mixin_key(img_key + sub_key)
+            self._expires_at = fetched_at + ttl
+            # 有效期较短（如使用默认密钥）时不提前刷新，避免频繁请求
+            margin = self.refresh_margin if ttl > self.refresh_margin else 0
+            self._refresh_at = self._expires_at - margin
+    
+    def _load_from_disk(self):
+        """首次使用时从缓存文件加载一次"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+        
+        img_key, sub_key, timestamp = load_wbi_keys_from_cache(self.cache_file, self.ttl)
+        if img_key and sub_key:
+            print(f"从缓存加载WBI密钥: img_key={img_key}, sub_key={sub_key}")
+            self._set_keys(img_key, sub_key, timestamp, self.ttl)
+    
+    def refresh(self):
+        """
+        从服务器重新获取密钥（同一时间只有一个刷新在进行）
+        
+        其他线程在刷新进行时调用会等待其完成并直接使用结果
+        """
+        refresh_at_before = self._refresh_at
+        with self._refresh_lock:
+            # 等待期间已有其他线程完成刷新
+            if self._refresh_at != refresh_at_before and not self._needs_refresh():
+                return self.get_cached_keys()
+            
+            _, img_key, sub_key = get_bili_ticket()
+            now = int(time.time())
+            if img_key and sub_key:
+                changed = (img_key, sub_key) != (self._img_key, self._sub_key)
+                self._set_keys(img_key, sub_key, now, self.ttl)
+                # 仅在密钥变化时写入磁盘
+                if changed:
+                    save_wbi_keys_to_cache(img_key, sub_key, self.cache_file)
+            elif self._img_key and self._sub_key:
+                # 获取失败但仍有旧密钥，稍后再试
+                print("刷新WBI密钥失败，继续使用当前密钥")
+                self._set_keys(self._img_key, self._sub_key, now, FALLBACK_KEY_TTL)
+            else:
+                print("获取WBI密钥失败，使用默认值")
+                self._set_keys(DEFAULT_IMG_KEY, DEFAULT_SUB_KEY, now, FALLBACK_KEY_TTL)
+            
+            return self.get_cached_keys()
+    
+    def _needs_refresh(self):
+        return time.time() >= self._refresh_at
+    
+    def _refresh_in_background(self):
+        """启动后台刷新线程（已有刷新线程在运行时不重复启动）"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name="wbi-key-refresh", daemon=True)
+            self._refresh_thread.start()
+    
+    def get_cached_keys(self):
+        """返回内存中的密钥 (img_key, sub_key)，不触发任何刷新"""
+        with self._lock:
+            return self._img_key, self._sub_key
+    
+    def get_keys(self):
+        """获取当前可用的 (img_key, sub_key)"""
+        self._load_from_disk()
+        
+        if time.time() >= self._expires_at:
+            # 已过期或尚无密钥，同步刷新
+            return self.refresh()
+        
+        if self._needs_refresh():
+            # 临近过期，后台刷新，先返回当前密钥
+            self._refresh_in_background()
+        
+        return self.get_cached_keys()
+    
+    def get_mixin_key(self):
+        """获取当前密钥对应的混合密钥"""
+        self.get_keys()
+        with self._lock:
+            return self._mixin_key
+
+# 进程内共享的密钥提供器
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+def get_wbi_key_provider():
+    """获取进程内共享的WBI密钥提供器"""
+    global _default_provider
+    if _default_provider is None:
+        with _default_provider_lock:
+            if _default_provider is None:
+                _default_provider = WbiKeyProvider()
+    return _default_provider
+
+def get_wbi_keys():
+    """获取WBI密钥 (img_key, sub_key)，由进程内共享的提供器缓存"""
+    return get_wbi_key_provider().get_keys()
+
+class WbiSigner:
+    """带混合密钥缓存的WBI签名器"""
+    
+    # 需要从参数值中过滤的字符
+    FILTER_TABLE = str.maketrans('', '', "!'()*")
+    # 混合密钥缓存的最大条目数（密钥通常每天才变化一次）
+    MAX_CACHED_KEYS = 16
+    
+    def __init__(self, img_key=None, sub_key=None, provider=None):
+        """
+        参数:
+            img_key, sub_key: 固定使用的密钥；不提供时每次签名从 provider 获取当前密钥
+            provider: WBI密钥提供器，默认为进程内共享的提供器
+        """
+        self.img_key = img_key
+        self.sub_key = sub_key
+        self.provider = provider
+        self._mixin_keys = {}
+        self._lock = threading.Lock()
+    
+    def get_mixin_key(self):
+        """获取当前密钥对应的混合密钥（按 (img_key, sub_key) 缓存）"""
+        if self.img_key and self.sub_key:
+            keys = (self.img_key, self.sub_key)
+        else:
+            keys = (self.provider or get_wbi_key_provider()).get_keys()
+        
+        mixin_key = self._mixin_keys.get(keys)
+        if mixin_key is None:
+            orig_key = keys[0] + keys[1]
+            mixin_key = ''.join([orig_key[i] for i in MIXIN_KEY_ENC_TAB if i < len(orig_key)])
+            with self._lock:
+                if len(self._mixin_keys) >= self.MAX_CACHED_KEYS:
+                    self._mixin_keys.clear()
+                self._mixin_keys[keys] = mixin_key
+        return mixin_key
+    
+    def _sign(self, params, mixin_key, wts):
+        signed = dict(params)
+        signed['wts'] = wts
+        table = self.FILTER_TABLE
+        query = "&".join([f"{k}={str(v).translate(table)}" for k, v in sorted(signed.items())])
+        signed['w_rid'] = hashlib.md5((query + mixin_key).encode()).hexdigest()
+        return signed
+    
+    def sign(self, params, wts=None):
+        """
+        对参数进行WBI签名
+        
+        参数:
+            params: 请求参数（不会被修改）
+            wts: 时间戳字符串，默认为当前时间
+        
+        返回:
+            添加了 wts 和 w_rid 的新参数字典
+        """
+        if wts is None:
+            wts = str(int(time.time()))
+        return self._sign(params, self.get_mixin_key(), wts)
+    
+    def sign_many(self, params_list, wts=None):
+        """
+        批量签名，所有参数共用同一个时间戳和混合密钥
+        
+        适合预先生成大量签名URL（如所有UP主的所有分页），返回新参数字典的列表
+        """
+        if wts is None:
+            wts = str(int(time.time()))
+        mixin_key = self.get_mixin_key()
+        return [self._sign(params, mixin_key, wts) for params in params_list]
+
+# 进程内共享的签名器
+_default_signer = WbiSigner()
+
+def get_wbi_signer():
+    """获取使用共享密钥提供器的签名器"""
+    return _default_signer
+
+def benchmark_wbi_signer(count=20000):
+    """对比 get_wbi_signature 与 WbiSigner 的签名速度，并校验 w_rid 完全一致"""
+    img_key, sub_key = DEFAULT_IMG_KEY, DEFAULT_SUB_KEY
+    params_list = [
+        {
+            'mid': 10000 + i,
+            'pn': i % 70 + 1,
+            'ps': 30,
+            'order': 'pubdate',
+            'platform': 'web',
+            'web_location': '333.999',
+            'tid': 0,
+            'keyword': "it's (test)*!" if i % 5 == 0 else '',
+            'unique_k': ''
+        }
+        for i in range(count)
+    ]
+    
+    # 原始实现
+    start = time.perf_counter()
+    legacy_results = [get_wbi_signature(dict(params), img_key, sub_key) for params in params_list]
+    legacy_time = time.perf_counter() - start
+    
+    signer = WbiSigner(img_key, sub_key)
+    
+    # 逐条签名（使用与原始实现相同的时间戳）
+    start = time.perf_counter()
+    sign_results = [signer.sign(params, wts=legacy['wts'])
+                    for params, legacy in zip(params_list, legacy_results)]
+    sign_time = time.perf_counter() - start
+    
+    # 批量签名：原始实现运行期间可能跨秒，按时间戳分组
+    groups = {}
+    for index, legacy in enumerate(legacy_results):
+        groups.setdefault(legacy['wts'], []).append(index)
+    batch_results = [None] * count
+    start = time.perf_counter()
+    for wts, indexes in groups.items():
+        signed_list = signer.sign_many([params_list[i] for i in indexes], wts=wts)
+        for i, signed in zip(indexes, signed_list):
+            batch_results[i] = signed
+    batch_time = time.perf_counter() - start
+    
+    for legacy, signed, batched in zip(legacy_results, sign_results, batch_results):
+        assert legacy['w_rid'] == signed['w_rid'] == batched['w_rid'], \
+            f"w_rid不一致: {legacy['w_rid']} / {signed['w_rid']} / {batched['w_rid']}"
+    
+    print(f"签名 {count} 组参数，w_rid 全部一致")
+    print(f"get_wbi_signature: {legacy_time:.3f}秒")
+    print(f"WbiSigner.sign:    {sign_time:.3f}秒 (提速 {legacy_time / sign_time:.2f}x)")
+    print(f"WbiSigner.sign_many: {batch_time:.3f}秒 (提速 {legacy_time / batch_time:.2f}x)")
+    return legacy_time, sign_time, batch_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='B站WBI签名工具')
+    parser.add_argument('--benchmark', action='store_true', help='运行签名性能对比')
+    parser.add_argument('--count', type=int, default=20000, help='性能对比使用的参数组数')
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark_wbi_signer(args.count)
+    else:
+        img_key, sub_key = get_wbi_keys()
+        print(f"当前WBI密钥: img_key={img_key}, sub_key={sub_key}")
@@ -17,13 +17,18 @@ B站视频信息批量抓取工具
 版本：1.0
 """
 
-import requests
 import time
 import json
-import random
 import os
-import sys
-from bilibili_cookie_manager import get_cookie, get_headers
+from itertools import chain, islice
+from bilibili_cookie_manager import get_cookie
+from bilibili_http_client import controlled_request as shared_controlled_request
+from bilibili_bvid import bv2av
+from bilibili_video_enrich import enrich_videos, BATCH_FIELDS
+from bilibili_record_io import open_record_sink, iter_records, DEFAULT_OUTPUT_FORMAT
+
+# 流式处理时每块的视频数
+DEFAULT_CHUNK_SIZE = 500
 
 # 默认的BV号列表
 DEFAULT_BVIDS = [
@@ -35,10 +40,11 @@ def get_video_detail(bvid, cookie_dict=None):
     """获取单个视频的详细信息"""
     url = "https://api.bilibili.com/x/web-interface/view"
     params = {'bvid': bvid}
-    headers = get_headers(cookie_dict)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = controlled_request(url, params, cookie_dict=cookie_dict)
+        if response is None:
+            return None
         if response.status_code == 200:
             return response.json()
         else:
@@ -48,37 +54,34 @@ def get_video_detail(bvid, cookie_dict=None):
         print(f"获取视频详情出错: {str(e)}")
         return None
 
-def controlled_request(url, params, cookie_dict=None, delay_range=(1, 3), max_retries=3):
+def controlled_request(url, params, cookie_dict=None, delay_range=None, max_retries=3):
     """发送请求并控制频率"""
-    retries = 0
-    while retries < max_retries:
-        # 随机延时
-        sleep_time = random.uniform(*delay_range)
-        time.sleep(sleep_time)
-        
-        # 发送请求
-        headers = get_headers(cookie_dict)
-        
-        response = requests.get(url, params=params, headers=headers)
-        
-        # 检查是否被拦截
-        if response.status_code == 412:
-            print("请求被拦截，等待更长时间后重试...")
-            time.sleep(random.uniform(15, 30))
-            retries += 1
-            continue
-        
-        return response
+    return shared_controlled_request(url, params, cookie_dict=cookie_dict, delay_range=delay_range,
+                                     max_retries=max_retries, blocked_delay_range=(15, 30))
+
+def iter_bvids_from_file(file_path):
+    """
+    逐个读取文件中的BV号，不把整个文件载入内存
     
-    print(f"请求失败，已尝试{max_retries}次")
-    return None
+    支持每行一个BV号的文本文件，以及爬虫输出的 .json / .ndjson / .ndjson.zst 文件（读取记录中的bvid字段）
+    """
+    if file_path.endswith((".json", ".ndjson", ".ndjson.zst")):
+        for record in iter_records(file_path):
+            bvid = record.get('bvid') if isinstance(record, dict) else record
+            if isinstance(bvid, str) and bvid.startswith("BV"):
+                yield bvid
+        return
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("BV"):
+                yield line
 
 def load_bvids_from_file(file_path):
     """从文件加载BV号列表"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            bvids = [line.strip() for line in f if line.strip().startswith("BV")]
-        return bvids
+        return list(iter_bvids_from_file(file_path))
     except Exception as e:
         print(f"从文件加载BV号失败: {e}")
         return []
@@ -99,80 +102,114 @@ def save_data_to_json(data, filename="video_data.json"):
     print(f"数据已保存至: {output_file}")
     return output_file
 
-def fetch_videos_data(bvids, cookie_dict=None):
-    """批量获取视频数据"""
+def apply_video_detail(video_data, detail):
+    """将视频详情接口返回的数据合并到视频数据中"""
+    if not detail or detail.get('code') != 0:
+        error_msg = detail.get('message') if detail else "未知错误"
+        print(f"获取视频 {video_data['bvid']} 信息失败: {error_msg}")
+        return video_data
+    
+    detail_data = detail.get('data', {})
+    
+    # 提取视频基本信息
+    video_data.update({
+        'aid': detail_data.get('aid'),
+        'bvid': detail_data.get('bvid'),
+        'title': detail_data.get('title'),
+        'desc': detail_data.get('desc'),
+        'dynamic': detail_data.get('dynamic'),
+        'pic': detail_data.get('pic'),
+        'created': detail_data.get('pubdate'),
+        'length': detail_data.get('duration'),
+        'cid': detail_data.get('cid')
+    })
+    
+    # 添加UP主信息
+    owner = detail_data.get('owner', {})
+    video_data.update({
+        'author': owner.get('name'),
+        'mid': owner.get('mid'),
+        'owner_face': owner.get('face')
+    })
+    
+    # 添加统计数据
+    stat = detail_data.get('stat', {})
+    video_data.update({
+        'play': stat.get('view'),
+        'danmaku': stat.get('danmaku'),
+        'favorite': stat.get('favorite'),
+        'coin': stat.get('coin'),
+        'share': stat.get('share'),
+        'like': stat.get('like'),
+        'dislike': stat.get('dislike'),
+        'comment': stat.get('reply'),
+    })
+    
+    # 添加分区信息
+    if 'tid' in detail_data:
+        video_data['tid'] = detail_data.get('tid')
+        video_data['tname'] = detail_data.get('tname')
+    
+    # 添加视频标签
+    if 'tag' in detail_data:
+        video_data['tags'] = detail_data.get('tag').split(',')
+    
+    print(f"成功获取视频信息: {video_data['title']}")
+    return video_data
+
+def fetch_videos_data(bvids, cookie_dict=None, fields=None, sink=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    批量获取视频数据
+    
+    bvids 可以是列表或生成器（如 iter_bvids_from_file），按 chunk_size 分块处理。
+    fields 为需要的字段集合，None 表示全部字段（缺少 /view 专有字段的视频逐个请求视频详情）；
+    传入 BATCH_FIELDS 时只使用批量接口，BV号在本地转换为AV号后批量查询。
+    传入 sink（bilibili_record_io 输出层）时，每条成功获取的记录立即写入且不在内存中保留，返回空列表；
+    否则返回成功获取的视频数据列表
+    """
+    if hasattr(bvids, '__len__'):
+        print(f"开始获取{len(bvids)}个视频的数据...")
+    else:
+        print("开始获取视频数据...")
+    
     video_data_list = []
     success_count = 0
     failed_count = 0
     
-    print(f"开始获取{len(bvids)}个视频的数据...")
+    def write_result(video_data, ok):
+        if not ok:
+            return
+        if sink is not None:
+            sink.write(video_data)
+        else:
+            video_data_list.append(video_data)
     
-    for index, bvid in enumerate(bvids):
-        print(f"[{index+1}/{len(bvids)}] 正在获取视频 {bvid} 的信息...")
+    iterator = iter(bvids)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
         
-        detail = get_video_detail(bvid, cookie_dict)
+        videos = []
+        for bvid in chunk:
+            try:
+                aid = bv2av(bvid)
+            except ValueError:
+                aid = None
+            videos.append({'aid': aid, 'bvid': bvid})
         
-        if detail and detail.get('code') == 0:
-            detail_data = detail.get('data', {})
-            
-            # 提取视频基本信息
-            video_data = {
-                'aid': detail_data.get('aid'),
-                'bvid': detail_data.get('bvid'),
-                'title': detail_data.get('title'),
-                'desc': detail_data.get('desc'),
-                'dynamic': detail_data.get('dynamic'),
-                'pic': detail_data.get('pic'),
-                'created': detail_data.get('pubdate'),
-                'length': detail_data.get('duration'),
-                'cid': detail_data.get('cid')
-            }
-            
-            # 添加UP主信息
-            owner = detail_data.get('owner', {})
-            video_data.update({
-                'author': owner.get('name'),
-                'mid': owner.get('mid'),
-                'owner_face': owner.get('face')
-            })
-            
-            # 添加统计数据
-            stat = detail_data.get('stat', {})
-            video_data.update({
-                'play': stat.get('view'),
-                'danmaku': stat.get('danmaku'),
-                'favorite': stat.get('favorite'),
-                'coin': stat.get('coin'),
-                'share': stat.get('share'),
-                'like': stat.get('like'),
-                'dislike': stat.get('dislike'),
-                'comment': stat.get('reply'),
-            })
-            
-            # 添加分区信息
-            if 'tid' in detail_data:
-                video_data['tid'] = detail_data.get('tid')
-                video_data['tname'] = detail_data.get('tname')
-            
-            # 添加视频标签
-            if 'tag' in detail_data:
-                video_data['tags'] = detail_data.get('tag').split(',')
-            
-            video_data_list.append(video_data)
-            success_count += 1
-            print(f"成功获取视频信息: {video_data['title']}")
-        else:
-            failed_count += 1
-            error_msg = detail.get('message') if detail else "未知错误"
-            print(f"获取视频 {bvid} 信息失败: {error_msg}")
+        results = enrich_videos(videos, lambda video_data: get_video_detail(video_data['bvid'], cookie_dict),
+                                apply_video_detail, cookie_dict=cookie_dict, fields=fields,
+                                on_result=write_result)
         
-        # 避免请求过于频繁
-        time.sleep(random.uniform(1, 2.5))
+        chunk_success = sum(1 for ok in results if ok)
+        success_count += chunk_success
+        failed_count += len(results) - chunk_success
     
     print(f"\n数据获取完成！成功: {success_count}, 失败: {failed_count}")
     return video_data_list
 
-def main():
+def main(output_format=DEFAULT_OUTPUT_FORMAT):
     # 使用 bilibili_cookie_manager 获取 cookie
     cookie_dict = get_cookie()
     
@@ -196,28 +233,39 @@ def main():
             print("文件路径为空，使用默认BV号列表")
             bvids = DEFAULT_BVIDS
         else:
-            bvids = load_bvids_from_file(file_path)
-            if not bvids:
+            # 逐个读取BV号，不把整个文件载入内存
+            try:
+                bvids = iter_bvids_from_file(file_path)
+                first_bvid = next(bvids, None)
+            except Exception as e:
+                print(f"从文件加载BV号失败: {e}")
+                first_bvid = None
+            if first_bvid is None:
                 print("从文件加载BV号失败或文件为空，使用默认BV号列表")
                 bvids = DEFAULT_BVIDS
             else:
-                print(f"从文件加载BV号列表成功，共{len(bvids)}个视频")
+                bvids = chain([first_bvid], bvids)
+                print("从文件读取BV号列表成功")
     else:
         print("无效的选择，使用默认BV号列表")
         bvids = DEFAULT_BVIDS
     
-    # 获取视频数据
-    video_data = fetch_videos_data(bvids, cookie_dict)
+    batch_only = input("是否只获取批量接口提供的字段（不含投币、点赞、标签等，请求量大幅减少）? (y/n): ")
+    fields = BATCH_FIELDS if batch_only.lower() == 'y' else None
     
     # 生成当前时间戳作为文件名的一部分
     timestamp = int(time.time())
-    filename = f"video_data_{timestamp}.json"
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    output_path = os.path.join(data_dir, f"video_data_{timestamp}")
     
-    # 保存数据
-    if video_data:
-        save_data_to_json(video_data, filename)
-    else:
+    # 获取视频数据，每条记录获取成功后立即写入文件
+    with open_record_sink(output_path, output_format) as sink:
+        fetch_videos_data(bvids, cookie_dict, fields=fields, sink=sink)
+    
+    if sink.count == 0:
         print("没有获取到任何视频数据，不进行保存")
+        return
+    print(f"数据已保存至: {sink.path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
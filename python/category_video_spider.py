@@ -24,108 +24,208 @@ B站UP主合集视频数据抓取工具
 版本：1.0
 """
 
-import requests
-import time
-import json
-import random
-import hashlib
-import hmac
-import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 # 引入 bilibili_cookie_manager 模块
-from bilibili_cookie_manager import get_cookie, get_headers
+from bilibili_cookie_manager import get_cookie
+# 引入共享HTTP客户端
+from bilibili_http_client import controlled_request as shared_controlled_request
+from up_all_video_spider import dedup_videos
+# 引入批量详情补全模块
+from bilibili_video_enrich import enrich_videos, BATCH_FIELDS
+# 引入结果输出模块
+from bilibili_record_io import open_record_sink, DEFAULT_OUTPUT_FORMAT
 
-# 获取UP主的所有合集信息
-def get_up_collections(mid, cookie_dict=None):
-    url = "https://api.bilibili.com/x/polymer/web-space/seasons_series_list"
-    params = {
-        "mid": mid,
-        "page_num": 1,
-        "page_size": 20
-    }
-    
+# 分页请求使用的每页数量
+COLLECTIONS_PAGE_SIZE = 20
+COLLECTION_VIDEOS_PAGE_SIZE = 100
+# 并行拉取分页/合集时的默认线程数（实际发送速率仍由令牌桶限速器控制）
+DEFAULT_PAGE_WORKERS = 4
+DEFAULT_COLLECTION_WORKERS = 4
+# 分页请求的页数上限，防止接口对超出范围的页码重复返回数据时无限请求
+MAX_PAGES = 1000
+
+# 请求单页数据并解析JSON，请求失败或返回码非0时返回None
+def request_page_json(url, params, description, cookie_dict=None):
     response = controlled_request(url, params, cookie_dict=cookie_dict)
     
     if response is None:
-        print("获取UP主合集信息失败")
-        return []
+        print(f"获取{description}失败")
+        return None
         
     try:
         data = response.json()
-        if data['code'] != 0:
-            print(f"获取UP主合集信息失败，状态码：{data['code']}")
-            return []
+    except Exception as e:
+        print(f"处理{description}数据时出错：{str(e)}")
+        return None
+    
+    if data.get('code') != 0:
+        print(f"获取{description}失败，状态码：{data.get('code')}")
+        return None
+    return data
+
+# 先请求第1页，根据返回的总数估算剩余页码并发请求；最后一页仍是满页时继续按批请求，直到出现不满或为空的页
+def fetch_all_pages(fetch_page, extract_items, extract_page, page_size, max_workers=DEFAULT_PAGE_WORKERS):
+    """
+    参数:
+        fetch_page: 函数，参数为页码，返回接口JSON或None
+        extract_items: 函数，从接口JSON中提取本页条目列表
+        extract_page: 函数，从接口JSON中提取 (总数, 每页数量)
+        page_size: 请求时使用的每页数量（接口未返回每页数量时使用）
+    
+    说明:
+        total 的含义在各接口中不一致（合集列表接口文档中为总页数，视频列表接口中为总条目数），
+        这里只按总条目数估算页数用于首批并发，是否还有下一页以"满页"判断，两种含义都不会少取
+    """
+    first = fetch_page(1)
+    if first is None:
+        return []
+    items = list(extract_items(first))
+    last_count = len(items)
+    
+    total, size = extract_page(first)
+    size = size or page_size
+    batch_end = min((total + size - 1) // size if total else 1, MAX_PAGES)
+    next_page = 2
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            if next_page > batch_end:
+                # 最后一页是满页，说明可能还有更多页
+                if last_count < size or batch_end >= MAX_PAGES:
+                    break
+                batch_end = min(batch_end + max_workers, MAX_PAGES)
             
-        # 提取合集信息
+            # executor.map 按页码顺序返回结果，失败的页跳过（视为不满页）
+            for data in executor.map(fetch_page, range(next_page, batch_end + 1)):
+                page_items = list(extract_items(data)) if data is not None else []
+                items.extend(page_items)
+                last_count = len(page_items)
+            next_page = batch_end + 1
+    return items
+
+# 将合集/系列条目转换为统一格式
+def parse_collection(item, collection_type):
+    # 当前接口的条目信息位于 meta 对象中
+    meta = item.get('meta', item)
+    if collection_type == 'season':
+        collection_id = meta.get('season_id', meta.get('id'))
+    else:
+        collection_id = meta.get('series_id', meta.get('id'))
+    return {
+        'id': collection_id,
+        'title': meta.get('name', meta.get('title')),
+        'type': collection_type,
+        'count': meta.get('total', meta.get('media_count'))
+    }
+
+# 获取UP主的所有合集信息
+def get_up_collections(mid, cookie_dict=None, max_workers=DEFAULT_PAGE_WORKERS):
+    url = "https://api.bilibili.com/x/polymer/web-space/seasons_series_list"
+    
+    def fetch_page(page):
+        params = {
+            "mid": mid,
+            "page_num": page,
+            "page_size": COLLECTIONS_PAGE_SIZE
+        }
+        return request_page_json(url, params, f"UP主合集信息第{page}页", cookie_dict=cookie_dict)
+    
+    def get_items_lists(data):
+        # 合集和系列列表位于 data.items_lists 中，兼容旧结构直接位于 data 中
+        return data['data'].get('items_lists', data['data'])
+    
+    def extract_items(data):
+        items_lists = get_items_lists(data)
         collections = []
         
-        # 添加视频合集（季）
-        if 'seasons_list' in data['data']:
-            for season in data['data']['seasons_list']['seasons_list']:
-                collections.append({
-                    'id': season['id'],
-                    'title': season['title'],
-                    'type': 'season',
-                    'count': season['media_count']
-                })
-                
-        # 添加视频系列
-        if 'series_list' in data['data']:
-            for series in data['data']['series_list']['series_list']:
-                collections.append({
-                    'id': series['id'],
-                    'title': series['title'],
-                    'type': 'series',
-                    'count': series['media_count']
-                })
-                
+        for collection_type, key in (('season', 'seasons_list'), ('series', 'series_list')):
+            entries = items_lists.get(key) or []
+            if isinstance(entries, dict):
+                entries = entries.get(key) or []
+            collections.extend(parse_collection(entry, collection_type) for entry in entries)
         return collections
+    
+    def extract_page(data):
+        page = get_items_lists(data).get('page') or {}
+        return page.get('total'), page.get('page_size')
+    
+    try:
+        collections = fetch_all_pages(fetch_page, extract_items, extract_page, COLLECTIONS_PAGE_SIZE,
+                                      max_workers=max_workers)
     except Exception as e:
         print(f"处理UP主合集数据时出错：{str(e)}")
         return []
+    
+    # 按类型和ID去重
+    seen = set()
+    unique_collections = []
+    for collection in collections:
+        key = (collection['type'], collection['id'])
+        if key not in seen:
+            seen.add(key)
+            unique_collections.append(collection)
+    return unique_collections
 
 # 获取合集中的所有视频
-def get_collection_videos(mid, collection_id, collection_type, cookie_dict=None):
+def get_collection_videos(mid, collection_id, collection_type, cookie_dict=None, max_workers=DEFAULT_PAGE_WORKERS):
     if collection_type == 'season':
         url = "https://api.bilibili.com/x/polymer/web-space/seasons_archives_list"
-        params = {
-            "mid": mid,
-            "season_id": collection_id,
-            "page_num": 1,
-            "page_size": 100  # 设置较大的值一次获取更多视频
-        }
     else:  # series
         url = "https://api.bilibili.com/x/series/archives"
-        params = {
-            "mid": mid,
-            "series_id": collection_id,
-            "pn": 1,
-            "ps": 100
-        }
     
-    response = controlled_request(url, params, cookie_dict=cookie_dict)
-    
-    if response is None:
-        print(f"获取合集视频列表失败")
-        return []
-        
-    try:
-        data = response.json()
-        if data['code'] != 0:
-            print(f"获取合集视频列表失败，状态码：{data['code']}")
-            return []
-            
-        # 提取视频信息
+    def fetch_page(page):
         if collection_type == 'season':
-            videos = data['data']['archives']
+            params = {
+                "mid": mid,
+                "season_id": collection_id,
+                "page_num": page,
+                "page_size": COLLECTION_VIDEOS_PAGE_SIZE
+            }
         else:  # series
-            videos = data['data']['archives']
-            
-        print(f"成功获取合集视频，共{len(videos)}个视频")
-        return videos
+            params = {
+                "mid": mid,
+                "series_id": collection_id,
+                "pn": page,
+                "ps": COLLECTION_VIDEOS_PAGE_SIZE
+            }
+        return request_page_json(url, params, f"合集视频列表第{page}页", cookie_dict=cookie_dict)
+    
+    def extract_items(data):
+        return data['data'].get('archives') or []
+    
+    def extract_page(data):
+        page = data['data'].get('page') or {}
+        if collection_type == 'season':
+            return page.get('total'), page.get('page_size')
+        return page.get('total'), page.get('size')
+    
+    try:
+        videos = fetch_all_pages(fetch_page, extract_items, extract_page, COLLECTION_VIDEOS_PAGE_SIZE,
+                                 max_workers=max_workers)
     except Exception as e:
         print(f"处理合集视频数据时出错：{str(e)}")
         return []
+    
+    videos = dedup_videos(videos)
+    print(f"成功获取合集视频，共{len(videos)}个视频")
+    return videos
+
+# 并行获取多个合集中的视频
+def get_collections_videos(mid, collections, cookie_dict=None, max_workers=DEFAULT_COLLECTION_WORKERS):
+    """
+    参数:
+        collections: get_up_collections 返回的合集列表
+    
+    返回:
+        list，与 collections 顺序一致的 (合集, 视频列表) 元组
+    """
+    def fetch_collection(collection):
+        print(f"正在获取合集: {collection['title']} ({collection['type']})")
+        return get_collection_videos(mid, collection['id'], collection['type'], cookie_dict=cookie_dict)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(zip(collections, executor.map(fetch_collection, collections)))
 
 # 获取单个视频的详细信息
 def get_video_detail(bvid=None, aid=None, cookie_dict=None):
@@ -138,10 +238,11 @@ def get_video_detail(bvid=None, aid=None, cookie_dict=None):
         return None
         
     url = "https://api.bilibili.com/x/web-interface/view"
-    headers = get_headers(cookie_dict)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = shared_controlled_request(url, params, cookie_dict=cookie_dict)
+        if response is None:
+            return None
         if response.status_code == 200:
             return response.json()
         else:
@@ -152,7 +253,14 @@ def get_video_detail(bvid=None, aid=None, cookie_dict=None):
         return None
 
 # 主函数
-def main(mid, collection_id=None, collection_type=None, cookie_dict=None):
+def main(mid, collection_id=None, collection_type=None, cookie_dict=None, fields=None,
+         output_format=DEFAULT_OUTPUT_FORMAT):
+    """
+    参数:
+        fields: 需要补全的字段集合，None 表示全部字段（缺少 /view 专有字段的视频逐个请求详情）；
+                传入 BATCH_FIELDS 时只使用批量接口
+        output_format: 输出格式，默认逐条写入 ndjson，"json" 为原有的JSON数组格式
+    """
     # 创建data目录
     data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
     if not os.path.exists(data_dir):
@@ -170,7 +278,14 @@ def main(mid, collection_id=None, collection_type=None, cookie_dict=None):
         for i, collection in enumerate(collections):
             print(f"{i+1}. {collection['title']} ({collection['type']}, {collection['count']}个视频)")
             
-        choice = int(input("请输入要获取的合集序号: ")) - 1
+        choice = int(input("请输入要获取的合集序号（输入0获取全部合集）: ")) - 1
+        if choice == -1:
+            # 并行获取全部合集，每个合集分别保存
+            for collection, videos in get_collections_videos(mid, collections, cookie_dict=cookie_dict):
+                print(f"合集 {collection['title']} 中共有 {len(videos)} 个视频")
+                save_collection_videos(mid, collection['id'], collection['type'], videos, data_dir,
+                                       cookie_dict=cookie_dict, fields=fields, output_format=output_format)
+            return
         if choice < 0 or choice >= len(collections):
             print("无效的选择")
             return
@@ -186,6 +301,40 @@ def main(mid, collection_id=None, collection_type=None, cookie_dict=None):
     # 打印视频数量
     print(f"合集中共有 {len(videos)} 个视频")
     
+    save_collection_videos(mid, collection_id, collection_type, videos, data_dir, cookie_dict=cookie_dict,
+                           fields=fields, output_format=output_format)
+
+# 将视频详情接口返回的数据合并到格式化后的视频数据中
+def apply_collection_video_detail(video_data, detail):
+    # 如果成功获取详细信息，添加额外字段
+    if not detail or detail.get('code') != 0:
+        return video_data
+    
+    detail_data = detail.get('data', {})
+    
+    # 添加UP主信息
+    owner = detail_data.get('owner', {})
+    video_data.update({
+        'author': owner.get('name'),
+        'mid': owner.get('mid'),
+        'owner_face': owner.get('face')
+    })
+    
+    # 添加统计数据
+    stat = detail_data.get('stat', {})
+    video_data.update({
+        'danmaku': stat.get('danmaku'),
+        'favorite': stat.get('favorite'),
+        'coin': stat.get('coin'),
+        'share': stat.get('share'),
+        'like': stat.get('like'),
+        'dislike': stat.get('dislike')
+    })
+    return video_data
+
+# 获取合集视频的详细信息并保存为JSON文件
+def save_collection_videos(mid, collection_id, collection_type, videos, data_dir, cookie_dict=None, fields=None,
+                           output_format=DEFAULT_OUTPUT_FORMAT):
     # 格式化视频数据，提取模板中需要的字段
     formatted_videos = []
     for video in videos:
@@ -202,253 +351,22 @@ def main(mid, collection_id=None, collection_type=None, cookie_dict=None):
             'play': video.get('stat', {}).get('view'),
             'comment': video.get('stat', {}).get('reply'),
         }
-        
-        # 获取详细信息
-        print(f"正在获取视频 {video['bvid']} 的详细信息...")
-        detail = get_video_detail(bvid=video['bvid'], cookie_dict=cookie_dict)
-        
-        # 如果成功获取详细信息，添加额外字段
-        if detail and detail.get('code') == 0:
-            detail_data = detail.get('data', {})
-            
-            # 添加UP主信息
-            owner = detail_data.get('owner', {})
-            video_data.update({
-                'author': owner.get('name'),
-                'mid': owner.get('mid'),
-                'owner_face': owner.get('face')
-            })
-            
-            # 添加统计数据
-            stat = detail_data.get('stat', {})
-            video_data.update({
-                'danmaku': stat.get('danmaku'),
-                'favorite': stat.get('favorite'),
-                'coin': stat.get('coin'),
-                'share': stat.get('share'),
-                'like': stat.get('like'),
-                'dislike': stat.get('dislike')
-            })
-        
         formatted_videos.append(video_data)
-        time.sleep(1)  # 避免请求过于频繁
     
-    # 保存为JSON文件
+    # 补全详细信息，每个视频补全后立即写入文件
     collection_type_str = "season" if collection_type == "season" else "series"
-    output_file = os.path.join(data_dir, f"up_{mid}_{collection_type_str}_{collection_id}_videos.json")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(formatted_videos, f, ensure_ascii=False, indent=4)
-    print(f"视频信息已保存至: {output_file}")
+    output_path = os.path.join(data_dir, f"up_{mid}_{collection_type_str}_{collection_id}_videos")
+    with open_record_sink(output_path, output_format) as sink:
+        enrich_videos(formatted_videos,
+                      lambda video_data: get_video_detail(bvid=video_data['bvid'], cookie_dict=cookie_dict),
+                      apply_collection_video_detail, cookie_dict=cookie_dict, fields=fields,
+                      on_result=lambda video_data, ok: sink.write(video_data))
+    print(f"视频信息已保存至: {sink.path}")
 
-# 以下是从原始代码中保留的辅助函数
-def get_wbi_keys():
-    """获取WBI密钥，尝试多种方法"""
-    # 优先从缓存读取
-    img_key, sub_key = load_wbi_keys_from_cache()
-    if img_key and sub_key:
-        print(f"从缓存加载WBI密钥: img_key={img_key}, sub_key={sub_key}")
-        return img_key, sub_key
-    
-    # 方法1: 从bili_ticket获取
-    _, img_key, sub_key = get_bili_ticket()
-    if img_key and sub_key:
-        save_wbi_keys_to_cache(img_key, sub_key)
-        return img_key, sub_key
-    
-    # 使用默认值
-    print("获取WBI密钥失败，使用默认值")
-    img_key = "7cd084941338484aae1ad9425b84077c"
-    sub_key = "4932caff0ff746eab6f01bf08b70ac45"
-    return img_key, sub_key
-
-def get_mixin_key(orig_key):
-    # B站混合盐值算法
-    salt_chars = "ABCDEFGHJKMNPQRSTWXYZabcdefhijkmnprstwxyz0123456789"
-    # 正确的索引值
-    salt_indexes = [46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49, 33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13]
-    
-    mixed_key = ""
-    for i in salt_indexes:
-        if i < len(orig_key):
-            mixed_key += orig_key[i]
-    return mixed_key
-
-def get_wbi_signature(params, img_key, sub_key):
-    # 合并key并计算混合密钥
-    mixin_key = get_mixin_key(img_key + sub_key)
-    
-    # 添加时间戳
-    params['wts'] = str(int(time.time()))
-    
-    # 按照key排序
-    sorted_params = dict(sorted(params.items()))
-    
-    # 过滤特殊字符
-    query_items = []
-    for k, v in sorted_params.items():
-        # 修正：WBI签名需要过滤掉一些特殊字符
-        v_str = str(v)
-        v_str = ''.join(ch for ch in v_str if ch not in "!'()*")
-        query_items.append(f"{k}={v_str}")
-    
-    query = "&".join(query_items)
-    
-    # 计算w_rid
-    md5 = hashlib.md5()
-    md5.update((query + mixin_key).encode())
-    params['w_rid'] = md5.hexdigest()
-    
-    return params
-
-def controlled_request(url, params, cookie_dict=None, delay_range=(2, 5), max_retries=3):
-    """发送请求并控制频率"""
-    # 获取bili_ticket（如果未提供自定义Cookie）
-    bili_ticket = None
-    if not cookie_dict:
-        bili_ticket, _, _ = get_bili_ticket()
-    
-    retries = 0
-    while retries < max_retries:
-        # 随机延时
-        sleep_time = random.uniform(*delay_range)
-        time.sleep(sleep_time)
-        
-        # 发送请求
-        headers = get_headers(cookie_dict)
-        
-        # 如果没有提供自定义Cookie，但获取了bili_ticket，则使用它
-        if not cookie_dict and bili_ticket:
-            if "Cookie" in headers:
-                headers["Cookie"] += f"; bili_ticket={bili_ticket}"
-            else:
-                headers["Cookie"] = f"bili_ticket={bili_ticket}"
-        
-        response = requests.get(url, params=params, headers=headers)
-        
-        # 检查是否被拦截
-        if response.status_code == 412:
-            print("请求被拦截，等待更长时间后重试...")
-            time.sleep(random.uniform(30, 60))
-            retries += 1
-            continue
-        
-        return response
-    
-    return None
-
-def get_bili_ticket():
-    """获取bili_ticket，同时获取最新的wbi密钥"""
-    try:
-        ts = int(time.time())
-        key = "XgwSnGZ1p"
-        message = f"ts{ts}"
-        hexsign = hmac.new(key.encode(), message.encode(), hashlib.sha256).hexdigest()
-        
-        url = "https://api.bilibili.com/bapis/bilibili.api.ticket.v1.Ticket/GenWebTicket"
-        params = {
-            "key_id": "ec02",
-            "hexsign": hexsign,
-            "context[ts]": str(ts),
-            "csrf": ""
-        }
-        
-        headers = get_headers()
-        headers.update({
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Connection": "keep-alive"
-        })
-        
-        print(f"正在请求bili_ticket，参数: {params}")
-        
-        response = requests.post(url, params=params, headers=headers)
-        
-        print(f"响应状态码: {response.status_code}")
-        print(f"响应头: {dict(response.headers)}")
-        
-        if not response.text:
-            return None, None, None
-            
-        data = response.json()
-        
-        if data.get("code") == 0:
-            ticket = data["data"]["ticket"]
-            if "nav" in data["data"]:
-                img_url = data["data"]["nav"]["img"]
-                sub_url = data["data"]["nav"]["sub"]
-                img_key = img_url.split("/")[-1].split(".")[0]
-                sub_key = sub_url.split("/")[-1].split(".")[0]
-                
-                if is_valid_wbi_key(img_key) and is_valid_wbi_key(sub_key):
-                    print(f"成功获取最新WBI密钥: img_key={img_key}, sub_key={sub_key}")
-                    return ticket, img_key, sub_key
-            
-        return None, None, None
-    except Exception as e:
-        print(f"获取bili_ticket失败: {e}")
-        return None, None, None
-
-def is_valid_wbi_key(key):
-    """检查WBI密钥的格式是否正确"""
-    # 通常WBI密钥是32位16进制字符串
-    if not key or not isinstance(key, str):
-        return False
-    
-    # 检查长度
-    if len(key) != 32:
-        return False
-    
-    # 检查是否只包含16进制字符
-    try:
-        int(key, 16)
-        return True
-    except ValueError:
-        return False
-    
-    return True
-
-def save_wbi_keys_to_cache(img_key, sub_key):
-    """将WBI密钥保存到缓存文件"""
-    try:
-        # 创建data目录
-        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-            
-        cache_file = os.path.join(data_dir, "wbi_keys_cache.json")
-        cache_data = {
-            "img_key": img_key,
-            "sub_key": sub_key,
-            "timestamp": int(time.time())
-        }
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f)
-        print("WBI密钥已保存到缓存")
-    except Exception as e:
-        print(f"保存WBI密钥到缓存失败: {e}")
-
-def load_wbi_keys_from_cache():
-    """从缓存文件加载WBI密钥"""
-    try:
-        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-        cache_file = os.path.join(data_dir, "wbi_keys_cache.json")
-        
-        if not os.path.exists(cache_file):
-            return None, None
-            
-        with open(cache_file, "r", encoding="utf-8") as f:
-            cache_data = json.load(f)
-            
-            # 检查缓存是否过期（默认24小时）
-            if int(time.time()) - cache_data["timestamp"] < 86400:
-                return cache_data["img_key"], cache_data["sub_key"]
-            else:
-                print("缓存的WBI密钥已过期")
-    except FileNotFoundError:
-        print("WBI密钥缓存文件不存在")
-    except Exception as e:
-        print(f"从缓存加载WBI密钥失败: {e}")
-    
-    return None, None
+def controlled_request(url, params, cookie_dict=None, delay_range=None, max_retries=3):
+    """发送请求并控制频率（未登录时附带bili_ticket）"""
+    return shared_controlled_request(url, params, cookie_dict=cookie_dict, delay_range=delay_range,
+                                     max_retries=max_retries, use_bili_ticket=True)
 
 if __name__ == "__main__":
     # 使用 bilibili_cookie_manager 获取 cookie
@@ -460,12 +378,16 @@ if __name__ == "__main__":
     
     up_mid = 23947287
     
+    batch_only = input("是否只获取批量接口提供的字段（不含投币、点赞等，请求量大幅减少）? (y/n): ")
+    fields = BATCH_FIELDS if batch_only.lower() == 'y' else None
+    
     # 询问用户是否直接输入合集ID或列出合集让用户选择
     choice = input("是否直接输入合集ID? (y/n): ")
     if choice.lower() == 'y':
         # collection_type = input("输入合集类型 (season/series): ")
         collection_type = 'season'
         collection_id = input("输入合集ID: ")
-        main(int(up_mid), collection_id=int(collection_id), collection_type=collection_type, cookie_dict=cookie_dict)
+        main(int(up_mid), collection_id=int(collection_id), collection_type=collection_type, cookie_dict=cookie_dict,
+             fields=fields)
     else:
-        main(int(up_mid), cookie_dict=cookie_dict)
\ No newline at end of file
+        main(int(up_mid), cookie_dict=cookie_dict, fields=fields)
\ No newline at end of file
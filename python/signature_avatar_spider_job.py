@@ -39,159 +39,34 @@ B站UP主签名和头像爬取脚本
 日期：[创建日期]
 版本：1.0
 """
-import requests
 import time
 import json
-import random
-import hashlib
 import os
 # 引入 bilibili_cookie_manager 模块
 from bilibili_cookie_manager import get_cookie, get_headers
+# 引入共享HTTP客户端
+from bilibili_http_client import http_get, http_post
+from bilibili_http_client import controlled_request as shared_controlled_request
+# 引入共享WBI签名模块
+from bilibili_wbi import get_wbi_signer
+# 引入结果输出模块
+from bilibili_record_io import open_record_sink, DEFAULT_OUTPUT_FORMAT
 
-# 获取WBI密钥
-def get_wbi_keys():
-    """获取WBI密钥，优先从缓存读取"""
-    # 优先从缓存读取
-    img_key, sub_key = load_wbi_keys_from_cache()
-    if img_key and sub_key:
-        print(f"从缓存加载WBI密钥: img_key={img_key}, sub_key={sub_key}")
-        return img_key, sub_key
-    
-    # 使用默认值
-    print("使用默认WBI密钥")
-    img_key = "7cd084941338484aae1ad9425b84077c"
-    sub_key = "4932caff0ff746eab6f01bf08b70ac45"
-    return img_key, sub_key
-
-def get_mixin_key(orig_key):
-    # B站混合盐值算法 - 修正为正确的实现
-    salt_chars = "ABCDEFGHJKMNPQRSTWXYZabcdefhijkmnprstwxyz0123456789"
-    # 正确的索引值
-    salt_indexes = [46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49, 33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13]
-    
-    mixed_key = ""
-    for i in salt_indexes:
-        if i < len(orig_key):
-            mixed_key += orig_key[i]
-    return mixed_key
-
-def get_wbi_signature(params, img_key, sub_key):
-    # 合并key并计算混合密钥
-    mixin_key = get_mixin_key(img_key + sub_key)
-    
-    # 添加时间戳
-    params['wts'] = str(int(time.time()))
-    
-    # 按照key排序
-    sorted_params = dict(sorted(params.items()))
-    
-    # 过滤特殊字符
-    query_items = []
-    for k, v in sorted_params.items():
-        # 修正：WBI签名需要过滤掉一些特殊字符
-        v_str = str(v)
-        v_str = ''.join(ch for ch in v_str if ch not in "!'()*")
-        query_items.append(f"{k}={v_str}")
-    
-    query = "&".join(query_items)
-    
-    # 计算w_rid
-    md5 = hashlib.md5()
-    md5.update((query + mixin_key).encode())
-    params['w_rid'] = md5.hexdigest()
-    
-    return params
-
-def get_headers(cookie_dict=None):
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
-    ]
-    
-    headers = {
-        "User-Agent": random.choice(user_agents),
-        "Referer": "https://www.bilibili.com/",
-        "Accept": "application/json, text/plain, */*",
-        "Origin": "https://www.bilibili.com",
-        "Accept-Encoding": "identity",  # 只接受未压缩的内容
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
-    }
-    
-    # 如果提供了Cookie字典，转换为Cookie字符串
-    if cookie_dict and isinstance(cookie_dict, dict) and len(cookie_dict) > 0:
-        cookie_str = '; '.join([f"{k}={v}" for k, v in cookie_dict.items()])
-        headers["Cookie"] = cookie_str
-    
-    return headers
-
-def controlled_request(url, params, cookie_dict=None, delay_range=(1, 3), max_retries=3):
+def controlled_request(url, params, cookie_dict=None, delay_range=None, max_retries=3):
     """发送请求并控制频率"""
-    retries = 0
-    while retries < max_retries:
-        # 随机延时
-        sleep_time = random.uniform(*delay_range)
-        time.sleep(sleep_time)
-        
-        # 发送请求
-        headers = get_headers(cookie_dict)
-        
-        response = requests.get(url, params=params, headers=headers)
-        
-        # 检查是否被拦截
-        if response.status_code == 412:
-            print("请求被拦截，等待更长时间后重试...")
-            time.sleep(random.uniform(10, 20))
-            retries += 1
-            continue
-        
-        return response
-    
-    return None
-
-def save_wbi_keys_to_cache(img_key, sub_key):
-    """将WBI密钥保存到缓存文件"""
-    try:
-        # 创建data目录
-        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-            
-        cache_file = os.path.join(data_dir, "wbi_keys_cache.json")
-        cache_data = {
-            "img_key": img_key,
-            "sub_key": sub_key,
-            "timestamp": int(time.time())
-        }
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f)
-        print("WBI密钥已保存到缓存")
-    except Exception as e:
-        print(f"保存WBI密钥到缓存失败: {e}")
+    return shared_controlled_request(url, params, cookie_dict=cookie_dict, delay_range=delay_range,
+                                     max_retries=max_retries, blocked_delay_range=(10, 20))
 
-def load_wbi_keys_from_cache():
-    """从缓存文件加载WBI密钥"""
-    try:
-        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-        cache_file = os.path.join(data_dir, "wbi_keys_cache.json")
-        
-        if not os.path.exists(cache_file):
-            return None, None
-            
-        with open(cache_file, "r", encoding="utf-8") as f:
-            cache_data = json.load(f)
-            
-            # 检查缓存是否过期（默认24小时）
-            if int(time.time()) - cache_data["timestamp"] < 86400:
-                return cache_data["img_key"], cache_data["sub_key"]
-            else:
-                print("缓存的WBI密钥已过期")
-    except FileNotFoundError:
-        print("WBI密钥缓存文件不存在")
-    except Exception as e:
-        print(f"从缓存加载WBI密钥失败: {e}")
-    
-    return None, None
+def format_up_info(user_data):
+    """提取UP主签名和头像信息"""
+    return {
+        'mid': user_data.get('mid'),  # UP主mid（写入SQLite存储时作为主键）
+        'name': user_data.get('name'),  # UP主昵称
+        'face': user_data.get('face'),  # 头像链接
+        'face_create_time': int(time.time()),  # 头像获取时间
+        'sign': user_data.get('sign', ''),  # 个人签名
+        'sign_create_time': int(time.time())  # 签名获取时间
+    }
 
 def get_up_info(mid, cookie_dict=None):
     """获取UP主基本信息"""
@@ -201,8 +76,7 @@ def get_up_info(mid, cookie_dict=None):
     }
     
     # 获取WBI签名
-    img_key, sub_key = get_wbi_keys()
-    params = get_wbi_signature(params, img_key, sub_key)
+    params = get_wbi_signer().sign(params)
     
     # 发送请求
     url = "https://api.bilibili.com/x/space/wbi/acc/info"
@@ -219,13 +93,7 @@ def get_up_info(mid, cookie_dict=None):
             return None
             
         # 提取所需信息
-        user_data = data['data']
-        return {
-            'face': user_data.get('face'),  # 头像链接
-            'face_create_time': int(time.time()),  # 头像获取时间
-            'sign': user_data.get('sign', ''),  # 个人签名
-            'sign_create_time': int(time.time())  # 签名获取时间
-        }
+        return format_up_info(data['data'])
     except Exception as e:
         print(f"处理UP主 {mid} 数据时出错：{str(e)}")
         return None
@@ -282,7 +150,7 @@ def check_cookie_refresh_needed(cookie_dict):
     params = {'csrf': cookie_dict.get('bili_jct', '')}
     
     try:
-        response = requests.get(url, params=params, headers=get_headers(cookie_dict))
+        response = http_get(url, params=params, headers=get_headers(cookie_dict))
         data = response.json()
         
         if data['code'] == 0:
@@ -326,7 +194,7 @@ def get_refresh_csrf(correspond_path, cookie_dict):
     url = f"https://www.bilibili.com/correspond/1/{correspond_path}"
     
     try:
-        response = requests.get(url, headers=get_headers(cookie_dict))
+        response = http_get(url, headers=get_headers(cookie_dict))
         
         if response.status_code == 200:
             # 使用简单的HTML解析，也可以使用BeautifulSoup
@@ -353,7 +221,7 @@ def refresh_cookie(refresh_token, refresh_csrf, cookie_dict):
     }
     
     try:
-        response = requests.post(url, data=data, headers=get_headers(cookie_dict))
+        response = http_post(url, data=data, headers=get_headers(cookie_dict))
         data = response.json()
         
         if data['code'] == 0:
@@ -383,7 +251,7 @@ def confirm_refresh(old_refresh_token, new_cookie_dict):
     }
     
     try:
-        response = requests.post(url, data=data, headers=get_headers(new_cookie_dict))
+        response = http_post(url, data=data, headers=get_headers(new_cookie_dict))
         data = response.json()
         
         if data['code'] == 0:
@@ -493,7 +361,7 @@ def manage_cookies(input_cookie_dict=None):
             save_cookies(input_cookie_dict, refresh_token)
         return cookie_dict
 
-def main():
+def main(output_format=DEFAULT_OUTPUT_FORMAT):
     # 创建data目录
     data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
     if not os.path.exists(data_dir):
@@ -516,11 +384,11 @@ def main():
         up_info = get_up_info(up_mid, cookie_dict=active_cookie_dict)
         
         if up_info:
-            # 保存为JSON文件
-            output_file = os.path.join(data_dir, f"up_{up_mid}_info.json")
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(up_info, f, ensure_ascii=False, indent=4)
-            print(f"UP主 {up_mid} 的签名和头像信息已保存至: {output_file}")
+            # 保存结果
+            output_path = os.path.join(data_dir, f"up_{up_mid}_info")
+            with open_record_sink(output_path, output_format) as sink:
+                sink.write(up_info)
+            print(f"UP主 {up_mid} 的签名和头像信息已保存至: {sink.path}")
             
             # 打印获取到的信息
             print("\nUP主信息摘要:")
@@ -27,17 +27,18 @@ B站单视频数据抓取工具
 版本：1.0
 """
 
-import requests
-import time
 import json
-import random
-import hashlib
-import hmac
-import re
 import os
 import sys
 # 引入 bilibili_cookie_manager 模块
 from bilibili_cookie_manager import get_cookie, get_headers
+# 引入共享HTTP客户端
+from bilibili_http_client import http_get
+from bilibili_http_client import controlled_request as shared_controlled_request
+# 本地AV号/BV号转换
+from bilibili_bvid import av2bv, bv2av
+# protobuf分段弹幕
+from bilibili_danmaku import count_danmaku
 
 # 获取单个视频的详细信息
 def get_video_detail(bvid=None, aid=None, cookie_dict=None):
@@ -50,10 +51,11 @@ def get_video_detail(bvid=None, aid=None, cookie_dict=None):
         return None
         
     url = "https://api.bilibili.com/x/web-interface/view"
-    headers = get_headers(cookie_dict)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = controlled_request(url, params, cookie_dict=cookie_dict)
+        if response is None:
+            return None
         if response.status_code == 200:
             return response.json()
         else:
@@ -63,19 +65,10 @@ def get_video_detail(bvid=None, aid=None, cookie_dict=None):
         print(f"获取视频详情出错: {str(e)}")
         return None
 
-# 获取视频弹幕信息
-def get_video_danmaku_info(cid, cookie_dict=None):
-    url = f"https://api.bilibili.com/x/v1/dm/list.so?oid={cid}"
-    headers = get_headers(cookie_dict)
-    
+# 获取视频弹幕数（分段protobuf接口计数，不再下载整个XML弹幕文件）
+def get_video_danmaku_info(cid, cookie_dict=None, aid=None, duration=None):
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            # 返回的是XML格式，简单获取弹幕数量
-            return len(re.findall(r'<d p=', response.text))
-        else:
-            print(f"获取弹幕信息失败，状态码: {response.status_code}")
-            return 0
+        return count_danmaku(cid, aid=aid, duration=duration, cookie_dict=cookie_dict)
     except Exception as e:
         print(f"获取弹幕信息出错: {str(e)}")
         return 0
@@ -94,7 +87,7 @@ def get_video_related(bvid=None, aid=None, cookie_dict=None):
     headers = get_headers(cookie_dict)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = http_get(url, params=params, headers=headers)
         if response.status_code == 200:
             data = response.json()
             if data['code'] == 0:
@@ -109,29 +102,34 @@ def get_video_related(bvid=None, aid=None, cookie_dict=None):
         print(f"获取相关视频出错: {str(e)}")
         return []
 
-# 检测并转换视频ID
+# 检测并转换视频ID，本地换算出另一种ID，返回的aid和bvid都已填好
 def convert_video_id(video_id):
-    # 检测是否为AV号
-    if video_id.lower().startswith('av'):
-        aid = video_id[2:]
-        try:
-            aid = int(aid)
-            return {'aid': aid, 'bvid': None}
-        except ValueError:
-            pass
+    video_id = video_id.strip()
     
     # 检测是否为BV号
-    if video_id.startswith('BV') or video_id.startswith('bv'):
-        return {'aid': None, 'bvid': video_id}
+    if video_id[:2].upper() == 'BV':
+        try:
+            aid = bv2av(video_id)
+        except ValueError:
+            # 格式不符合已知算法的BV号交给接口判断
+            return {'aid': None, 'bvid': video_id}
+        return {'aid': aid, 'bvid': av2bv(aid)}
     
-    # 尝试将纯数字视为AV号
+    # 检测是否为AV号，或将纯数字视为AV号
+    if video_id.lower().startswith('av'):
+        video_id = video_id[2:]
     try:
         aid = int(video_id)
-        return {'aid': aid, 'bvid': None}
     except ValueError:
-        pass
+        return None
+    if aid <= 0:
+        return None
     
-    return None
+    try:
+        bvid = av2bv(aid)
+    except ValueError:
+        bvid = None
+    return {'aid': aid, 'bvid': bvid}
 
 # 主函数
 def main(video_id=None, cookie_dict=None):
@@ -204,8 +202,12 @@ def main(video_id=None, cookie_dict=None):
 
     # 获取弹幕信息（如果需要）
     if video_data.get('cid'):
-        danmaku_count = get_video_danmaku_info(video_data.get('cid'), cookie_dict)
-        formatted_data['danmaku_count'] = danmaku_count  # 这是通过XML解析得到的弹幕数
+        # 第1P的时长决定分段数
+        pages = video_data.get('pages') or []
+        duration = pages[0].get('duration') if pages else video_data.get('duration')
+        danmaku_count = get_video_danmaku_info(video_data.get('cid'), cookie_dict,
+                                               aid=video_data.get('aid'), duration=duration)
+        formatted_data['danmaku_count'] = danmaku_count  # 这是通过分段protobuf弹幕统计得到的弹幕数
 
     # 保存为JSON文件
     bvid = formatted_data['bvid']
@@ -220,29 +222,10 @@ def main(video_id=None, cookie_dict=None):
     
     return formatted_data
 
-def controlled_request(url, params, cookie_dict=None, delay_range=(1, 3), max_retries=3):
+def controlled_request(url, params, cookie_dict=None, delay_range=None, max_retries=3):
     """发送请求并控制频率"""
-    retries = 0
-    while retries < max_retries:
-        # 随机延时
-        sleep_time = random.uniform(*delay_range)
-        time.sleep(sleep_time)
-        
-        # 发送请求
-        headers = get_headers(cookie_dict)
-        
-        response = requests.get(url, params=params, headers=headers)
-        
-        # 检查是否被拦截
-        if response.status_code == 412:
-            print("请求被拦截，等待更长时间后重试...")
-            time.sleep(random.uniform(10, 20))
-            retries += 1
-            continue
-        
-        return response
-    
-    return None
+    return shared_controlled_request(url, params, cookie_dict=cookie_dict, delay_range=delay_range,
+                                     max_retries=max_retries, blocked_delay_range=(10, 20))
 
 if __name__ == "__main__":
     # 使用 bilibili_cookie_manager 获取 cookie
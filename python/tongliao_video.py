@@ -6,10 +6,11 @@ B站视频信息补充工具
 本工具用于补充已有JSON文件中视频的desc和dynamic字段信息。
 
 功能：
-1. 读取已有的JSON视频文件
-2. 遍历每个视频记录，补充desc和dynamic字段
-3. 更新JSON文件，保留原有数据的同时添加新信息
-4. 支持断点续传，避免重复请求
+1. 逐条读取已有的JSON视频文件（JSON数组或 ndjson，大文件不会整体载入内存）
+2. 筛选出缺少字段的视频记录，补充desc和dynamic字段（--concurrency N 时并发获取）
+3. 按原顺序逐条写入临时文件，完成后原子替换原文件，保留原有数据的同时添加新信息
+4. 支持断点续传：每获取成功一个视频就追加写入检查点日志（<JSON文件>.journal），
+   中断后重新运行会先回放日志，跳过已完成的视频；全部完成后原子替换原文件并删除日志
 
 使用方法：
 1. 运行脚本
@@ -25,24 +26,73 @@ B站视频信息补充工具
 
 import json
 import os
-import sys
 import time
 import random
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 # 导入单视频爬虫的相关功能
-from bilibili_cookie_manager import get_cookie, get_headers
-from single_video_spider import get_video_detail, controlled_request
+from bilibili_cookie_manager import get_cookie
+from single_video_spider import get_video_detail
+# 导入结果输出模块（检查点日志与原子写入）
+from bilibili_record_io import NdjsonSink, JsonArraySink, read_records, iter_records
 
-def update_video_info(json_file_path, delay_range=(2, 5), max_retries=3):
+# 需要补充的字段
+UPDATE_FIELDS = ('desc', 'dynamic')
+
+def get_journal_path(json_file_path):
+    """检查点日志路径"""
+    return json_file_path + ".journal"
+
+def get_video_key(video):
+    """视频在检查点日志中的标识，优先使用bvid"""
+    if video.get('bvid'):
+        return video['bvid']
+    if video.get('aid'):
+        return f"av{video['aid']}"
+    return None
+
+def load_journal(journal_path):
+    """读取检查点日志，返回 视频标识 -> 已获取字段"""
+    completed = {}
+    if not os.path.exists(journal_path):
+        return completed
+    for entry in read_records(journal_path):
+        key = entry.pop('key', None)
+        if key:
+            completed[key] = entry
+    return completed
+
+def needs_update(video):
+    """视频是否缺少需要补充的字段"""
+    return any(video.get(field) is None for field in UPDATE_FIELDS)
+
+def count_pending(json_file_path, completed):
+    """逐条扫描文件，统计回放检查点日志后仍需获取的视频数（用作进度条总数）"""
+    pending = 0
+    for video in iter_records(json_file_path):
+        if not isinstance(video, dict):
+            continue
+        video = {**video, **completed.get(get_video_key(video), {})}
+        if needs_update(video) and (video.get('bvid') or video.get('aid')):
+            pending += 1
+    return pending
+
+def update_video_info(json_file_path, delay_range=None, max_retries=3, concurrency=1):
     """
     更新JSON文件中视频的详细信息，补充desc和dynamic字段
     
+    输入文件逐条读取（JSON数组在安装 ijson 时增量解析，.ndjson 文件逐行读取），
+    结果按原顺序逐条写入临时文件，完成后原子替换原文件，内存占用与文件大小无关
+    
     参数:
-    - json_file_path: JSON文件路径
-    - delay_range: 请求间隔时间范围(秒)
+    - json_file_path: JSON文件路径（.json 为JSON数组，其他扩展名按 ndjson 处理）
+    - delay_range: 请求间隔时间范围(秒)，为None时由共享令牌桶限速器控制频率
     - max_retries: 最大重试次数
+    - concurrency: 同时获取视频详情的线程数，为1时逐个获取
     """
     # 检查文件是否存在
     if not os.path.exists(json_file_path):
@@ -55,91 +105,150 @@ def update_video_info(json_file_path, delay_range=(2, 5), max_retries=3):
         print("警告: 没有有效的Cookie，将使用无登录模式请求（可能会受到更多限制）")
         cookie_dict = {}
     
-    # 读取JSON文件
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            videos = json.load(f)
-    except json.JSONDecodeError:
-        print(f"错误: 文件 '{json_file_path}' 不是有效的JSON格式")
-        return False
-    except Exception as e:
-        print(f"读取文件时出错: {str(e)}")
-        return False
-    
-    if not isinstance(videos, list):
-        print(f"错误: 文件内容不是视频列表格式")
-        return False
-    
-    print(f"找到 {len(videos)} 个视频记录")
     updated_count = 0
     already_complete = 0
     failed_count = 0
     
-    # 遍历视频列表并更新信息
-    for i, video in enumerate(tqdm(videos, desc="更新视频信息")):
-        # 跳过已有desc和dynamic的视频
-        if video.get('desc') is not None and video.get('dynamic') is not None:
-            already_complete += 1
-            continue
-        
-        bvid = video.get('bvid')
-        aid = video.get('aid')
-        
-        if not bvid and not aid:
-            print(f"警告: 第{i+1}个视频记录缺少bvid和aid")
-            failed_count += 1
-            continue
-        
-        # 随机延时，避免请求过于频繁
-        sleep_time = random.uniform(*delay_range)
-        time.sleep(sleep_time)
+    # 回放检查点日志，恢复上次中断前已获取的字段
+    journal_path = get_journal_path(json_file_path)
+    completed = load_journal(journal_path)
+    if completed:
+        print(f"从检查点日志恢复 {len(completed)} 个视频信息")
+    pending = count_pending(json_file_path, completed)
+    print(f"共有 {pending} 个视频需要补充信息")
+    
+    def fetch_fields(video):
+        """获取单个视频需要补充的字段，返回 (字段字典, 错误信息)"""
+        # 随机延时，避免请求过于频繁（未指定时由限速器控制）
+        if delay_range:
+            time.sleep(random.uniform(*delay_range))
         
         # 获取视频详情
-        detail = get_video_detail(bvid=bvid, aid=aid, cookie_dict=cookie_dict)
+        detail = get_video_detail(bvid=video.get('bvid'), aid=video.get('aid'), cookie_dict=cookie_dict)
         
         if not detail or detail.get('code') != 0:
-            error_msg = detail.get('message') if detail else '请求失败'
-            print(f"获取视频 {bvid or aid} 信息失败: {error_msg}")
-            failed_count += 1
-            continue
+            return None, detail.get('message') if detail else '请求失败'
         
         # 提取视频数据
         video_data = detail.get('data', {})
-        
-        # 更新字段
-        video['desc'] = video_data.get('desc')
-        video['dynamic'] = video_data.get('dynamic')
-        updated_count += 1
+        return {field: video_data.get(field) for field in UPDATE_FIELDS}, None
     
-    # 将更新后的数据写回文件
+    # 结果写入临时文件，全部完成后再替换原文件
+    tmp_path = json_file_path + ".tmp"
+    if json_file_path.endswith(".json"):
+        output = JsonArraySink(tmp_path)
+    else:
+        output = NdjsonSink(tmp_path)
+    # 每获取成功一个视频立即在完成回调中追加到检查点日志（回调在工作线程中执行，加锁写入），
+    # 不等待按顺序写出，中断时已完成的视频都不会丢失
+    journal = NdjsonSink(journal_path, append=True)
+    journal_lock = threading.Lock()
+    
+    def record_journal(video, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        fields, _ = future.result()
+        if fields is not None:
+            with journal_lock:
+                journal.write({'key': get_video_key(video), **fields})
+    # 已提交但尚未写出的视频数上限，保证内存占用有界
+    max_pending = max(1, concurrency) * 4
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
     try:
-        with open(json_file_path, 'w', encoding='utf-8') as f:
-            json.dump(videos, f, ensure_ascii=False, indent=4)
-        print(f"\n成功更新 {updated_count} 个视频信息")
-        if already_complete > 0:
-            print(f"{already_complete} 个视频已有信息，无需更新")
-        if failed_count > 0:
-            print(f"{failed_count} 个视频更新失败")
-        return True
+        # 进度条只统计需要请求的视频，已完成和缺少标识的视频直接写出
+        with tqdm(total=pending, desc="更新视频信息", unit="个") as progress:
+            def finish(video, future):
+                nonlocal updated_count, failed_count
+                if future is not None:
+                    fields, error_msg = future.result()
+                    if fields is None:
+                        progress.write(f"获取视频 {video.get('bvid') or video.get('aid')} 信息失败: {error_msg}")
+                        failed_count += 1
+                    else:
+                        # 更新字段（检查点日志已在完成回调中写入）
+                        video.update(fields)
+                        updated_count += 1
+                    progress.update(1)
+                output.write(video)
+            
+            # 按输入顺序维护的窗口：(视频, 请求Future或None)
+            window = deque()
+            for i, video in enumerate(iter_records(json_file_path)):
+                if not isinstance(video, dict):
+                    raise ValueError(f"第{i+1}条记录不是视频信息")
+                
+                fields = completed.get(get_video_key(video))
+                if fields is not None:
+                    video.update(fields)
+                
+                # 已完成的视频和缺少标识的视频不进入请求队列
+                future = None
+                if not needs_update(video):
+                    already_complete += 1
+                elif not video.get('bvid') and not video.get('aid'):
+                    progress.write(f"警告: 第{i+1}个视频记录缺少bvid和aid")
+                    failed_count += 1
+                else:
+                    # 并发获取，实际请求速率仍由共享令牌桶限速器控制
+                    future = executor.submit(fetch_fields, video)
+                    future.add_done_callback(lambda done, video=video: record_journal(video, done))
+                window.append((video, future))
+                
+                # 队首已完成或窗口已满时按顺序写出
+                while window and (window[0][1] is None or window[0][1].done() or len(window) > max_pending):
+                    finish(*window.popleft())
+            
+            while window:
+                finish(*window.popleft())
+        
+        output.close()
+        print(f"共处理 {output.count} 个视频记录")
+        
+        # 原子替换原文件（没有记录时保留原文件），成功后删除检查点日志
+        if output.count > 0:
+            os.replace(tmp_path, json_file_path)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"错误: 文件 '{json_file_path}' 格式不正确: {str(e)}")
+        return False
     except Exception as e:
-        print(f"写入文件时出错: {str(e)}")
+        print(f"处理文件时出错: {str(e)}")
         return False
+    finally:
+        # 中断时取消尚未开始的请求，已完成的结果都已在完成回调中写入检查点日志
+        executor.shutdown(wait=True, cancel_futures=True)
+        with journal_lock:
+            journal.close()
+        output.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    print(f"\n成功更新 {updated_count} 个视频信息")
+    if already_complete > 0:
+        print(f"{already_complete} 个视频已有信息，无需更新")
+    if failed_count > 0:
+        print(f"{failed_count} 个视频更新失败")
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description='补充B站视频JSON文件中的desc和dynamic字段')
     parser.add_argument('json_file', nargs='?', help='要处理的JSON文件路径')
-    parser.add_argument('--delay', type=str, default='2-5', help='请求延迟范围，格式为"最小值-最大值"，默认为"2-5"')
+    parser.add_argument('--delay', type=str, default=None, help='请求延迟范围，格式为"最小值-最大值"，默认由共享令牌桶限速器控制频率')
     parser.add_argument('--retries', type=int, default=3, help='失败重试次数，默认为3')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时获取视频详情的线程数，默认为1（逐个获取），请求速率仍由共享令牌桶限速器控制')
     
     args = parser.parse_args()
     
     # 处理延迟参数
-    try:
-        min_delay, max_delay = map(float, args.delay.split('-'))
-        delay_range = (min_delay, max_delay)
-    except:
-        print("延迟参数格式错误，使用默认值2-5秒")
-        delay_range = (2, 5)
+    delay_range = None
+    if args.delay:
+        try:
+            min_delay, max_delay = map(float, args.delay.split('-'))
+            delay_range = (min_delay, max_delay)
+        except:
+            print("延迟参数格式错误，使用共享令牌桶限速器控制频率")
     
     # 如果未提供文件路径，使用交互式输入
     if not args.json_file:
@@ -149,7 +258,8 @@ def main():
     json_file_path = os.path.abspath(args.json_file)
     
     # 更新视频信息
-    update_video_info(json_file_path, delay_range=delay_range, max_retries=args.retries)
+    update_video_info(json_file_path, delay_range=delay_range, max_retries=args.retries,
+                      concurrency=args.concurrency)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,6 +6,11 @@ import base64
 import sys
 import os
 
+# 播放器信息（按aid/cid缓存）
+from bilibili_player import get_player_info
+# 字幕时间格式化（整数毫秒换算）
+from bilibili_subtitle_format import format_timestamp, DEFAULT_CHUNK_SIZE
+
 class BilibiliSubtitleDownloader:
     def __init__(self):
         self.headers = {
@@ -53,26 +58,16 @@ class BilibiliSubtitleDownloader:
         return data['data']
     
     def get_subtitle_list(self, video_id, cid):
-        """获取视频字幕列表"""
-        # 使用视频播放接口获取字幕信息
+        """获取视频字幕列表（读取共享的播放器信息缓存）"""
         if video_id.startswith('BV'):
-            api_url = f"https://api.bilibili.com/x/player/v2?bvid={video_id}&cid={cid}"
+            info = get_player_info(bvid=video_id, cid=cid)
         else:  # 假设是av号
-            aid = video_id.replace('av', '')
-            api_url = f"https://api.bilibili.com/x/player/v2?aid={aid}&cid={cid}"
+            info = get_player_info(aid=video_id.replace('av', ''), cid=cid)
         
-        response = self.session.get(api_url)
-        if response.status_code != 200:
-            raise Exception(f"获取字幕列表失败: {response.status_code}")
+        if info is None:
+            raise Exception("获取字幕列表失败")
         
-        data = response.json()
-        if data['code'] != 0:
-            raise Exception(f"API返回错误: {data['message']}")
-        
-        subtitle_info = data['data'].get('subtitle', {})
-        subtitles = subtitle_info.get('subtitles', [])
-        
-        return subtitles
+        return info.subtitles
     
     def get_subtitle_content(self, subtitle_url):
         """获取字幕内容"""
@@ -89,21 +84,14 @@ class BilibiliSubtitleDownloader:
     
     def parse_subtitle_content(self, subtitle_data):
         """解析字幕内容为文本格式"""
-        result = []
-        for item in subtitle_data.get('body', []):
-            start_time = self.format_time(item.get('from'))
-            end_time = self.format_time(item.get('to'))
-            content = item.get('content', '')
-            
-            result.append(f"[{start_time} --> {end_time}] {content}")
-        
-        return result
+        return [
+            f"[{format_timestamp(item.get('from'), '.')} --> {format_timestamp(item.get('to'), '.')}] {item.get('content', '')}"
+            for item in subtitle_data.get('body', [])
+        ]
     
     def format_time(self, seconds):
         """将秒数格式化为 时:分:秒.毫秒 格式"""
-        m, s = divmod(seconds, 60)
-        h, m = divmod(m, 60)
-        return f"{int(h):02d}:{int(m):02d}:{int(s):02d}.{int((seconds - int(seconds)) * 1000):03d}"
+        return format_timestamp(seconds, '.')
     
     def get_subtitle(self, video_url, language='zh-CN'):
         """获取视频字幕并返回格式化文本"""
@@ -182,8 +170,10 @@ class BilibiliSubtitleDownloader:
             f.write(f"视频ID: {subtitle_data['video_id']}\n")
             f.write(f"语言: {subtitle_data['language']}\n\n")
             
-            for line in subtitle_data['subtitle']:
-                f.write(f"{line}\n")
+            # 每 DEFAULT_CHUNK_SIZE 行拼接后写入一次
+            lines = subtitle_data['subtitle']
+            for i in range(0, len(lines), DEFAULT_CHUNK_SIZE):
+                f.write("".join(f"{line}\n" for line in lines[i:i + DEFAULT_CHUNK_SIZE]))
         
         print(f"字幕已保存到: {output_file}")
         return output_file